@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import shutil
+import zipfile
+import tempfile
+import subprocess
+import posixpath
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .blob_store import BlobStore, BlobLease
+from .file_links import link_or_copy
+from .config import BATCH_MAX_PARALLEL, BATCH_MAX_ITEMS, DEFAULT_RENDER_PROFILE, RENDER_PROFILES
+from .harness import file_type
+from .manifest import OutputManifest
+from .metrics import RunMetrics
+from .output_stream import RunOutput
+from .run_history import RunHistory
+from .run_policy import RunPolicy, CancelToken
+from .script_runner import ScriptRunner
+
+# ไฟล์สรุปผลของทุก item และโฟลเดอร์ log (อยู่ในราก workspace ของ batch รวมอยู่ใน ZIP ผลลัพธ์)
+BATCH_REPORT_FILE = 'batch_report.json'
+BATCH_LOG_DIR = 'logs'
+# ไฟล์ร่วมของทุก item วางไว้ที่นี่ครั้งเดียว (โฟลเดอร์ซ่อน ไม่ถูกนับเป็นผลลัพธ์)
+SHARED_DIR = '.shared'
+
+
+class BatchInputs:
+    """ชุด input ของ batch จาก ZIP หรือโฟลเดอร์ที่อัปโหลด
+
+    โฟลเดอร์ระดับบนสุดแต่ละโฟลเดอร์คือหนึ่ง item (เช่น session_01/raw.csv, session_02/raw.csv)
+    ไฟล์ที่อยู่ระดับบนสุดเป็นไฟล์ร่วมของทุก item (เช่น smell_Name.xlsx)
+    ถ้าทุกอย่างอยู่ใต้โฟลเดอร์เดียว (zip ทั้งโฟลเดอร์) จะข้ามโฟลเดอร์นั้นไปก่อน
+    เนื้อไฟล์เก็บลง BlobStore (ไฟล์ซ้ำกันเก็บครั้งเดียว และแปลง encoding เหมือนไฟล์ที่ import ปกติ)
+    """
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.shared = {}
+        # batch อยู่ใน session_state ไม่ได้อยู่ใน Memory จึงถือ lease ของ blob ไว้เองจนกว่า batch จะถูกทิ้ง
+        self.lease = BlobLease()
+
+    #อ่านจาก ZIP (path หรือ file object) ทีละไฟล์แบบ stream
+    @classmethod
+    def from_zip(cls, source, blob_store=None):
+        with zipfile.ZipFile(source) as archive:
+            entries = [info for info in archive.infolist() if not info.is_dir()]
+            return cls._build(
+                [(info.filename, info) for info in entries],
+                lambda info: archive.open(info),
+                blob_store
+            )
+
+    #อ่านจากไฟล์ที่อัปโหลดทั้งโฟลเดอร์ (ชื่อไฟล์เป็น path เทียบกับโฟลเดอร์ที่เลือก)
+    @classmethod
+    def from_files(cls, files, blob_store=None):
+        return cls._build([(f.name, f) for f in files], lambda f: f, blob_store)
+
+    @classmethod
+    def _build(cls, named_sources, open_source, blob_store):
+        blob_store = blob_store or BlobStore()
+        paths = []
+        for name, source in named_sources:
+            path = cls._normalize(name)
+            if path is not None:
+                paths.append((path, source))
+
+        # zip ของทั้งโฟลเดอร์: ทุกไฟล์อยู่ใต้โฟลเดอร์เดียวกัน
+        while paths and all('/' in path for path, _ in paths):
+            roots = {path.split('/', 1)[0] for path, _ in paths}
+            if len(roots) != 1 or all(path.count('/') < 2 for path, _ in paths):
+                break
+            paths = [(path.split('/', 1)[1], source) for path, source in paths]
+
+        batch = cls()
+        for path, source in sorted(paths, key=lambda item: item[0]):
+            if '/' in path:
+                item, relative = path.split('/', 1)
+                if item == BATCH_LOG_DIR:
+                    raise ValueError(f"'{BATCH_LOG_DIR}' is reserved for batch logs, rename that folder")
+                if item not in batch.items and len(batch.items) >= BATCH_MAX_ITEMS:
+                    raise ValueError(f"Batch has more than {BATCH_MAX_ITEMS} items")
+                target = batch.items.setdefault(item, {})
+            else:
+                relative = path
+                target = batch.shared
+            stream = open_source(source)
+            try:
+                if hasattr(stream, 'seek'):
+                    stream.seek(0)
+                target[relative] = blob_store.put_stream(stream, relative)
+                batch.lease.add([target[relative]])
+            finally:
+                if stream is not source:
+                    stream.close()
+        return batch
+
+    #path ใน ZIP ที่ปลอดภัย (ตัด path ที่ออกนอกโฟลเดอร์, ไฟล์ซ่อน และ metadata ของ macOS)
+    @staticmethod
+    def _normalize(name):
+        path = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        parts = path.split('/')
+        if path in ('', '.') or '..' in parts:
+            return None
+        if parts[0] == '__MACOSX' or any(part.startswith('.') for part in parts):
+            return None
+        return path
+
+    def blob_handles(self):
+        yield from self.shared.values()
+        for files in self.items.values():
+            yield from files.values()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class BatchRunner:
+
+    #รัน script เดียวกับทุก item (แต่ละ item มี workspace ของตัวเองใต้ temp directory ของ batch)
+    #ไฟล์ร่วม (shared_files จาก Memory + ไฟล์ระดับบนของ ZIP) วางลง .shared ครั้งเดียวแบบอ่านอย่างเดียว
+    #แล้ว hardlink เข้าแต่ละ workspace (ไม่ copy ซ้ำต่อ item)
+    #item รันพร้อมกันสูงสุด max_parallel ตัว (ค่าเริ่มต้น = จำนวน CPU core) ผ่าน worker pool หรือ process ใหม่
+    #เมื่อรันผ่าน RunScheduler จำนวนนี้ถูกจำกัดด้วยช่องรันที่ว่างอยู่ด้วย
+    #ผลลัพธ์: โฟลเดอร์ของแต่ละ item + logs/<item>/ + batch_report.json และ manifest รวมสำหรับ ZIP
+    @staticmethod
+    def run(script_content, filename, batch, shared_files=None, pool=None, run_info=None, output=None,
+            metrics_registry=None, render_profile=None, policy=None, max_parallel=BATCH_MAX_PARALLEL):
+        if run_info is None:
+            run_info = {}
+        if output is None:
+            output = RunOutput()
+        if policy is None:
+            policy = RunPolicy()
+        metrics = run_info.setdefault('metrics', RunMetrics())
+        token = run_info.setdefault('cancel_token', CancelToken())
+        render_profile = render_profile if render_profile in RENDER_PROFILES else DEFAULT_RENDER_PROFILE
+        run_info['render_profile'] = render_profile
+        run_info['mode'] = 'batch'
+        run_info['script_hash'] = RunHistory.script_hash(script_content)
+        # input ของแต่ละ item บันทึกเป็น <item>/<ไฟล์> ไฟล์ร่วมใช้ชื่อเดิม
+        inputs = dict(shared_files or {})
+        inputs.update(batch.shared)
+        for name, files in batch.items.items():
+            inputs.update((f"{name}/{filename}", content) for filename, content in files.items())
+        run_info['inputs'] = RunHistory.describe_inputs(inputs)
+        max_parallel = max(1, min(max_parallel or BatchRunner.available_cores(), len(batch.items) or 1))
+        # งานจาก RunScheduler ถือช่องรันอยู่ 1 ช่อง item ที่รันพร้อมกันเกินจากนั้นต้องยืมช่องที่ว่างจาก scheduler
+        # (นับรวมใน RUN_MAX_CONCURRENT / RUN_MAX_PER_USER) ไม่ได้ช่องเพิ่มก็รันทีละ item
+        borrow_slots = run_info.get('borrow_slots')
+        if borrow_slots is not None:
+            max_parallel = 1 + borrow_slots(max_parallel - 1)
+
+        report = {
+            'script': filename,
+            'parallel': max_parallel,
+            'items': OrderedDict((name, {'status': 'pending', 'seconds': None}) for name in batch.items),
+        }
+        run_info['batch'] = report
+        run_info['progress'] = (0, len(batch.items))
+
+        temp_dir = None
+        try:
+            with metrics.phase('stage'):
+                temp_dir = tempfile.mkdtemp(prefix="batch_")
+                shared = dict(shared_files or {})
+                shared.update(batch.shared)
+                shared_paths = BatchRunner._stage_shared(shared, temp_dir)
+            script_source = script_content.replace("encoding='tis-620'", "encoding='utf-8'")
+
+            started = time.time()
+            with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="batch") as executor:
+                futures = {
+                    executor.submit(
+                        BatchRunner._run_item, script_source, filename, name, files, shared_paths, temp_dir,
+                        pool, metrics_registry, render_profile, policy, token.child()
+                    ): name
+                    for name, files in batch.items.items()
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    name = futures[future]
+                    item = report['items'][name]
+                    item.update(future.result())
+                    run_info['progress'] = (done, len(batch.items))
+                    line = f"[batch] {done}/{len(batch.items)} {name}: {item['status']} ({item['seconds']:.2f}s)"
+                    if item.get('error'):
+                        line += f" - {item['error']}"
+                    stream = output.stdout if item['status'] == 'success' else output.stderr
+                    stream.feed(f"{line}\n".encode('utf-8'))
+            report['seconds'] = round(time.time() - started, 3)
+            BatchRunner._write_results(temp_dir, report)
+        except Exception as e:
+            output.stderr.feed(f"Error running batch: {e}\n".encode('utf-8'))
+        finally:
+            output.close()
+
+        if token.is_set:
+            run_info['stopped'] = token.reason
+        statuses = [item['status'] for item in report['items'].values()]
+        report['summary'] = {status: statuses.count(status) for status in sorted(set(statuses))}
+        returncode = 0 if statuses and all(status == 'success' for status in statuses) else 1
+        return output.stdout.text(), output.stderr.text(), returncode, temp_dir
+
+    #จำนวน CPU core ที่ process นี้ใช้ได้จริง (รวม cpuset ของ container)
+    @staticmethod
+    def available_cores():
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+
+    #วางไฟล์ร่วมครั้งเดียวและตั้งเป็นอ่านอย่างเดียว คืน {ชื่อไฟล์: path}
+    @staticmethod
+    def _stage_shared(shared, temp_dir):
+        shared_dir = os.path.join(temp_dir, SHARED_DIR)
+        os.makedirs(shared_dir)
+        paths = ScriptRunner._stage_input_files(shared, shared_dir)
+        for path in paths.values():
+            os.chmod(path, 0o444)
+        return paths
+
+    #รัน item เดียวใน workspace ของตัวเอง (<batch>/<item>)
+    @staticmethod
+    def _run_item(script_source, filename, name, files, shared_paths, temp_dir, pool, metrics_registry,
+                  render_profile, policy, token):
+        result = {'returncode': None, 'error': None, 'outputs': []}
+        started = time.time()
+        if token.is_set:
+            result.update(status='cancelled', seconds=0.0)
+            return result
+
+        item_dir = os.path.join(temp_dir, name)
+        item_output = RunOutput()
+        item_info = {'cancel_token': token, 'metrics': RunMetrics()}
+        try:
+            ScriptRunner._stage_input_files(files, item_dir)
+            for shared_name, shared_path in shared_paths.items():
+                # ไฟล์ของ item เองที่ชื่อซ้ำกับไฟล์ร่วมใช้ของ item
+                if shared_name not in files:
+                    link_or_copy(shared_path, os.path.join(item_dir, shared_name))
+            _, _, returncode = ScriptRunner._execute(
+                script_source, item_dir, pool, item_info, item_output, use_harness=True,
+                render=RENDER_PROFILES[render_profile], policy=policy
+            )
+        except subprocess.TimeoutExpired:
+            item_info['stopped'] = 'timeout'
+            item_output.stderr.feed(f"\n{policy.message('timeout')}\n".encode('utf-8'))
+            returncode = 1
+        except Exception as e:
+            item_output.stderr.feed(f"Error running script: {str(e)}\n".encode('utf-8'))
+            returncode = 1
+        finally:
+            item_output.close()
+        if metrics_registry is not None:
+            metrics_registry.observe_run(filename, item_info, returncode)
+
+        # log เต็มของ item (ไม่ใช่แค่ส่วนหัว/ท้ายที่เก็บใน memory)
+        log_dir = os.path.join(temp_dir, BATCH_LOG_DIR, name)
+        os.makedirs(log_dir, exist_ok=True)
+        for capture, label in ((item_output.stdout, 'stdout'), (item_output.stderr, 'stderr')):
+            shutil.copyfile(capture.spill_path, os.path.join(log_dir, f"{label}.log"))
+
+        result.update(
+            returncode=returncode, seconds=round(time.time() - started, 3), stderr=item_output.stderr.text(),
+            mode=item_info.get('mode'), outputs=OutputManifest.read(item_dir) or [],
+        )
+        if item_info.get('stopped'):
+            result.update(status='cancelled' if item_info['stopped'] == 'cancelled' else 'failed',
+                          error=policy.message(item_info['stopped']))
+        elif returncode != 0:
+            result.update(status='failed', error=f"exit code {returncode}")
+        else:
+            result['status'] = 'success'
+        return result
+
+    #เขียน batch_report.json และ manifest รวม (path ขึ้นต้นด้วยชื่อ item) ให้ ZIP/preview ใช้เหมือนการรันเดี่ยว
+    @staticmethod
+    def _write_results(temp_dir, report):
+        files = []
+        for name, item in report['items'].items():
+            for entry in item.get('outputs', []):
+                files.append(dict(entry, path=f"{name}/{entry['path']}", item=name))
+            for label in ('stdout', 'stderr'):
+                path = f"{BATCH_LOG_DIR}/{name}/{label}.log"
+                if os.path.exists(os.path.join(temp_dir, path)):
+                    files.append({
+                        'path': path, 'size': os.path.getsize(os.path.join(temp_dir, path)), 'type': file_type(path),
+                        'created': True, 'site': None, 'producer': 'batch', 'item': name,
+                    })
+
+        report_view = {
+            'script': report['script'], 'seconds': report.get('seconds'),
+            'items': {
+                name: {key: item.get(key) for key in ('status', 'seconds', 'returncode', 'error', 'mode')}
+                | {'outputs': [entry['path'] for entry in item.get('outputs', [])]}
+                for name, item in report['items'].items()
+            },
+        }
+        with open(os.path.join(temp_dir, BATCH_REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report_view, f, indent=2, ensure_ascii=False)
+        files.append({
+            'path': BATCH_REPORT_FILE, 'size': os.path.getsize(os.path.join(temp_dir, BATCH_REPORT_FILE)),
+            'type': file_type(BATCH_REPORT_FILE), 'created': True, 'site': None, 'producer': 'batch', 'item': None,
+        })
+        OutputManifest.write(temp_dir, sorted(files, key=lambda entry: entry['path']))
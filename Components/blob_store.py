@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import codecs
+import hashlib
+import shutil
+import weakref
+import tempfile
+from .config import BLOB_STORE_DIR, BINARY_EXTENSIONS, STORAGE_LEASE_MAX_SECONDS
+
+CHUNK_SIZE = 1024 * 1024
+
+# โฟลเดอร์ของ lease ใน root ของ store (ขึ้นต้นด้วย . จึงไม่ถูกนับเป็น prefix ของ blob)
+LEASE_DIR = '.leases'
+
+# ลำดับ encoding ที่ลองตอน ingest (ไฟล์ภาษาไทยจาก Excel/Windows มักเป็น tis-620 หรือ cp874)
+TEXT_ENCODINGS = ['utf-8', 'tis-620', 'cp874']
+
+
+class BlobHandle:
+    """ตัวอ้างอิงไฟล์ใน BlobStore (session เก็บแค่ตัวนี้ ไม่เก็บเนื้อไฟล์)"""
+
+    __slots__ = ('digest', 'size', 'kind', 'encoding', 'path')
+
+    def __init__(self, digest, size, kind, encoding, path):
+        self.digest = digest
+        self.size = size
+        self.kind = kind
+        self.encoding = encoding
+        self.path = path
+
+    @property
+    def is_binary(self):
+        return self.kind == 'binary'
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    #เนื้อไฟล์ใน store ยังเหมือนตอน ingest (ใช้ตรวจก่อนวางลง workspace)
+    def is_intact(self):
+        return BlobStore._path_is_intact(self.path, self.size)
+
+    def __repr__(self):
+        return f"BlobHandle({self.digest[:12]}, {self.size} bytes, {self.kind})"
+
+
+class BlobStore:
+    """ที่เก็บไฟล์แบบ content-addressed (ชื่อไฟล์คือ SHA-256 ของเนื้อหา) บน local disk
+
+    ไฟล์ที่เนื้อหาเหมือนกันจะถูกเก็บครั้งเดียวไม่ว่าจะมีกี่ session อัปโหลด
+    ไฟล์ text จะถูกแปลงเป็น utf-8 ตั้งแต่ตอน ingest และบันทึก encoding เดิมไว้ใน metadata
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _meta_path(self, digest):
+        return self._blob_path(digest) + '.json'
+
+    #คืน handle จาก digest ถ้ามีไฟล์อยู่ใน store
+    def get(self, digest):
+        try:
+            with open(self._meta_path(digest), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not self._is_intact(digest, meta['size']):
+            return None
+        return BlobHandle(digest, meta['size'], meta['kind'], meta.get('encoding'), self._blob_path(digest))
+
+    #ไฟล์ใน store ตั้ง mtime เป็น 0 ไว้ ถ้า mtime เปลี่ยนแปลว่ามีการเขียนทับไฟล์ใน store
+    def _is_intact(self, digest, size):
+        return self._path_is_intact(self._blob_path(digest), size)
+
+    @staticmethod
+    def _path_is_intact(path, size):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return stat.st_mtime_ns == 0 and stat.st_size == size
+
+    #รายการ blob ทั้งหมดใน store: (digest, ขนาด, เวลาที่เก็บ)
+    def list_blobs(self):
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir() or prefix.name.startswith('.'):
+                continue
+            for entry in os.scandir(prefix.path):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        size = json.load(f)['size']
+                except (OSError, ValueError, KeyError):
+                    continue
+                yield entry.name[:-len('.json')], size, stat.st_mtime
+
+    #digest ที่มี lease ถืออยู่ (lease ที่ไม่ถูกต่ออายุเกิน max_age ถือว่า process เจ้าของตายไปแล้ว และถูกลบทิ้ง)
+    def leased_digests(self, max_age=STORAGE_LEASE_MAX_SECONDS):
+        now = time.time()
+        digests = set()
+        try:
+            leases = list(os.scandir(os.path.join(self.root, LEASE_DIR)))
+        except FileNotFoundError:
+            return digests
+        for lease in leases:
+            try:
+                if now - lease.stat().st_mtime > max_age:
+                    shutil.rmtree(lease.path, ignore_errors=True)
+                    continue
+                digests.update(os.listdir(lease.path))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return digests
+
+    #ลบ blob ออกจาก store (ไฟล์ที่วางลง workspace แล้วยังอยู่ครบ)
+    def remove(self, digest):
+        for path in (self._meta_path(digest), self._blob_path(digest)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    #เก็บไฟล์จาก stream (อ่านทีละ chunk) ตรวจ charset ครั้งเดียวตอนนี้
+    def put_stream(self, stream, filename):
+        extension = filename.split('.')[-1].lower() if '.' in filename else 'unknown'
+        force_binary = extension in BINARY_EXTENSIONS
+
+        decoders = {} if force_binary else {
+            name: codecs.getincrementaldecoder(name)() for name in TEXT_ENCODINGS
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            hasher = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    for name in list(decoders):
+                        try:
+                            decoders[name].decode(chunk)
+                        except UnicodeDecodeError:
+                            del decoders[name]
+
+            for name in list(decoders):
+                try:
+                    decoders[name].decode(b'', final=True)
+                except UnicodeDecodeError:
+                    del decoders[name]
+            encoding = next((name for name in TEXT_ENCODINGS if name in decoders), None)
+
+            if encoding is None:
+                return self._commit(tmp_path, hasher.hexdigest(), size, 'binary', None)
+            if encoding == 'utf-8':
+                return self._commit(tmp_path, hasher.hexdigest(), size, 'text', encoding)
+
+            # แปลงเป็น utf-8 ครั้งเดียว process ลูกไม่ต้องเดา encoding เองอีก
+            return self._commit_transcoded(tmp_path, encoding)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def put_bytes(self, data, filename):
+        return self.put_stream(_BytesReader(data), filename)
+
+    def _commit_transcoded(self, source_path, encoding):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            hasher = hashlib.sha256()
+            size = 0
+            decoder = codecs.getincrementaldecoder(encoding)()
+            with open(source_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    data = decoder.decode(chunk, final=not chunk).encode('utf-8')
+                    dst.write(data)
+                    hasher.update(data)
+                    size += len(data)
+                    if not chunk:
+                        break
+            return self._commit(tmp_path, hasher.hexdigest(), size, 'text', encoding)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    #ย้ายไฟล์ชั่วคราวเข้า store (ถ้ามีเนื้อหาเดียวกันอยู่แล้วก็ใช้ของเดิม)
+    def _commit(self, tmp_path, digest, size, kind, encoding):
+        existing = self.get(digest)
+        if existing is not None:
+            # บันทึกเวลาที่ถูกใช้ล่าสุด กันไม่ให้ถูกลบตอนเก็บกวาด blob ที่ไม่มีใครใช้
+            os.utime(self._meta_path(digest))
+            return existing
+
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        os.utime(tmp_path, ns=(time.time_ns(), 0))
+        os.replace(tmp_path, blob_path)
+
+        meta = {'size': size, 'kind': kind, 'encoding': encoding}
+        meta_tmp = blob_path + '.json.tmp'
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, self._meta_path(digest))
+
+        return BlobHandle(digest, size, kind, encoding, blob_path)
+
+
+class BlobLease:
+    """กัน blob ไม่ให้ถูกลบตอนเก็บกวาด ระหว่างที่ผู้ถือที่ไม่ใช่ session ยังต้องใช้อยู่
+
+    ผู้ถือ: งานที่รอคิวใน RunScheduler, BatchInputs และไฟล์ input ของ headless ที่ยังไม่ได้ส่งงาน
+    lease เป็นไฟล์ว่าง <root>/.leases/<lease>/<digest> จึงมีผลกับทุก process ที่ใช้ store เดียวกัน
+    ปล่อยเมื่อเรียก release() หรือเมื่อ object ถูกเก็บกวาด
+    """
+
+    def __init__(self, handles=()):
+        self._directories = {}
+        self._finalizer = weakref.finalize(self, BlobLease._remove, self._directories)
+        self.add(handles)
+
+    #เพิ่ม handle เข้า lease (root ของ store ดูจาก path ของ handle: <root>/<prefix>/<digest>)
+    def add(self, handles):
+        for handle in handles:
+            root = os.path.dirname(os.path.dirname(handle.path))
+            directory = self._directories.get(root)
+            if directory is None:
+                lease_root = os.path.join(root, LEASE_DIR)
+                os.makedirs(lease_root, exist_ok=True)
+                directory = self._directories[root] = tempfile.mkdtemp(prefix='lease_', dir=lease_root)
+            open(os.path.join(directory, handle.digest), 'a').close()
+            # ต่ออายุ lease (lease ที่ mtime เก่าเกินกำหนดถือว่าไม่มีเจ้าของแล้ว)
+            os.utime(directory)
+
+    def release(self):
+        self._finalizer()
+
+    @staticmethod
+    def _remove(directories):
+        for directory in directories.values():
+            shutil.rmtree(directory, ignore_errors=True)
+        directories.clear()
+
+    #BlobHandle ทั้งหมดใน value (dict / list / tuple ซ้อนกัน และ object ที่มี blob_handles() เช่น BatchInputs)
+    @staticmethod
+    def handles_in(*values):
+        for value in values:
+            if isinstance(value, BlobHandle):
+                yield value
+            elif isinstance(value, dict):
+                yield from BlobLease.handles_in(*value.values())
+            elif isinstance(value, (list, tuple)):
+                yield from BlobLease.handles_in(*value)
+            elif hasattr(value, 'blob_handles'):
+                yield from value.blob_handles()
+
+
+class _BytesReader:
+    """อ่าน bytes ทีละ chunk โดยไม่ copy ทั้งก้อน"""
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self._view) - self._offset
+        chunk = self._view[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return bytes(chunk)
@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 import yaml
+import tempfile
 
 def load_css(file_name):
     """โหลด CSS จากไฟล์แยก"""
@@ -35,7 +36,10 @@ def init_page_config():
     )
 
 # ค่าคงที่ต่างๆ
-BINARY_EXTENSIONS = ['xlsx', 'xls', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'ico', 'zip', 'rar', '7z', 'exe', 'dll']
+BINARY_EXTENSIONS = ['xlsx', 'xls', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'ico', 'zip', 'rar', '7z', 'exe', 'dll',
+                     'parquet', 'feather', 'arrow']
+# ไฟล์ตารางแบบ columnar (Parquet / Feather / Arrow IPC) แสดงตัวอย่างผ่าน pyarrow โดยไม่ต้องอ่านทั้งไฟล์
+COLUMNAR_EXTENSIONS = ['parquet', 'feather', 'arrow']
 
 LANGUAGE_MAP = {
     'py': 'python',
@@ -49,4 +53,127 @@ LANGUAGE_MAP = {
     'txt': 'text',
     'csv': 'text',
     'log': 'text'
-}
\ No newline at end of file
+}
+
+# ค่าตั้งค่า Worker Pool (process ที่ import library หนักไว้ล่วงหน้า)
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "2"))
+WORKER_MAX_RUNS = int(os.getenv("WORKER_MAX_RUNS", "50"))
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "1024"))
+WORKER_ACQUIRE_TIMEOUT = float(os.getenv("WORKER_ACQUIRE_TIMEOUT", "0.5"))
+WORKER_PRELOAD_MODULES = ['pandas', 'numpy', 'matplotlib', 'sklearn', 'pyarrow.parquet']
+
+# ที่เก็บไฟล์ที่ import แบบ content-addressed (วางลง workspace ด้วย reflink ถ้า filesystem รองรับ ไม่งั้น copy)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "script_runner_blobs"))
+
+# การแสดง output ของ script: เก็บใน memory เฉพาะส่วนหัว/ท้าย ที่เหลือเขียนลงไฟล์ log
+OUTPUT_HEAD_LINES = int(os.getenv("OUTPUT_HEAD_LINES", "200"))
+OUTPUT_TAIL_LINES = int(os.getenv("OUTPUT_TAIL_LINES", "200"))
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(tempfile.gettempdir(), "script_runner_logs"))
+LOG_RETENTION_SECONDS = int(os.getenv("LOG_RETENTION_SECONDS", str(24 * 60 * 60)))
+
+# คิวรัน script: จำนวนงานที่รันพร้อมกันทั้งระบบ / ต่อผู้ใช้ และเวลาที่เก็บผลลัพธ์ไว้หลังรันจบ
+RUN_MAX_CONCURRENT = int(os.getenv("RUN_MAX_CONCURRENT", "4"))
+RUN_MAX_PER_USER = int(os.getenv("RUN_MAX_PER_USER", "1"))
+RUN_JOB_RETENTION_SECONDS = int(os.getenv("RUN_JOB_RETENTION_SECONDS", str(60 * 60)))
+RUN_POLL_INTERVAL = float(os.getenv("RUN_POLL_INTERVAL", "0.5"))
+
+# cache ผลการรัน (key = hash ของ script + ไฟล์ input + เวอร์ชัน harness)
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "script_runner_results"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+
+
+# cache ของ script จาก MongoDB: bytecode ที่ compile แล้ว และช่วงเวลา poll หา script ที่ถูกอัปเดต (ถ้าไม่มี change stream)
+SCRIPT_CACHE_DIR = os.getenv("SCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "script_runner_scripts"))
+SCRIPT_CACHE_POLL_INTERVAL = float(os.getenv("SCRIPT_CACHE_POLL_INTERVAL", "5"))
+
+# การสร้าง ZIP ของไฟล์ผลลัพธ์: นามสกุลที่บีบอัดอยู่แล้ว (เก็บแบบไม่บีบซ้ำ), ขนาดไฟล์ text ที่แยกบีบอัดแบบขนาน
+# และขนาดที่ ZIP ยังอยู่ใน memory ก่อนย้ายลง disk
+ZIP_STORED_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'webp', 'xlsx', 'docx', 'pptx', 'zip', 'gz', 'bz2', 'xz', '7z', 'rar', 'parquet', 'feather']
+ZIP_PARALLEL_MIN_MB = int(os.getenv("ZIP_PARALLEL_MIN_MB", "8"))
+ZIP_SPOOL_MAX_MB = int(os.getenv("ZIP_SPOOL_MAX_MB", "32"))
+
+# ตัวอย่างไฟล์ (preview): จำนวนแถว/บรรทัดที่แสดง และจำนวนผลลัพธ์ที่ cache ไว้
+PREVIEW_ROWS = int(os.getenv("PREVIEW_ROWS", "10"))
+PREVIEW_CACHE_ENTRIES = int(os.getenv("PREVIEW_CACHE_ENTRIES", "256"))
+
+# render profile ของกราฟที่ harness บันทึกจาก plt.show() (เลือกได้ต่อ script ผ่าน field render_profile ในเอกสาร)
+RENDER_PROFILES = {
+    'draft': {'format': 'png', 'dpi': 100},
+    'report': {'format': 'png', 'dpi': 300},
+    'svg': {'format': 'svg', 'dpi': 100},
+    'pdf': {'format': 'pdf', 'dpi': 300},
+}
+DEFAULT_RENDER_PROFILE = os.getenv("DEFAULT_RENDER_PROFILE", "report")
+
+# ภาพย่อของกราฟ: ขนาดด้านยาวสุด (pixel) และจำนวน thread ที่สร้างภาพย่อใน background
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# พื้นที่เก็บไฟล์ที่ import: ต่อ session / รวมทั้งระบบ, เวลาที่ session ไม่ได้ใช้งานก่อนถูกปล่อยไฟล์ และรอบการเก็บกวาด blob
+STORAGE_SESSION_MAX_MB = int(os.getenv("STORAGE_SESSION_MAX_MB", "2048"))
+STORAGE_GLOBAL_MAX_MB = int(os.getenv("STORAGE_GLOBAL_MAX_MB", "20480"))
+STORAGE_SESSION_IDLE_SECONDS = int(os.getenv("STORAGE_SESSION_IDLE_SECONDS", str(2 * 60 * 60)))
+STORAGE_GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", "60"))
+# lease ของ blob (งานในคิว, batch, input ของ headless) ที่ไม่ถูกต่ออายุเกินเวลานี้ถือว่าเจ้าของตายไปแล้ว
+STORAGE_LEASE_MAX_SECONDS = int(os.getenv("STORAGE_LEASE_MAX_SECONDS", str(24 * 60 * 60)))
+
+# GridFS: content ของ script ที่ใหญ่เกินขนาดนี้ย้ายไปเก็บใน GridFS (เอกสาร MongoDB จำกัด 16 MB)
+# ขนาด chunk และชื่อ bucket ของ script และของไฟล์ผลลัพธ์ที่เก็บถาวร (artifact)
+GRIDFS_THRESHOLD_KB = int(os.getenv("GRIDFS_THRESHOLD_KB", "1024"))
+GRIDFS_CHUNK_KB = int(os.getenv("GRIDFS_CHUNK_KB", "255"))
+GRIDFS_SCRIPT_BUCKET = os.getenv("GRIDFS_SCRIPT_BUCKET", "script_content")
+GRIDFS_ARTIFACT_BUCKET = os.getenv("GRIDFS_ARTIFACT_BUCKET", "run_artifacts")
+
+# รายการ script: จำนวนต่อหน้าในตัวเลือก script และเวลาที่ cache ผลการค้นหา (วินาที)
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "50"))
+CATALOG_CACHE_SECONDS = float(os.getenv("CATALOG_CACHE_SECONDS", "30"))
+
+# metrics ของการรัน (รูปแบบ Prometheus): ไฟล์ที่เขียนเป็นระยะ (สำหรับ textfile collector), รอบการเขียน (วินาที)
+# และ port ของ endpoint /metrics (0 = ไม่เปิด)
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(tempfile.gettempdir(), "script_runner_metrics.prom"))
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "15"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# ข้อจำกัดของการรันเริ่มต้น (แต่ละ script ตั้งเองได้ผ่าน field run_policy ในเอกสาร): เวลา (วินาที), memory (MB),
+# CPU time (วินาที) และขนาด output รวม stdout/stderr (MB) — 0 = ไม่จำกัด (ยกเว้นเวลา)
+RUN_TIMEOUT_SECONDS = float(os.getenv("RUN_TIMEOUT_SECONDS", "60"))
+RUN_MEMORY_LIMIT_MB = int(os.getenv("RUN_MEMORY_LIMIT_MB", "0"))
+RUN_CPU_LIMIT_SECONDS = int(os.getenv("RUN_CPU_LIMIT_SECONDS", "0"))
+RUN_MAX_OUTPUT_MB = int(os.getenv("RUN_MAX_OUTPUT_MB", "0"))
+# cgroup v2 ที่ server มีสิทธิ์สร้าง cgroup ย่อย (เช่น /sys/fs/cgroup/script_runner) ถ้าตั้งไว้จะจำกัด memory ด้วย
+# memory.max (นับ RSS ของทั้ง process tree) แทน RLIMIT_AS
+RUN_CGROUP_ROOT = os.getenv("RUN_CGROUP_ROOT", "")
+
+# pipeline ของหลาย script (เอกสารใน collection นี้ของฐานข้อมูลเดียวกัน) และจำนวนขั้นที่รันพร้อมกันได้ในหนึ่ง pipeline
+# (ขั้นที่เกิน 1 ขั้นใช้ช่องรันที่ว่างของ RUN_MAX_CONCURRENT / RUN_MAX_PER_USER)
+PIPELINE_COLLECTION_NAME = os.getenv("MONGO_PIPELINE_COLLECTION_NAME", "pipelines")
+PIPELINE_MAX_PARALLEL = int(os.getenv("PIPELINE_MAX_PARALLEL", "2"))
+
+# batch mode (script เดียวกับหลายชุด input): จำนวน item ที่รันพร้อมกัน (0 = เท่าจำนวน CPU core ที่ใช้ได้)
+# และจำนวน item สูงสุดต่อหนึ่ง batch (item ที่เกิน 1 ตัวใช้ช่องรันที่ว่างของ RUN_MAX_CONCURRENT / RUN_MAX_PER_USER)
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "0"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# headless.py (CLI / HTTP API): port ของ API, ขนาด upload สูงสุดต่อคำขอ (MB)
+# และจำนวนงานที่ผู้ใช้ (header X-User-Id) หนึ่งคนรันพร้อมกันได้ผ่าน API
+HEADLESS_PORT = int(os.getenv("HEADLESS_PORT", "8600"))
+HEADLESS_MAX_UPLOAD_MB = int(os.getenv("HEADLESS_MAX_UPLOAD_MB", "512"))
+HEADLESS_MAX_PER_USER = int(os.getenv("HEADLESS_MAX_PER_USER", str(RUN_MAX_CONCURRENT)))
+
+# เป้าหมายเวลาวาดใหม่ของแต่ละส่วนของหน้าเว็บ (fragment) ต่อการกดหนึ่งครั้ง (มิลลิวินาที) ใช้โดย benchmarks/bench_pipeline.py --suites ui
+UI_RERUN_TARGET_MS = float(os.getenv("UI_RERUN_TARGET_MS", "250"))
+
+# จำนวนไฟล์ที่แสดงรายละเอียด/ตัวอย่างต่อหน้าในส่วน Import (เลือกไฟล์จำนวนมากแล้วไม่ต้องวาดทุกไฟล์ทุกครั้ง)
+UPLOAD_DETAIL_PAGE_SIZE = int(os.getenv("UPLOAD_DETAIL_PAGE_SIZE", "20"))
+
+# ประวัติการรัน: ฐานข้อมูล SQLite ของข้อมูลการรัน และโฟลเดอร์เก็บไฟล์ผลลัพธ์/log ของแต่ละการรัน (ดาวน์โหลดซ้ำได้โดยไม่ต้องรันใหม่)
+# เก็บข้อมูลการรันไว้ไม่เกิน RUN_HISTORY_MAX_DAYS วัน และไฟล์ผลลัพธ์รวมไม่เกิน RUN_HISTORY_MAX_MB (ลบไฟล์ของการรันเก่าสุดก่อน)
+RUN_HISTORY_DB = os.getenv("RUN_HISTORY_DB", os.path.join(tempfile.gettempdir(), "script_runner_history.sqlite3"))
+RUN_HISTORY_DIR = os.getenv("RUN_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "script_runner_history"))
+RUN_HISTORY_MAX_MB = int(os.getenv("RUN_HISTORY_MAX_MB", "2048"))
+RUN_HISTORY_MAX_DAYS = float(os.getenv("RUN_HISTORY_MAX_DAYS", "30"))
+RUN_HISTORY_PAGE_SIZE = int(os.getenv("RUN_HISTORY_PAGE_SIZE", "20"))
+
+# cookie ที่เก็บ id สำหรับดูประวัติการรันของตัวเองหลัง reload หน้า (ไม่ใส่ใน URL จึงไม่ติดไปกับลิงก์ที่แชร์) และอายุของ cookie (วัน)
+RUN_HISTORY_COOKIE = os.getenv("RUN_HISTORY_COOKIE", "script_runner_history")
+RUN_HISTORY_COOKIE_DAYS = int(os.getenv("RUN_HISTORY_COOKIE_DAYS", "365"))
\ No newline at end of file
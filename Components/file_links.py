@@ -0,0 +1,44 @@
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FICLONE = 0x40049409
+
+
+#วางไฟล์ลงปลายทางโดยไม่เขียนเนื้อหาใหม่ถ้าทำได้: reflink -> hardlink -> copy ตามลำดับ คืนวิธีที่ใช้
+#hardlink=False ใช้กับปลายทางที่ถูกเขียนได้ (แก้ไฟล์ปลายทางแล้วต้นทางไม่เปลี่ยน)
+def link_or_copy(source_path, target_path, hardlink=True):
+    target_dir = os.path.dirname(target_path)
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
+    if os.path.exists(target_path):
+        os.unlink(target_path)
+
+    if reflink(source_path, target_path):
+        return 'reflink'
+    if hardlink:
+        try:
+            os.link(source_path, target_path)
+            return 'hardlink'
+        except OSError:
+            pass
+    shutil.copyfile(source_path, target_path)
+    return 'copy'
+
+
+#copy-on-write clone (btrfs/xfs) ผ่าน ioctl FICLONE
+def reflink(source_path, target_path):
+    if fcntl is None:
+        return False
+    try:
+        with open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target_path):
+            os.unlink(target_path)
+        return False
@@ -1,35 +1,24 @@
 import streamlit as st
-import pandas as pd
-import base64
 import os
 import shutil
-import zipfile
-import io
-from .config import BINARY_EXTENSIONS, LANGUAGE_MAP
+from .config import BINARY_EXTENSIONS, COLUMNAR_EXTENSIONS, LANGUAGE_MAP, PREVIEW_ROWS
+from .blob_store import BlobStore
+from .zip_export import build_zip
+from .preview import FilePreview
+from .manifest import OutputManifest
+
+# fragment ของหน้าเว็บ (key ของ st.fragment ใน main.py) ที่ต้องวาดใหม่เมื่อรายการไฟล์ใน Memory เปลี่ยน
+MEMORY_FRAGMENTS = ['import', 'memory', 'pipeline']
+# fragment ที่แสดงผลลัพธ์ของการรัน (ปุ่มส่งไฟล์ผลลัพธ์เป็น input อยู่ในนี้)
+RESULT_FRAGMENTS = ['scripts', 'pipeline']
 
 class FileManager:
     
-    #ดึงไฟล์จาก temp directory ทั้งหมด
+    #ดึงไฟล์ผลลัพธ์จาก temp directory (รวมโฟลเดอร์ย่อยทุกระดับ เช่น radarPlot folder)
+    #อ่านจาก manifest ที่ harness เขียนไว้ ถ้าไม่มีจะไล่ทั้ง directory แล้วตัดไฟล์ที่ชื่อตรงกับ input (exclude) ออก
     @staticmethod
-    def get_files_from_temp_dir(temp_dir):
-        if not temp_dir or not os.path.exists(temp_dir):
-            return []
-        
-        files = []
-        
-        # ค้นหาไฟล์ในโฟลเดอร์หลัก
-        for file_name in os.listdir(temp_dir):
-            file_path = os.path.join(temp_dir, file_name)
-            if os.path.isfile(file_path):
-                files.append(file_path)
-            elif os.path.isdir(file_path):
-                # ค้นหาไฟล์ในโฟลเดอร์ย่อย (เช่น radarPlot folder)
-                for sub_file in os.listdir(file_path):
-                    sub_file_path = os.path.join(file_path, sub_file)
-                    if os.path.isfile(sub_file_path):
-                        files.append(sub_file_path)
-        
-        return files
+    def get_files_from_temp_dir(temp_dir, exclude=()):
+        return [os.path.join(temp_dir, item['path']) for item in OutputManifest.outputs(temp_dir, exclude)]
 
     #ลบไฟล์ชั่วคราวใน temp directory ทั้งหมด
     @staticmethod
@@ -40,28 +29,75 @@ class FileManager:
             except:
                 pass
 
-    #สร้างไฟล์ ZIP
+    #อ่านไฟล์ทั้งไฟล์ (ใช้กับปุ่มดาวน์โหลดแบบ callable ที่อ่านเมื่อผู้ใช้กดเท่านั้น)
     @staticmethod
-    def create_zip_from_files(file_paths):
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_path in file_paths:
-                if os.path.exists(file_path):
-                    # ใช้เฉพาะชื่อไฟล์ (ไม่รวม path) ใน ZIP
-                    arcname = os.path.basename(file_path)
-                    zip_file.write(file_path, arcname)
-        
-        zip_buffer.seek(0)
-        return zip_buffer.getvalue()
+    def read_file_bytes(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read()
 
-    #Func ยกเลิกการเลือกไฟล์
+    #สร้างไฟล์ ZIP (ใช้กับปุ่มดาวน์โหลดแบบ callable จะสร้างเมื่อผู้ใช้กดเท่านั้น)
+    #base_dir = โฟลเดอร์หลัก ใช้เก็บ path ของโฟลเดอร์ย่อยไว้ใน ZIP
+    @staticmethod
+    def create_zip_from_files(file_paths, base_dir=None):
+        with build_zip(file_paths, base_dir) as archive:
+            return archive.read()
+
+    #Func ยกเลิกการเลือกไฟล์ (callback ของปุ่ม ส่วน Import วาดใหม่ด้วย uploader key ใหม่)
     @staticmethod
     def clear_file_selection():
         st.session_state.clear_file_uploader = True
         # เพิ่ม uploader_key เพื่อสร้าง key ใหม่
         st.session_state.uploader_key += 1
-        st.rerun()
+
+    #เก็บไฟล์ที่อัปโหลดลง BlobStore แล้วเก็บเฉพาะ handle ไว้ใน session
+    #ตรวจพื้นที่ก่อนเขียน (เกินโควต้าจะ raise StorageQuotaExceeded)
+    @staticmethod
+    def save_uploaded_file(uploaded_file):
+        imported_files = st.session_state.imported_files
+        imported_files.check_quota(uploaded_file.name, uploaded_file.size)
+        uploaded_file.seek(0)  # รีเซ็ต pointer ก่อนอ่าน
+        handle = BlobStore().put_stream(uploaded_file, uploaded_file.name)
+        imported_files[uploaded_file.name] = handle
+        return handle
+
+    #callback ของปุ่มเก็บไฟล์: เก็บทุกไฟล์แล้ววาดใหม่เฉพาะ fragment ที่ใช้รายการไฟล์ใน Memory
+    #ข้อความผลการเก็บแสดงในส่วน Import รอบถัดไป (st.session_state.import_notices)
+    @staticmethod
+    def save_to_memory(uploaded_files, label=""):
+        notices = []
+        success_count = 0
+        for uploaded_file in uploaded_files:
+            try:
+                FileManager.save_uploaded_file(uploaded_file)
+                success_count += 1
+            except Exception as e:
+                notices.append(('error', f"❌ ไม่สามารถเก็บไฟล์ {uploaded_file.name}: {e}"))
+        
+        if len(uploaded_files) == 1 and success_count:
+            notices.append(('success', f"✅ เก็บไฟล์ {uploaded_files[0].name}{label} ใน Memory สำเร็จ!"))
+        elif success_count:
+            notices.append(('success', f"✅ เก็บไฟล์สำเร็จ {success_count} ไฟล์"))
+        error_count = len(uploaded_files) - success_count
+        if len(uploaded_files) > 1 and error_count:
+            notices.append(('error', f"❌ เก็บไฟล์ไม่สำเร็จ {error_count} ไฟล์"))
+        st.session_state.import_notices = notices
+        st.rerun(scope=MEMORY_FRAGMENTS)
+
+    #callback: เก็บไฟล์ผลลัพธ์ของการรันลง Memory เพื่อใช้เป็น input ของการรันถัดไป
+    #คัดลอก bytes ของไฟล์ตรงๆ (เช่น Parquet) ไม่ต้องดาวน์โหลดแล้ว import ใหม่ และไม่ parse ข้อมูลซ้ำ
+    #ผลการเก็บแสดงใต้ปุ่ม (st.session_state.output_notices ตาม path ของไฟล์)
+    @staticmethod
+    def save_output_to_memory(file_path, filename):
+        imported_files = st.session_state.imported_files
+        try:
+            imported_files.check_quota(filename, os.path.getsize(file_path))
+            with open(file_path, 'rb') as f:
+                imported_files[filename] = BlobStore().put_stream(f, filename)
+            notice = ('success', f"✅ เก็บ {filename} ใน Memory แล้ว ใช้เป็น input ของการรันถัดไปได้ทันที")
+        except Exception as e:
+            notice = ('error', f"❌ ไม่สามารถเก็บไฟล์ {filename}: {e}")
+        st.session_state.setdefault('output_notices', {})[file_path] = notice
+        st.rerun(scope=sorted(set(MEMORY_FRAGMENTS + RESULT_FRAGMENTS)))
 
     #Func ประมวลผลไฟล์ที่อัปโหลด
     @staticmethod
@@ -77,57 +113,74 @@ class FileManager:
     def _process_binary_file(uploaded_file, file_extension, i, uploader_key):
         st.info(f"📁 **ไฟล์ Binary:** {uploaded_file.name} ({file_extension.upper()})")
         
-        # แสดงผล Excel files
+        # แสดงผล Excel files (อ่านเฉพาะแถวที่แสดง)
         if file_extension in ['xlsx', 'xls']:
             try:
-                uploaded_file.seek(0)  # รีเซ็ต pointer
-                df = pd.read_excel(uploaded_file)
+                preview_key = FilePreview.upload_key(uploaded_file)
+                df, column_count = FilePreview.excel_head(preview_key, uploaded_file, file_extension)
                 st.markdown("**👁️ ตัวอย่างข้อมูลใน Excel:**")
-                st.dataframe(df.head(10), use_container_width=True)
+                st.dataframe(df, use_container_width=True)
                 
                 # แสดงข้อมูลเพิ่มเติม
                 col_info1, col_info2 = st.columns(2)
                 with col_info1:
-                    st.metric("📊 จำนวนแถว", len(df))
+                    # การนับแถวต้องอ่านทั้งไฟล์ ทำเมื่อผู้ใช้ขอเท่านั้น
+                    if st.checkbox("🔢 นับจำนวนแถว", key=f"count_rows_{i}_{uploader_key}"):
+                        st.metric("📊 จำนวนแถว", FilePreview.excel_row_count(preview_key, uploaded_file, file_extension))
                 with col_info2:
-                    st.metric("📊 จำนวนคอลัมน์", len(df.columns))
+                    st.metric("📊 จำนวนคอลัมน์", column_count)
                 
                 st.markdown("**📋 ชื่อคอลัมน์:**")
-                st.write(", ".join(df.columns.tolist()))
+                st.write(", ".join(str(column) for column in df.columns))
                 
             except Exception as e:
                 st.error(f"❌ ไม่สามารถอ่านไฟล์ Excel: {e}")
                 st.warning("⚠️ ไฟล์นี้เป็น Binary file ไม่สามารถแสดงเนื้อหาได้")
+        # แสดงผลไฟล์ Parquet / Feather / Arrow (อ่านเฉพาะ row group / record batch แรก)
+        elif file_extension in COLUMNAR_EXTENSIONS:
+            try:
+                preview_key = FilePreview.upload_key(uploaded_file)
+                df, column_count = FilePreview.columnar_head(preview_key, uploaded_file, file_extension)
+                st.markdown(f"**👁️ ตัวอย่างข้อมูลใน {file_extension.capitalize()}:**")
+                st.dataframe(df, use_container_width=True)
+                
+                col_info1, col_info2 = st.columns(2)
+                with col_info1:
+                    # Parquet นับจาก metadata, Feather/Arrow ต้องเปิดทุก record batch ทำเมื่อผู้ใช้ขอเท่านั้น
+                    if st.checkbox("🔢 นับจำนวนแถว", key=f"count_rows_{i}_{uploader_key}"):
+                        st.metric("📊 จำนวนแถว", f"{FilePreview.columnar_row_count(preview_key, uploaded_file, file_extension):,}")
+                with col_info2:
+                    st.metric("📊 จำนวนคอลัมน์", column_count)
+                
+            except Exception as e:
+                st.error(f"❌ ไม่สามารถอ่านไฟล์ {file_extension.capitalize()}: {e}")
         else:
             st.warning("⚠️ ไฟล์นี้เป็น Binary file ไม่สามารถแสดงเนื้อหาได้")
         
         # ปุ่มเก็บไฟล์ Binary ใน Memory
-        if st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_binary_{i}_{uploader_key}"):
-            uploaded_file.seek(0)  # รีเซ็ต pointer ก่อนอ่าน
-            binary_content = base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
-            st.session_state.imported_files[uploaded_file.name] = f"__BINARY__{binary_content}"
-            st.success(f"✅ เก็บไฟล์ {uploaded_file.name} (Binary) ใน Memory สำเร็จ!")
+        st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_binary_{i}_{uploader_key}",
+                  on_click=FileManager.save_to_memory, args=([uploaded_file], " (Binary)"))
 
     #ประมวลผลไฟล์ Text
     @staticmethod
     def _process_text_file(uploaded_file, file_extension, i, uploader_key):
         try:
-            content = uploaded_file.read().decode('utf-8')
+            # อ่านเฉพาะบรรทัดที่แสดง ไม่ decode ทั้งไฟล์
+            preview_key = FilePreview.upload_key(uploaded_file)
+            preview_content, has_more = FilePreview.text_head(preview_key, uploaded_file)
             
             display_language = LANGUAGE_MAP.get(file_extension, 'text')
             
             st.markdown("**👁️ ตัวอย่างเนื้อหาไฟล์:**")
             # แสดงเฉพาะ 10 บรรทัดแรก
-            preview_content = '\n'.join(content.split('\n')[:10])
-            if len(content.split('\n')) > 10:
-                preview_content += '\n... (แสดงเพียง 10 บรรทัดแรก)'
+            if has_more:
+                preview_content += f'\n... (แสดงเพียง {PREVIEW_ROWS} บรรทัดแรก)'
             
             st.code(preview_content, language=display_language)
                 
             # ปุ่มเก็บไฟล์ Text ใน Memory
-            if st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_text_{i}_{uploader_key}"):
-                st.session_state.imported_files[uploaded_file.name] = content
-                st.success(f"✅ เก็บไฟล์ {uploaded_file.name} ใน Memory สำเร็จ!")
+            st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_text_{i}_{uploader_key}",
+                      on_click=FileManager.save_to_memory, args=([uploaded_file],))
                 
         except UnicodeDecodeError:
             # ถ้าอ่านเป็น text ไม่ได้ ให้จัดเป็น Binary
@@ -135,8 +188,5 @@ class FileManager:
             st.info(f"📁 **ไฟล์ Binary:** {uploaded_file.name} ({file_extension.upper()})")
             
             # ปุ่มเก็บไฟล์ Binary ใน Memory
-            if st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_binary_fallback_{i}_{uploader_key}"):
-                uploaded_file.seek(0)
-                binary_content = base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
-                st.session_state.imported_files[uploaded_file.name] = f"__BINARY__{binary_content}"
-                st.success(f"✅ เก็บไฟล์ {uploaded_file.name} (Binary) ใน Memory สำเร็จ!")
\ No newline at end of file
+            st.button("💾 เก็บไฟล์ใน Memory", type="secondary", key=f"save_binary_fallback_{i}_{uploader_key}",
+                      on_click=FileManager.save_to_memory, args=([uploaded_file], " (Binary)"))
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import codecs
+import gridfs
+from pymongo.errors import PyMongoError
+from .zip_export import archive_name
+from .config import GRIDFS_THRESHOLD_KB, GRIDFS_CHUNK_KB, GRIDFS_SCRIPT_BUCKET, GRIDFS_ARTIFACT_BUCKET
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class GridFSStore:
+    """ที่เก็บข้อมูลขนาดใหญ่ใน MongoDB ผ่าน GridFS (แบ่งเป็น chunk จึงไม่ติดขนาด 16 MB ของเอกสาร)
+
+    - content ของ script ที่ใหญ่เกิน threshold: เอกสาร script เก็บ content_file_id แทน field content
+      รายการ script (get_data) จึงไม่ต้องลากเนื้อหาก้อนใหญ่มาด้วย
+    - ไฟล์ผลลัพธ์ของการรัน (artifact): ผูกกับ run_id และชื่อ script ไว้ใน metadata
+    อ่านและเขียนเป็น stream ทีละ chunk ไม่ต้องโหลดทั้งไฟล์เข้า memory
+    """
+
+    def __init__(self, db, script_bucket=GRIDFS_SCRIPT_BUCKET, artifact_bucket=GRIDFS_ARTIFACT_BUCKET,
+                 threshold_kb=GRIDFS_THRESHOLD_KB, chunk_kb=GRIDFS_CHUNK_KB):
+        self.threshold_bytes = threshold_kb * 1024
+        chunk_size = chunk_kb * 1024
+        self.scripts = gridfs.GridFSBucket(db, bucket_name=script_bucket, chunk_size_bytes=chunk_size)
+        self.artifacts = gridfs.GridFSBucket(db, bucket_name=artifact_bucket, chunk_size_bytes=chunk_size)
+        self._artifact_files = db[f"{artifact_bucket}.files"]
+        try:
+            self._artifact_files.create_index([("metadata.script", 1), ("uploadDate", -1)])
+            self._artifact_files.create_index("metadata.run_id")
+        except PyMongoError:
+            # ไม่มีสิทธิ์สร้าง index ก็ยังใช้งานได้ แค่ค้นหาช้าลง
+            pass
+
+    #content ขนาดนี้ต้องเก็บใน GridFS หรือไม่
+    def is_large(self, size):
+        return size > self.threshold_bytes
+
+    # ======= content ของ script =======
+    #อัปโหลด content จาก stream (เช่นไฟล์ที่เปิดไว้) คืน file_id สำหรับเก็บใน field content_file_id
+    def put_script(self, filename, stream, content_hash=None):
+        return self.scripts.upload_from_stream(filename, stream, metadata={"content_hash": content_hash})
+
+    def open_script(self, file_id):
+        return self.scripts.open_download_stream(file_id)
+
+    def delete_script(self, file_id):
+        try:
+            self.scripts.delete(file_id)
+        except gridfs.errors.NoFile:
+            pass
+
+    #เติม field content ให้เอกสารที่เก็บ content ไว้ใน GridFS (เอกสารปกติคืนตามเดิม)
+    def load_content(self, doc):
+        if 'content' in doc or not doc.get('content_file_id'):
+            return doc
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        with self.open_script(doc['content_file_id']) as grid_out:
+            for chunk in iter_chunks(grid_out):
+                parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b'', final=True))
+        doc['content'] = ''.join(parts)
+        return doc
+
+    # ======= ไฟล์ผลลัพธ์ของการรัน =======
+    #เก็บไฟล์ผลลัพธ์ลง GridFS (อ่านจาก disk ทีละ chunk) ไฟล์ที่เก็บของ run นี้ไปแล้วจะไม่เก็บซ้ำ
+    #คืนจำนวนไฟล์ที่เก็บใหม่
+    def save_artifacts(self, run_id, file_paths, base_dir=None, script=None):
+        stored = {doc['filename'] for doc in self._artifact_files.find({"metadata.run_id": run_id}, {"filename": 1})}
+        saved = 0
+        for file_path in file_paths:
+            if not os.path.isfile(file_path):
+                continue
+            name = archive_name(file_path, base_dir)
+            if name in stored:
+                continue
+            with open(file_path, 'rb') as f:
+                self.artifacts.upload_from_stream(name, f, metadata={"run_id": run_id, "script": script})
+            stored.add(name)
+            saved += 1
+        return saved
+
+    #รายการ artifact ล่าสุด (คืน GridOut ที่ยังไม่ได้อ่านเนื้อไฟล์ อ่านเมื่อเรียก read/seek)
+    def list_artifacts(self, script=None, run_id=None, limit=50):
+        query = {}
+        if script is not None:
+            query["metadata.script"] = script
+        if run_id is not None:
+            query["metadata.run_id"] = run_id
+        return list(self.artifacts.find(query, sort=[("uploadDate", -1)], limit=limit))
+
+    def open_artifact(self, file_id):
+        return self.artifacts.open_download_stream(file_id)
+
+    #อ่าน artifact ทั้งไฟล์ (ใช้กับปุ่มดาวน์โหลด ซึ่งเรียกเมื่อผู้ใช้กดเท่านั้น)
+    def read_artifact(self, file_id):
+        with self.open_artifact(file_id) as grid_out:
+            return b''.join(iter_chunks(grid_out))
+
+    #คัดลอก artifact ลงไฟล์บน disk ทีละ chunk
+    def download_artifact(self, file_id, file_path):
+        with self.open_artifact(file_id) as grid_out, open(file_path, 'wb') as f:
+            for chunk in iter_chunks(grid_out):
+                f.write(chunk)
+        return file_path
+
+    def delete_artifacts(self, run_id):
+        for grid_out in self.artifacts.find({"metadata.run_id": run_id}):
+            self.artifacts.delete(grid_out._id)
+
+
+#อ่าน stream ทีละ chunk
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
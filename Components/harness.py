@@ -0,0 +1,599 @@
+"""Harness ขนาดคงที่สำหรับรัน script ใน temp directory
+
+ไฟล์ input ถูกวางลงใน workspace เป็น bytes ตั้งแต่ก่อนเริ่ม process แล้ว (ดู ScriptRunner._stage_input_files)
+harness จึงเหลือหน้าที่แค่ตั้งค่า working directory, override plt.show() / savefig / method เขียนไฟล์ของ DataFrame
+(to_csv / to_parquet / to_feather / to_excel) / np.save* แล้วรัน script ต้นฉบับ พร้อมบันทึกไฟล์ที่ script สร้าง/แก้ไขลง manifest (.runner/manifest.json)
+override ใช้ผ่าน import hook (PATCHES) เฉพาะ library ที่ script import เอง script ที่ไม่ใช้ matplotlib / pandas
+จึงไม่ต้องโหลด library เหล่านั้นและเริ่มได้เร็วเท่า interpreter เปล่า
+
+วิธีใช้: python harness.py <workspace> <script_path> [--plain] [--code <bytecode_path>] [--render <json>] [--timings <path>]
+(--plain = ไม่ override plt.show() / DataFrame.to_*() ใช้กับการรัน script แบบไม่มีไฟล์ import)
+(--code = bytecode ที่ ScriptCache compile ไว้แล้ว ไม่ต้อง compile script ใหม่)
+(--render = render profile ของกราฟ เช่น {"format": "png", "dpi": 100})
+(--timings = ไฟล์ JSON ที่ harness เขียนเวลาเริ่ม/เตรียมเสร็จ/รันจบ ให้ ScriptRunner แยกเวลาแต่ละขั้นตอน)
+(--limits = ข้อจำกัดของ process เช่น {"memory_bytes": ..., "cpu_seconds": ..., "cgroup": ...} ดู RunPolicy)
+(--manifest = โฟลเดอร์ของ manifest ใน workspace (ค่าเริ่มต้น .runner) ใช้แยก manifest ของแต่ละขั้นใน pipeline)
+"""
+import time
+
+# เวลาที่ harness เริ่มทำงาน (หลัง interpreter เปิดเสร็จ) ใช้แยกเวลา startup ออกจากเวลารัน
+_timings = {'started': time.time()}
+
+import io
+import os
+import sys
+import json
+import builtins
+import functools
+import marshal
+import importlib.util
+from stat import S_ISREG
+import threading
+
+# เปลี่ยนเลขนี้ทุกครั้งที่พฤติกรรมของ harness เปลี่ยน
+HARNESS_VERSION = "7"
+
+
+# render profile ที่ใช้เมื่อไม่ได้ระบุ (เหมือนพฤติกรรมเดิม: PNG 300 dpi)
+DEFAULT_RENDER = {'format': 'png', 'dpi': 300}
+
+
+# stdout ใช้ buffer ใหญ่เพื่อให้พิมพ์เร็ว แต่ flush ทุกช่วงเวลานี้เพื่อให้ UI เห็น output ระหว่างรัน
+OUTPUT_FLUSH_INTERVAL = 0.2
+
+
+#เปลี่ยน stdout เป็นแบบ block buffer + flush เป็นระยะจาก background thread
+def setup_output_streams(interval=OUTPUT_FLUSH_INTERVAL):
+    sys.stdout = io.TextIOWrapper(
+        io.BufferedWriter(io.FileIO(1, 'w', closefd=False), buffer_size=64 * 1024),
+        encoding='utf-8', errors='replace'
+    )
+    sys.stderr = io.TextIOWrapper(
+        io.FileIO(2, 'w', closefd=False), encoding='utf-8', errors='replace',
+        line_buffering=True, write_through=True
+    )
+
+    def flush_periodically():
+        while True:
+            time.sleep(interval)
+            try:
+                sys.stdout.flush()
+            except Exception:
+                pass
+
+    threading.Thread(target=flush_periodically, daemon=True).start()
+
+
+#บันทึกเวลาของจุดต่างๆ (started / prepared / finished)
+def mark(name):
+    _timings[name] = time.time()
+
+
+#เริ่มนับเวลาใหม่ (process ลูกที่ fork จาก worker)
+def reset_timings():
+    _timings.clear()
+    mark('started')
+
+
+def write_timings(path):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(_timings, f)
+    except OSError:
+        pass
+
+
+# manifest ของไฟล์ผลลัพธ์: เขียน event ทีละบรรทัดระหว่างรัน (process ที่ fork จาก script เขียนต่อได้)
+# แล้วสรุปเป็น manifest.json พร้อมขนาดไฟล์ตอนจบ
+MANIFEST_DIR = '.runner'
+MANIFEST_EVENTS = 'manifest.jsonl'
+MANIFEST_FILE = 'manifest.json'
+
+# ประเภทไฟล์ตามนามสกุล (ที่ไม่อยู่ในนี้เป็น 'binary')
+FILE_TYPES = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp', 'svg', 'pdf'),
+    'csv': ('csv', 'tsv'),
+    'excel': ('xlsx', 'xls'),
+    'columnar': ('parquet', 'feather', 'arrow'),
+    'text': ('txt', 'log', 'json', 'md', 'html', 'xml', 'yaml', 'yml'),
+}
+_EXTENSION_TYPES = {extension: kind for kind, extensions in FILE_TYPES.items() for extension in extensions}
+
+_original_open = builtins.open
+_original_os_open = os.open
+_original_rename = os.rename
+_original_replace = os.replace
+_manifest = None
+
+
+def file_type(path):
+    return _EXTENSION_TYPES.get(path.rsplit('.', 1)[-1].lower() if '.' in path else '', 'binary')
+
+
+class _Manifest:
+    """บันทึกไฟล์ใน workspace ที่ถูกเปิดเพื่อเขียน (พร้อมบรรทัดของ script ที่สร้าง) ลง .runner/manifest.jsonl"""
+
+    def __init__(self, workspace, user_files, directory=MANIFEST_DIR):
+        self.workspace = os.path.realpath(workspace)
+        self.directory = os.path.join(self.workspace, directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.user_files = {f for f in user_files if f}
+        self._seen = set()
+        self._events = _original_open(os.path.join(self.directory, MANIFEST_EVENTS), 'a', encoding='utf-8', buffering=1)
+
+    #path เทียบกับ workspace (None ถ้าอยู่นอก workspace หรืออยู่ใน .runner)
+    def relative(self, path):
+        if isinstance(path, int):
+            return None
+        try:
+            path = os.fsdecode(path)
+        except TypeError:
+            return None
+        relative = os.path.relpath(os.path.realpath(path), self.workspace)
+        if relative == '.' or relative.startswith('..') or relative.split(os.sep, 1)[0] == MANIFEST_DIR:
+            return None
+        return relative.replace(os.sep, '/')
+
+    #บรรทัดของ script ที่ทำให้เกิดไฟล์ (ถ้าเรียกจาก library ที่ไม่ได้มาจาก script ใช้ตำแหน่งของ library แทน)
+    def call_site(self, depth=3):
+        frame = sys._getframe(depth)
+        caller = frame
+        while frame is not None:
+            if frame.f_code.co_filename in self.user_files:
+                return f"line {frame.f_lineno}", 'script' if frame is caller else caller.f_globals.get('__name__', '?').split('.')[0]
+            frame = frame.f_back
+        if caller is None:
+            return None, None
+        module = caller.f_globals.get('__name__', '?')
+        return f"{module}:{caller.f_lineno}", module.split('.')[0]
+
+    #depth = จำนวน frame จาก call_site ถึงผู้เรียก hook, producer = module ของ writer ที่ harness ห่อไว้ (ถ้ามี)
+    def record(self, path, depth=3, producer=None):
+        relative = self.relative(path)
+        if relative is None or relative in self._seen:
+            return
+        self._seen.add(relative)
+        site, caller = self.call_site(depth)
+        producer = producer or caller
+        full_path = os.path.join(self.workspace, relative)
+        created = not os.path.exists(full_path)
+        if not created:
+            self._detach_link(full_path)
+        self._write({'path': relative, 'created': created, 'site': site, 'producer': producer})
+
+    #ไฟล์ที่ hardlink มา (ไฟล์ร่วมของ batch ใน .shared): แยกเป็นสำเนาของ workspace ก่อนถูกเขียน (ต้นทางไม่เปลี่ยน)
+    def _detach_link(self, full_path):
+        try:
+            if os.stat(full_path).st_nlink <= 1:
+                return
+            copy_path = full_path + '.runner-copy'
+            with _original_open(full_path, 'rb') as source, _original_open(copy_path, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+            os.chmod(copy_path, 0o644)
+            _original_replace(copy_path, full_path)
+        except OSError:
+            pass
+
+    #existed = ปลายทางมีอยู่ก่อน rename หรือไม่
+    def record_rename(self, source, target, existed):
+        relative = self.relative(target)
+        if relative is None:
+            return
+        self._seen.add(relative)
+        site, producer = self.call_site()
+        self._write({'path': relative, 'renamed_from': self.relative(source), 'created': not existed,
+                     'site': site, 'producer': producer})
+
+    def _write(self, event):
+        try:
+            self._events.write(json.dumps(event) + '\n')
+        except (OSError, ValueError):
+            pass
+
+    #รวม event ของทุก process เป็นรายการไฟล์ที่ยังอยู่ พร้อมขนาดและประเภท แล้วเขียน manifest.json
+    def finish(self):
+        try:
+            self._events.flush()
+            with _original_open(os.path.join(self.directory, MANIFEST_EVENTS), 'r', encoding='utf-8') as f:
+                events = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return
+        entries = {}
+        for event in events:
+            path = event['path']
+            source = event.pop('renamed_from', None)
+            if source is None:
+                entries.setdefault(path, event)
+                continue
+            # rename: ไฟล์ชั่วคราวที่ถูกเปลี่ยนเป็นชื่อจริง ใช้บรรทัดที่สร้างไฟล์ชั่วคราว
+            previous = entries.pop(source, None) or event
+            if path in entries:
+                event['created'] = entries[path]['created']
+            event['site'], event['producer'] = previous['site'], previous['producer']
+            entries[path] = event
+
+        files = []
+        for relative, entry in entries.items():
+            try:
+                info = os.stat(os.path.join(self.workspace, relative))
+            except OSError:
+                # script ลบไฟล์ไปแล้ว
+                continue
+            if not S_ISREG(info.st_mode):
+                continue
+            entry['size'] = info.st_size
+            entry['type'] = file_type(relative)
+            files.append(entry)
+        files.sort(key=lambda entry: entry['path'])
+
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        tmp_path = manifest_path + '.tmp'
+        with _original_open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': HARNESS_VERSION, 'complete': True, 'files': files}, f)
+        _original_replace(tmp_path, manifest_path)
+
+
+def _tracking_open(file, mode='r', *args, **kwargs):
+    if _manifest is not None and isinstance(mode, str) and ('w' in mode or 'a' in mode or 'x' in mode or '+' in mode):
+        _manifest.record(file)
+    return _original_open(file, mode, *args, **kwargs)
+
+
+def _tracking_os_open(path, flags, *args, **kwargs):
+    if _manifest is not None and flags & (os.O_WRONLY | os.O_RDWR):
+        _manifest.record(path)
+    return _original_os_open(path, flags, *args, **kwargs)
+
+
+def _tracking_rename(source, target, *args, **kwargs):
+    existed = _manifest is not None and os.path.exists(target)
+    _original_rename(source, target, *args, **kwargs)
+    if _manifest is not None:
+        _manifest.record_rename(source, target, existed)
+
+
+def _tracking_replace(source, target, *args, **kwargs):
+    existed = _manifest is not None and os.path.exists(target)
+    _original_replace(source, target, *args, **kwargs)
+    if _manifest is not None:
+        _manifest.record_rename(source, target, existed)
+
+
+#เริ่มบันทึกไฟล์ที่ถูกเปิดเพื่อเขียนใน workspace (open / io.open / os.open / os.rename / os.replace)
+#user_files = path ของ script (และ source ของ bytecode) ใช้หาบรรทัดที่สร้างไฟล์
+#directory = โฟลเดอร์ของ manifest ใน workspace (ต้องอยู่ใต้ .runner)
+def start_manifest(workspace, user_files=(), directory=None):
+    global _manifest
+    try:
+        _manifest = _Manifest(workspace, user_files, directory or MANIFEST_DIR)
+    except OSError:
+        _manifest = None
+        return
+    builtins.open = io.open = _tracking_open
+    os.open = _tracking_os_open
+    os.rename = _tracking_rename
+    os.replace = _tracking_replace
+
+
+def finish_manifest():
+    global _manifest
+    manifest, _manifest = _manifest, None
+    builtins.open = io.open = _original_open
+    os.open = _original_os_open
+    os.rename = _original_rename
+    os.replace = _original_replace
+    if manifest is not None:
+        try:
+            manifest.finish()
+        except OSError:
+            pass
+
+
+#อ่านขนาด address space ปัจจุบันของ process (VmSize)
+def _address_space_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return 0
+
+
+#ตั้งข้อจำกัดให้ process ของ script เอง (process ลูกที่ script สร้างจะได้ข้อจำกัดเดียวกัน)
+#ย้ายเข้า cgroup ถ้ามี (จำกัด memory ทั้ง process tree) ไม่งั้นใช้ RLIMIT_AS นับเพิ่มจากขนาดปัจจุบัน
+#เพื่อให้ worker ที่โหลด library ไว้แล้วกับ interpreter ใหม่ได้พื้นที่สำหรับ script เท่ากัน
+def apply_limits(limits):
+    if not limits:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+
+    cgroup = limits.get('cgroup')
+    if cgroup:
+        try:
+            with open(os.path.join(cgroup, 'cgroup.procs'), 'w') as f:
+                f.write('0')
+        except OSError:
+            cgroup = None
+
+    memory_bytes = limits.get('memory_bytes')
+    if memory_bytes and not cgroup:
+        limit = _address_space_bytes() + memory_bytes
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    cpu_seconds = limits.get('cpu_seconds')
+    if cpu_seconds:
+        # soft limit ส่ง SIGXCPU, hard limit (เผื่อไว้) ส่ง SIGKILL
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+
+
+# patch ของ library ที่ใช้เมื่อ script import library นั้นเอง: ชื่อ module -> [patch(module, workspace, render)]
+# เพิ่ม patch ใหม่ด้วย @register_patch('ชื่อ module') โดยไม่ต้อง import module นั้นล่วงหน้า
+# patch ของ module แม่ต้องลงทะเบียนก่อน module ย่อย (เช่น matplotlib ก่อน matplotlib.pyplot)
+PATCHES = {}
+_pending = {}
+_patch_args = None
+
+
+def register_patch(module_name):
+    def decorator(patch):
+        PATCHES.setdefault(module_name, []).append(patch)
+        return patch
+    return decorator
+
+
+def _apply_patches(module):
+    for patch in _pending.pop(module.__name__, ()):
+        patch(module, *_patch_args)
+    if not _pending and _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+
+
+class _PatchingLoader:
+    """ห่อ loader เดิม: รัน module จนเสร็จแล้วใช้ patch ทันที ก่อน script ได้ module กลับไป"""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # module เห็น loader เดิมเหมือนไม่มี harness (เช่น importlib.resources)
+        module.__loader__ = module.__spec__.loader = self.loader
+        self.loader.exec_module(module)
+        _apply_patches(module)
+
+
+class _PatchFinder:
+    """import hook ใน sys.meta_path: module ที่มี patch รออยู่ใช้ loader ที่ patch หลังโหลดเสร็จ"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in _pending:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _PatchingLoader(spec.loader)
+        return spec
+
+
+_finder = _PatchFinder()
+
+
+#ใช้ patch ทุกตัวใน PATCHES: module ที่ import ไว้แล้ว (เช่น worker ที่ preload ไว้) patch ทันที
+#ที่เหลือรอผ่าน import hook จนกว่า script จะ import เอง (script ที่ไม่ใช้ library ไม่ต้องโหลดเลย)
+def install_patches(workspace, render):
+    global _patch_args
+    _patch_args = (workspace, render)
+    _pending.clear()
+    for module_name, patches in PATCHES.items():
+        _pending[module_name] = list(patches)
+    for module_name in list(_pending):
+        module = sys.modules.get(module_name)
+        if module is not None:
+            _apply_patches(module)
+    if _pending and _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+
+#ตั้งค่า working directory และ override ฟังก์ชันที่บันทึกไฟล์ (เมื่อ script import library นั้น)
+#render = รูปแบบไฟล์และ dpi ของกราฟ (ใช้กับ plt.show() และ savefig ที่ script ไม่ได้ระบุ dpi เอง)
+def prepare(workspace, render=None):
+    os.chdir(workspace)
+    install_patches(workspace, dict(DEFAULT_RENDER, **(render or {})))
+
+
+@register_patch('matplotlib')
+def _patch_matplotlib(matplotlib, workspace, render):
+    matplotlib.use('Agg')
+    matplotlib.rcParams['savefig.dpi'] = render['dpi']
+
+
+# savefig ของ Figure (plt.savefig เรียกผ่าน method นี้): relative path ชี้ไปที่ workspace
+@register_patch('matplotlib.figure')
+def _patch_figure(figure, workspace, render):
+    figure.Figure.savefig = _workspace_writer(figure.Figure.savefig, 'fname', workspace)
+
+
+# Override plt.show() to save figures in temp directory
+@register_patch('matplotlib.pyplot')
+def _patch_pyplot(plt, workspace, render):
+    _figure_counter = [0]
+
+    def _custom_show(*args, **kwargs):
+        _figure_counter[0] += 1
+        filename = f"plot_{_figure_counter[0]}.{render['format']}"
+        file_path = os.path.join(workspace, filename)
+        plt.savefig(file_path, format=render['format'], dpi=render['dpi'], bbox_inches='tight')
+        print(f"Plot saved as: {filename}")
+        plt.close()
+
+    plt.show = _custom_show
+
+
+# Pandas Part: relative path ของไฟล์ที่ DataFrame เขียนให้บันทึกใน temp directory
+@register_patch('pandas')
+def _patch_pandas(pd, workspace, render):
+    for method, path_argument in DATAFRAME_WRITERS.items():
+        setattr(pd.DataFrame, method, _workspace_writer(getattr(pd.DataFrame, method), path_argument, workspace))
+
+
+@register_patch('numpy')
+def _patch_numpy(np, workspace, render):
+    for function, path_argument in NUMPY_WRITERS.items():
+        setattr(np, function, _workspace_writer(getattr(np, function), path_argument, workspace))
+
+
+# method ของ DataFrame ที่เขียนไฟล์: ชื่อ argument ของ path
+DATAFRAME_WRITERS = {
+    'to_csv': 'path_or_buf',
+    'to_parquet': 'path',
+    'to_feather': 'path',
+    'to_excel': 'excel_writer',
+}
+
+# ฟังก์ชันของ numpy ที่เขียนไฟล์: ชื่อ argument ของ path
+NUMPY_WRITERS = {
+    'save': 'file',
+    'savez': 'file',
+    'savez_compressed': 'file',
+    'savetxt': 'fname',
+}
+
+# ฟังก์ชันของ pyarrow ที่เขียนไฟล์ด้วย code native (ไม่ผ่าน open): module -> {ชื่อฟังก์ชัน: ชื่อ argument ของ path}
+PYARROW_WRITERS = {
+    'pyarrow.parquet': {'write_table': 'where'},
+    'pyarrow.feather': {'write_feather': 'dest'},
+    'pyarrow.csv': {'write_csv': 'output_file'},
+    'pyarrow.ipc': {'new_file': 'sink', 'new_stream': 'sink'},
+}
+
+
+def _pyarrow_patch(writers):
+    def patch(module, workspace, render):
+        for function, path_argument in writers.items():
+            setattr(module, function, _workspace_writer(getattr(module, function), path_argument, workspace))
+    return patch
+
+
+for _module_name, _writers in PYARROW_WRITERS.items():
+    register_patch(_module_name)(_pyarrow_patch(_writers))
+
+
+#ห่อฟังก์ชัน/method เขียนไฟล์ให้ relative path (string) ชี้ไปที่ workspace
+#และบันทึกไฟล์ลง manifest ก่อนเขียน (library ที่เขียนด้วย code native ไม่ผ่าน open จึงได้บรรทัดที่สร้างด้วย)
+#ตำแหน่งของ path ใน argument ดูจาก signature (เช่น np.save(file, ...), pq.write_table(table, where, ...))
+def _workspace_writer(original, path_argument, workspace):
+    import inspect
+    try:
+        index = list(inspect.signature(original).parameters).index(path_argument)
+    except (TypeError, ValueError):
+        # ไม่มี signature หรือไม่มี argument ชื่อนี้: รองรับเฉพาะแบบระบุชื่อ
+        index = None
+    producer = original.__module__.split('.')[0] if getattr(original, '__module__', None) else None
+
+    def in_workspace(path):
+        if path and isinstance(path, str) and not os.path.isabs(path):
+            path = os.path.join(workspace, path)
+        if _manifest is not None and isinstance(path, (str, os.PathLike)):
+            # call_site <- record <- in_workspace <- writer <- ผู้เรียก
+            _manifest.record(path, depth=4, producer=producer)
+        return path
+
+    @functools.wraps(original)
+    def writer(*args, **kwargs):
+        if index is not None and len(args) > index:
+            args = args[:index] + (in_workspace(args[index]),) + args[index + 1:]
+        elif path_argument in kwargs:
+            kwargs[path_argument] = in_workspace(kwargs[path_argument])
+        return original(*args, **kwargs)
+
+    return writer
+
+
+#โหลด bytecode ที่ compile ไว้แล้ว คืนค่า None ถ้าใช้ไม่ได้ (เช่น Python คนละเวอร์ชัน)
+def load_code(code_path):
+    try:
+        with open(code_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+#รัน script ต้นฉบับใน namespace ใหม่ (เหมือนรันด้วย python script.py)
+def run_script(script_path, code_path=None):
+    code = load_code(code_path) if code_path else None
+    if code is None:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        code = compile(source, script_path, 'exec')
+    namespace = {'__name__': '__main__', '__file__': script_path, '__builtins__': __builtins__}
+    exec(code, namespace)
+
+
+#แสดง traceback เฉพาะส่วนของ script ผู้ใช้ (ตัด frame ของ harness ออก)
+#bytecode จาก ScriptCache ใช้ชื่อไฟล์ source ใน cache (code_path ตัด 'c' ท้ายออก)
+def print_user_traceback(exc, script_path, code_path=None):
+    user_files = {script_path}
+    if code_path:
+        user_files.add(code_path[:-1])
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename not in user_files:
+        tb = tb.tb_next
+    # import เมื่อ script ล้มเหลวเท่านั้น (ไม่เพิ่มเวลาเริ่มของ script ที่รันสำเร็จ)
+    import traceback
+    traceback.print_exception(type(exc), exc, tb or exc.__traceback__)
+
+
+def main(argv):
+    workspace, script_path = argv[1], argv[2]
+    sys.argv = [script_path]
+    sys.path[0] = workspace
+    options = argv[3:]
+    code_path = options[options.index('--code') + 1] if '--code' in options else None
+    render = json.loads(options[options.index('--render') + 1]) if '--render' in options else None
+    timings_path = options[options.index('--timings') + 1] if '--timings' in options else None
+    limits = json.loads(options[options.index('--limits') + 1]) if '--limits' in options else None
+    manifest_dir = options[options.index('--manifest') + 1] if '--manifest' in options else None
+    apply_limits(limits)
+    setup_output_streams()
+    try:
+        if '--plain' not in options:
+            prepare(workspace, render)
+        start_manifest(workspace, [script_path, code_path[:-1] if code_path else None], manifest_dir)
+        mark('prepared')
+        try:
+            run_script(script_path, code_path)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except BaseException as e:
+            print_user_traceback(e, script_path, code_path)
+            sys.exit(1)
+    finally:
+        finish_manifest()
+        mark('finished')
+        if timings_path:
+            write_timings(timings_path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,122 @@
+import os
+import json
+from .harness import MANIFEST_DIR, MANIFEST_EVENTS, MANIFEST_FILE, file_type
+
+
+class OutputManifest:
+    """รายการไฟล์ผลลัพธ์ของการรัน จาก manifest ที่ harness เขียนไว้ใน <workspace>/.runner
+
+    แต่ละรายการเป็น dict: path (เทียบกับ workspace คั่นด้วย /), size, type, created (สร้างใหม่หรือแก้ไฟล์เดิม),
+    site (บรรทัดของ script ที่สร้างไฟล์) และ producer (module ที่เขียนไฟล์ เช่น script, pandas, matplotlib)
+    หลังรัน ScriptRunner รวมไฟล์ที่ harness ไม่เห็น (เขียนจาก code native หรือ process ลูก) เข้า manifest ด้วย
+    ไม่มี manifest (เช่น ผลลัพธ์เก่าใน cache) จะไล่ os.scandir ทั้ง workspace แทน
+    """
+
+    #อ่าน manifest.json คืน None ถ้าไม่มี
+    #ถ้ามีแต่ event (process ถูก kill ก่อนสรุป) สรุปจาก event เท่าที่บันทึกได้
+    #manifest_dir = โฟลเดอร์ของ manifest ใน workspace (เช่นของแต่ละขั้นใน pipeline)
+    @staticmethod
+    def read(temp_dir, manifest_dir=MANIFEST_DIR):
+        directory = os.path.join(temp_dir, manifest_dir)
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            pass
+        try:
+            with open(os.path.join(directory, MANIFEST_EVENTS), 'r', encoding='utf-8') as f:
+                events = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return None
+
+        entries = {}
+        for event in events:
+            entries.pop(event.pop('renamed_from', None), None)
+            entries.setdefault(event['path'], event)
+        files = []
+        for relative, entry in sorted(entries.items()):
+            try:
+                entry['size'] = os.path.getsize(os.path.join(temp_dir, relative))
+            except OSError:
+                continue
+            entry['type'] = file_type(relative)
+            files.append(entry)
+        return files
+
+    #เขียน manifest (ใช้ตอนคืนผลลัพธ์จาก cache ลง temp directory ใหม่ และหลังรวมกับไฟล์ที่ harness ไม่เห็น)
+    @staticmethod
+    def write(temp_dir, files, manifest_dir=MANIFEST_DIR):
+        directory = os.path.join(temp_dir, manifest_dir)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'complete': True, 'files': files}, f)
+
+    #ไล่ไฟล์ทั้งหมดใน workspace ด้วย os.scandir (ข้ามโฟลเดอร์ซ่อน) ไม่รู้ว่าไฟล์ไหนเป็น input
+    @staticmethod
+    def scan(temp_dir):
+        files = [
+            {'path': relative, 'size': stat.st_size, 'type': file_type(relative),
+             'created': None, 'site': None, 'producer': None}
+            for relative, stat in OutputManifest._walk(temp_dir)
+        ]
+        files.sort(key=lambda item: item['path'])
+        return files
+
+    #(path เทียบกับ workspace, stat) ของทุกไฟล์ที่ไม่ได้อยู่ในโฟลเดอร์ซ่อน
+    @staticmethod
+    def _walk(temp_dir):
+        stack = [(temp_dir, '')]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relative = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, relative + '/'))
+                    elif entry.is_file():
+                        yield relative, entry.stat()
+                except OSError:
+                    continue
+
+    #รวม manifest ของ harness กับไฟล์ที่ถูกสร้าง/แก้ใน workspace ระหว่างรัน แล้วเขียน manifest.json ใหม่
+    #ไฟล์ที่ code native หรือ process ลูกเขียน (pyarrow, sqlite3, HDF5, โปรแกรมภายนอก) ไม่ผ่าน hook ของ harness
+    #จึงเพิ่มจากการเทียบกับ snapshot ก่อนรัน (site/producer เป็น None) manifest ใช้บอกแค่ site และ created
+    #before = {(device, inode): (ขนาด, เวลาแก้ไข, path เทียบกับ workspace)} จาก ScriptRunner._workspace_snapshot
+    @staticmethod
+    def reconcile(temp_dir, before, manifest_dir=MANIFEST_DIR):
+        recorded = OutputManifest.read(temp_dir, manifest_dir)
+        entries = {entry['path']: entry for entry in recorded or []}
+        before_paths = {relative for _, _, relative in before.values()}
+        files = []
+        for relative, stat in OutputManifest._walk(temp_dir):
+            entry = entries.pop(relative, None)
+            if entry is None:
+                if before.get((stat.st_dev, stat.st_ino), (None, None))[:2] == (stat.st_size, stat.st_mtime_ns):
+                    # ไฟล์ input ที่ไม่ได้ถูกแก้
+                    continue
+                entry = {'path': relative, 'created': relative not in before_paths, 'site': None, 'producer': None}
+            entry['size'] = stat.st_size
+            entry['type'] = file_type(relative)
+            files.append(entry)
+        # ไฟล์ใน manifest ที่อยู่ในโฟลเดอร์ซ่อน (scan ไม่เห็น) ยังคงไว้ถ้ายังมีอยู่
+        files.extend(entry for entry in entries.values() if os.path.isfile(os.path.join(temp_dir, entry['path'])))
+        files.sort(key=lambda entry: entry['path'])
+        OutputManifest.write(temp_dir, files, manifest_dir)
+        return files
+
+    #ไฟล์ผลลัพธ์ของการรัน: จาก manifest ถ้ามี ไม่งั้น scan แล้วตัดไฟล์ที่ชื่อตรงกับ input (exclude) ออก
+    @staticmethod
+    def outputs(temp_dir, exclude=()):
+        if not temp_dir or not os.path.isdir(temp_dir):
+            return []
+        files = OutputManifest.read(temp_dir)
+        if files is not None:
+            return files
+        exclude = set(exclude)
+        return [item for item in OutputManifest.scan(temp_dir) if item['path'] not in exclude]
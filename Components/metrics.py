@@ -0,0 +1,309 @@
+import os
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_FILE, METRICS_EXPORT_INTERVAL, METRICS_PORT
+
+# ขั้นตอนของการรันหนึ่งครั้งตามลำดับ (ชื่อที่ใช้ใน label ของ Prometheus: ชื่อที่แสดงใน UI)
+PHASES = {
+    'stage': "เตรียม workspace และวางไฟล์ input",
+    'startup': "เปิด interpreter / fork worker",
+    'harness_imports': "harness import library",
+    'user_code': "รันโค้ดของ script",
+    'discover': "ค้นหาไฟล์ผลลัพธ์",
+    'preview': "สร้างตัวอย่างไฟล์",
+    'zip': "สร้าง ZIP",
+}
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 64, 256, 512, 1024, 2048, 4096))
+
+
+class RunMetrics:
+    """เวลาของแต่ละขั้นตอนและการใช้ทรัพยากรของการรันหนึ่งครั้ง (เก็บไว้ใน run_info['metrics'])
+
+    resources: max_rss_bytes, user_cpu_seconds, system_cpu_seconds (จาก wait4 ของ process ลูก)
+    และ workspace_bytes_written (ขนาดไฟล์ที่ script สร้าง/แก้ใน workspace)
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.resources = {}
+        self._lock = threading.Lock()
+
+    #บันทึกเวลาของขั้นตอน (เรียกซ้ำได้ เวลาจะถูกรวมกัน)
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    #แทนค่าเดิม (ขั้นตอนที่ทำซ้ำได้หลายครั้ง เช่นสร้าง ZIP ใหม่ทุกครั้งที่กดดาวน์โหลด)
+    def set(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = seconds
+
+    #บันทึกเฉพาะครั้งแรก คืน True ถ้าบันทึก
+    def add_once(self, phase, seconds):
+        with self._lock:
+            if phase in self.phases:
+                return False
+            self.phases[phase] = seconds
+            return True
+
+    @contextmanager
+    def phase(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started)
+
+    #แปลงเวลาที่ harness บันทึก (started/prepared/finished) เป็นเวลาของแต่ละขั้นตอน
+    #launched/ended = เวลาที่ฝั่ง runner เริ่มส่งงานและได้ผลกลับมา
+    def add_harness_timings(self, timings, launched, ended):
+        timings = timings or {}
+        started, prepared, finished = timings.get('started'), timings.get('prepared'), timings.get('finished')
+        if started is None or prepared is None or finished is None:
+            # process ถูก kill หรือ harness จบก่อนเขียนเวลา นับทั้งหมดเป็นเวลารันโค้ด
+            self.add('user_code', max(ended - launched, 0.0))
+            return
+        self.add('startup', max(started - launched, 0.0))
+        self.add('harness_imports', max(prepared - started, 0.0))
+        self.add('user_code', max(finished - prepared, 0.0))
+
+    @property
+    def total_seconds(self):
+        return sum(self.phases.values())
+
+    #แถวของตารางที่แสดงใน UI
+    def rows(self):
+        total = self.total_seconds or 1.0
+        order = list(PHASES)
+        phases = sorted(self.phases.items(), key=lambda item: order.index(item[0]) if item[0] in order else len(order))
+        return [
+            {"ขั้นตอน": PHASES.get(phase, phase), "วินาที": round(seconds, 4), "สัดส่วน": f"{seconds / total:.0%}"}
+            for phase, seconds in phases
+        ]
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """รวม metrics ของทุกการรันเป็น histogram/counter ต่อ script (ใช้ร่วมกันทุก session)
+
+    export เป็น text format ของ Prometheus: เขียนลงไฟล์เป็นระยะ (ใช้กับ textfile collector ของ node_exporter)
+    และเปิด endpoint /metrics ถ้ากำหนด port
+    """
+
+    def __init__(self, export_path=METRICS_FILE, export_interval=METRICS_EXPORT_INTERVAL, port=METRICS_PORT):
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._dirty = False
+        self.server = None
+
+        if export_path:
+            threading.Thread(target=self._export_loop, daemon=True).start()
+        if port:
+            self.serve(port)
+
+    def _observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(buckets)
+        histogram.observe(value)
+        self._dirty = True
+
+    def _increment(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+        self._dirty = True
+
+    #บันทึกผลของการรันที่จบแล้ว (เรียกจาก ScriptRunner ครั้งเดียวต่อการรัน)
+    def observe_run(self, script, run_info, returncode):
+        metrics = run_info.get('metrics')
+        if run_info.get('stopped'):
+            # timeout / cancelled / output_limit / memory_limit / cpu_limit
+            status = run_info['stopped']
+        elif run_info.get('timed_out'):
+            status = 'timeout'
+        else:
+            status = 'success' if returncode == 0 else 'error'
+        with self._lock:
+            self._increment('script_runner_runs_total', {
+                'script': script, 'status': status, 'cache': run_info.get('cache', 'none'), 'mode': run_info.get('mode', 'none')
+            })
+            if metrics is None:
+                return
+            for phase, seconds in metrics.phases.items():
+                self._observe('script_runner_phase_seconds', {'script': script, 'phase': phase}, seconds, SECONDS_BUCKETS)
+            resources = metrics.resources
+            if 'max_rss_bytes' in resources:
+                self._observe('script_runner_max_rss_bytes', {'script': script}, resources['max_rss_bytes'], BYTES_BUCKETS)
+            if 'workspace_bytes_written' in resources:
+                self._observe('script_runner_workspace_bytes_written', {'script': script},
+                              resources['workspace_bytes_written'], BYTES_BUCKETS)
+            for mode in ('user', 'system'):
+                if f'{mode}_cpu_seconds' in resources:
+                    self._increment('script_runner_cpu_seconds_total', {'script': script, 'mode': mode},
+                                    resources[f'{mode}_cpu_seconds'])
+
+    def observe_phase(self, script, phase, seconds):
+        with self._lock:
+            self._observe('script_runner_phase_seconds', {'script': script, 'phase': phase}, seconds, SECONDS_BUCKETS)
+
+    #วัดขั้นตอนที่ทำฝั่งหน้าเว็บหลังรันจบ (ค้นหาไฟล์/preview/ZIP)
+    #once=True: บันทึกเฉพาะครั้งแรกของการรันนั้น rerun ถัดไปของ Streamlit จึงไม่ถูกนับซ้ำ
+    @contextmanager
+    def ui_phase(self, script, run_metrics, phase, once=True):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            if run_metrics is not None:
+                if once:
+                    recorded = run_metrics.add_once(phase, seconds)
+                else:
+                    run_metrics.set(phase, seconds)
+                    recorded = True
+                if recorded:
+                    self.observe_phase(script, phase, seconds)
+
+    #วัดเวลาวาดส่วนหนึ่งของหน้าเว็บ (fragment) ต่อการ rerun หนึ่งครั้ง คืน dict ที่มี 'seconds' หลังจบ block
+    @contextmanager
+    def ui_render(self, fragment):
+        timing = {}
+        started = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing['seconds'] = time.perf_counter() - started
+            with self._lock:
+                self._observe('script_runner_ui_render_seconds', {'fragment': fragment}, timing['seconds'], SECONDS_BUCKETS)
+
+    #เรียก func พร้อมวัดเวลาเป็นขั้นตอน phase (ใช้กับปุ่มดาวน์โหลดแบบ callable)
+    def timed_call(self, script, run_metrics, phase, func, *args):
+        with self.ui_phase(script, run_metrics, phase, once=False):
+            return func(*args)
+
+    #metrics ทั้งหมดในรูปแบบ text ของ Prometheus
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            self._dirty = False
+
+        described = set()
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            # counts ของแต่ละ bucket เป็นค่าสะสมอยู่แล้ว (observe เพิ่มทุก bucket ที่ค่าไม่เกิน)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    #เขียนไฟล์ metrics แบบ atomic (collector จะไม่อ่านเจอไฟล์ที่เขียนไม่ครบ)
+    def export(self, path=None):
+        path = path or self.export_path
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return path
+
+    def _export_loop(self):
+        while True:
+            time.sleep(self.export_interval)
+            if not self._dirty:
+                continue
+            try:
+                self.export()
+            except OSError:
+                pass
+
+    #เปิด endpoint /metrics สำหรับให้ Prometheus scrape
+    def serve(self, port, host='0.0.0.0'):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+
+_HELP = {
+    'script_runner_phase_seconds': "Time spent in each phase of a script run",
+    'script_runner_max_rss_bytes': "Peak resident memory of the script process",
+    'script_runner_workspace_bytes_written': "Bytes of files created or modified in the run workspace",
+    'script_runner_cpu_seconds_total': "CPU time used by script processes",
+    'script_runner_runs_total': "Number of script runs",
+    'script_runner_ui_render_seconds': "Time to render one fragment of the web page",
+}
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
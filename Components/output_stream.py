@@ -0,0 +1,181 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from collections import deque
+from .config import OUTPUT_HEAD_LINES, OUTPUT_TAIL_LINES, LOG_DIR, LOG_RETENTION_SECONDS
+
+READ_CHUNK_SIZE = 64 * 1024
+# บรรทัดที่ยาวเกินนี้จะถูกตัดตอนแสดงผล (ไฟล์ log ยังเก็บครบ)
+MAX_LINE_BYTES = 16 * 1024
+
+
+class OutputCapture:
+    """เก็บ output ของ script แบบจำกัดขนาด: N บรรทัดแรก + N บรรทัดสุดท้ายใน memory
+
+    output ทั้งหมดถูกเขียนลงไฟล์ (spill file) เพื่อให้ดาวน์โหลดได้ภายหลัง
+    """
+
+    def __init__(self, spill_path, head_lines=OUTPUT_HEAD_LINES, tail_lines=OUTPUT_TAIL_LINES):
+        self.spill_path = spill_path
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self._head = []
+        self._tail = deque(maxlen=tail_lines)
+        self._partial = b''
+        self._lock = threading.Lock()
+        self._spill = open(spill_path, 'wb')
+        self.line_count = 0
+        self.byte_count = 0
+        # เพิ่มทุกครั้งที่มีข้อมูลใหม่ ให้ UI รู้ว่าต้องวาดใหม่หรือไม่
+        self.version = 0
+
+    #รับ output ชุดใหม่ (bytes) จาก pipe หรือไฟล์
+    def feed(self, data):
+        if not data:
+            return
+        with self._lock:
+            if self._spill is not None:
+                self._spill.write(data)
+                # ให้ผู้อ่านไฟล์ log ระหว่างรัน (เช่น API ของ headless.py) เห็นข้อมูลทันที
+                self._spill.flush()
+            self.byte_count += len(data)
+            self.version += 1
+
+            data = self._partial + data
+            last_newline = data.rfind(b'\n')
+            if last_newline < 0:
+                if len(data) > MAX_LINE_BYTES:
+                    # script พิมพ์ยาวโดยไม่ขึ้นบรรทัดใหม่ ตัดเป็นหนึ่งบรรทัดเพื่อไม่ให้ memory โต
+                    self.line_count += 1
+                    self._store([data])
+                    data = b''
+                self._partial = data
+                return
+            self._partial = data[last_newline + 1:]
+            complete = data[:last_newline]
+
+            new_lines = complete.count(b'\n') + 1
+            self.line_count += new_lines
+
+            # เติมส่วนหัวจนเต็ม แล้วเก็บเฉพาะท้ายสุดไว้ใน deque (ไม่ต้อง split ทั้ง chunk)
+            if len(self._head) < self.head_lines:
+                self._store(complete.split(b'\n'))
+            else:
+                self._store(_last_lines(complete, self.tail_lines))
+
+    def _store(self, lines):
+        room = self.head_lines - len(self._head)
+        if room > 0:
+            self._head.extend(line[:MAX_LINE_BYTES] for line in lines[:room])
+            lines = lines[room:]
+        self._tail.extend(line[:MAX_LINE_BYTES] for line in lines[-self.tail_lines:])
+
+    def close(self):
+        with self._lock:
+            if self._partial:
+                partial, self._partial = self._partial, b''
+                self.line_count += 1
+                self._store([partial])
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    #ข้อความสำหรับแสดงผล (ส่วนหัว + ส่วนท้าย ข้ามตรงกลางถ้ายาวเกิน)
+    def text(self):
+        with self._lock:
+            head = list(self._head)
+            tail = list(self._tail)
+            partial = self._partial
+            total = self.line_count
+
+        lines = head
+        skipped = total - len(head) - len(tail)
+        if skipped > 0:
+            lines = lines + [f"... (ข้าม {skipped:,} บรรทัด ดาวน์โหลด log เต็มได้ด้านล่าง) ...".encode('utf-8')]
+        lines = lines + tail
+        if partial:
+            lines.append(partial)
+        text = b'\n'.join(lines).decode('utf-8', errors='replace')
+        if total and not partial:
+            text += '\n'
+        return text
+
+    @property
+    def truncated(self):
+        return self.line_count > self.head_lines + self.tail_lines
+
+
+#หา n บรรทัดสุดท้ายของ chunk โดยค้นจากท้าย แทนการ split ทั้งก้อน
+def _last_lines(data, n):
+    end = len(data)
+    position = end
+    for _ in range(n):
+        position = data.rfind(b'\n', 0, position)
+        if position < 0:
+            break
+    return data[position + 1:].split(b'\n')
+
+
+class RunOutput:
+    """output ของการรันหนึ่งครั้ง (stdout + stderr) พร้อมไฟล์ log ใน LOG_DIR"""
+
+    def __init__(self, log_dir=LOG_DIR):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = tempfile.mkdtemp(prefix="run_", dir=log_dir)
+        self.stdout = OutputCapture(os.path.join(self.log_dir, 'stdout.log'))
+        self.stderr = OutputCapture(os.path.join(self.log_dir, 'stderr.log'))
+        self.finished = threading.Event()
+
+    @property
+    def version(self):
+        return self.stdout.version + self.stderr.version
+
+    def close(self):
+        self.stdout.close()
+        self.stderr.close()
+        self.finished.set()
+
+    #ลบโฟลเดอร์ log ที่เก่ากว่าที่กำหนด (RunScheduler เรียกครั้งเดียวต่องาน ไม่ใช่ทุกครั้งที่สร้าง RunOutput)
+    @staticmethod
+    def cleanup_old_logs(log_dir=LOG_DIR, max_age=LOG_RETENTION_SECONDS):
+        now = time.time()
+        try:
+            entries = list(os.scandir(log_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir() and now - entry.stat().st_mtime > max_age:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+#อ่าน pipe ทีละ chunk ใหญ่ๆ แล้วส่งต่อให้ capture (ใช้ใน thread แยก)
+def pump_pipe(pipe, capture):
+    fd = pipe.fileno()
+    try:
+        while True:
+            data = os.read(fd, READ_CHUNK_SIZE)
+            if not data:
+                break
+            capture.feed(data)
+    finally:
+        pipe.close()
+
+
+#ตามอ่านไฟล์ที่ process อื่นกำลังเขียน จนกว่า stop_event จะถูก set
+def follow_file(path, capture, stop_event, poll_interval=0.05):
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_CHUNK_SIZE)
+            if data:
+                capture.feed(data)
+                continue
+            if stop_event.is_set():
+                data = f.read()
+                capture.feed(data)
+                break
+            time.sleep(poll_interval)
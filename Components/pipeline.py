@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pymongo.errors import PyMongoError
+from .config import PIPELINE_MAX_PARALLEL, DEFAULT_RENDER_PROFILE, RENDER_PROFILES
+from .harness import MANIFEST_DIR, file_type
+from .manifest import OutputManifest
+from .metrics import RunMetrics
+from .output_stream import RunOutput
+from .run_history import RunHistory
+from .run_policy import RunPolicy, CancelToken
+from .script_runner import ScriptRunner
+
+# ไฟล์รายงานเวลาของแต่ละขั้น (เขียนลง workspace รวมอยู่ใน ZIP ผลลัพธ์)
+PIPELINE_REPORT_FILE = 'pipeline_report.json'
+
+
+class Pipeline:
+    """pipeline ของหลาย script ที่ส่งไฟล์ต่อกันใน workspace เดียวกัน (อ่านจากเอกสารใน collection pipelines)
+
+    {"name": "smell", "description": "...", "steps": [
+        {"name": "process", "script": "processDataset.py", "inputs": ["data.csv"],
+         "outputs": ["average_smell_sensor_values.csv"]},
+        {"name": "dendrogram", "script": "dendrogram_plot.py", "inputs": ["average_smell_sensor_values.csv"]},
+        {"name": "pca", "script": "pcaPlotNormal.py", "inputs": ["average_smell_sensor_values.csv"]}]}
+    ขั้นที่ใช้ output ของขั้นอื่นเป็น input (หรือระบุ "after") ต้องรอขั้นนั้นก่อน ขั้นที่ไม่ขึ้นต่อกันรันพร้อมกันได้
+    """
+
+    def __init__(self, name, steps, description=""):
+        self.name = name
+        self.description = description
+        self.steps = steps
+        self.producers = {output: step['name'] for step in steps for output in step['outputs']}
+        self.dependencies = {
+            step['name']: sorted(
+                {self.producers[i] for i in step['inputs'] if i in self.producers} | set(step['after'])
+            )
+            for step in steps
+        }
+        self.order = self._topological_order()
+
+    #สร้างจากเอกสาร (ตรวจชื่อขั้นซ้ำ, output ที่มีหลายขั้นสร้าง, after ที่ไม่มีอยู่ และวงวน)
+    @classmethod
+    def from_document(cls, doc):
+        if not doc or not doc.get('name'):
+            raise ValueError("Pipeline document has no name")
+        raw_steps = doc.get('steps') or []
+        if not raw_steps:
+            raise ValueError(f"Pipeline '{doc['name']}' has no steps")
+
+        steps = []
+        names = set()
+        producers = {}
+        for index, raw in enumerate(raw_steps):
+            script = raw.get('script')
+            if not script:
+                raise ValueError(f"Step {index + 1} of pipeline '{doc['name']}' has no script")
+            name = raw.get('name') or os.path.splitext(script)[0]
+            if name in names:
+                raise ValueError(f"Duplicate step name '{name}' in pipeline '{doc['name']}'")
+            names.add(name)
+            step = {
+                'name': name,
+                'script': script,
+                'inputs': list(raw.get('inputs') or []),
+                'outputs': list(raw.get('outputs') or []),
+                'after': list(raw.get('after') or []),
+            }
+            for output in step['outputs']:
+                if output in producers:
+                    raise ValueError(f"Output '{output}' is produced by both '{producers[output]}' and '{name}'")
+                producers[output] = name
+            steps.append(step)
+
+        for step in steps:
+            for name in step['after']:
+                if name not in names:
+                    raise ValueError(f"Step '{step['name']}' runs after unknown step '{name}'")
+        return cls(doc['name'], steps, doc.get('description', ""))
+
+    def _topological_order(self):
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        order = []
+        ready = [step['name'] for step in self.steps if not remaining[step['name']]]
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for other in self.steps:
+                deps = remaining[other['name']]
+                if name in deps:
+                    deps.discard(name)
+                    if not deps:
+                        ready.append(other['name'])
+        if len(order) != len(self.steps):
+            cycle = sorted(set(remaining) - set(order))
+            raise ValueError(f"Pipeline '{self.name}' has a dependency cycle between {', '.join(cycle)}")
+        return order
+
+    def step(self, name):
+        return next(step for step in self.steps if step['name'] == name)
+
+    #แบ่งขั้นเป็นระดับ: ขั้นในระดับเดียวกันไม่ขึ้นต่อกัน (ใช้แสดงใน UI)
+    def levels(self):
+        depth = {}
+        for name in self.order:
+            depth[name] = max((depth[d] + 1 for d in self.dependencies[name]), default=0)
+        levels = [[] for _ in range(max(depth.values()) + 1)]
+        for name in self.order:
+            levels[depth[name]].append(name)
+        return levels
+
+    #ไฟล์ที่ต้องอัปโหลดเอง (input ที่ไม่มีขั้นไหนสร้าง)
+    def external_inputs(self):
+        inputs = []
+        for step in self.steps:
+            for name in step['inputs']:
+                if name not in self.producers and name not in inputs:
+                    inputs.append(name)
+        return inputs
+
+    @property
+    def scripts(self):
+        return sorted({step['script'] for step in self.steps})
+
+
+class PipelineStore:
+    """อ่านเอกสาร pipeline จาก MongoDB (collection แยกจาก script)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    #ชื่อ pipeline ทั้งหมด
+    def list(self):
+        try:
+            return sorted(doc['name'] for doc in self.collection.find({}, {"name": 1}) if doc.get('name'))
+        except PyMongoError:
+            return []
+
+    #Pipeline ที่ตรวจแล้ว (ValueError ถ้าเอกสารไม่ถูกต้อง) หรือ None ถ้าไม่พบ
+    def get(self, name):
+        doc = self.collection.find_one({"name": name})
+        if doc is None:
+            return None
+        return Pipeline.from_document(doc)
+
+
+class PipelineRunner:
+
+    #รันทุกขั้นของ pipeline ใน temp directory เดียวกัน: ไฟล์ input วางครั้งเดียว
+    #output ของขั้นหนึ่งเป็นไฟล์ใน workspace ที่ขั้นถัดไปเปิดอ่านได้ทันทีโดยไม่ต้อง copy
+    #scripts = {ชื่อไฟล์ script: เอกสาร script} ขั้นที่พร้อมรันพร้อมกันได้สูงสุด max_parallel ขั้น
+    #(เมื่อรันผ่าน RunScheduler จำกัดด้วยช่องรันที่ว่างอยู่ด้วย)
+    #ขั้นที่ล้มเหลวทำให้ขั้นที่ขึ้นกับมันถูกข้าม ยกเลิกทั้ง pipeline ได้ผ่าน run_info['cancel_token']
+    @staticmethod
+    def run(pipeline, scripts, files_dict, pool=None, run_info=None, output=None, metrics_registry=None,
+            render_profile=None, max_parallel=PIPELINE_MAX_PARALLEL):
+        if run_info is None:
+            run_info = {}
+        if output is None:
+            output = RunOutput()
+        metrics = run_info.setdefault('metrics', RunMetrics())
+        token = run_info.setdefault('cancel_token', CancelToken())
+        render_profile = render_profile if render_profile in RENDER_PROFILES else DEFAULT_RENDER_PROFILE
+        run_info['render_profile'] = render_profile
+        run_info['mode'] = 'pipeline'
+        # hash ของ pipeline = hash ของ script ทุกขั้น (รวมชื่อขั้น) เปลี่ยน script ใดก็ได้ hash ใหม่
+        run_info['script_hash'] = RunHistory.script_hash(json.dumps({
+            name: RunHistory.script_hash((scripts.get(pipeline.step(name)['script']) or {}).get('content', ''))
+            for name in pipeline.order
+        }, sort_keys=True))
+        run_info['inputs'] = RunHistory.describe_inputs(files_dict)
+
+        report = {'pipeline': pipeline.name, 'levels': pipeline.levels(), 'steps': {}}
+        for name in pipeline.order:
+            report['steps'][name] = {
+                'script': pipeline.step(name)['script'], 'status': 'pending',
+                'depends_on': pipeline.dependencies[name], 'seconds': None,
+            }
+        run_info['pipeline'] = report
+
+        temp_dir = None
+        try:
+            with metrics.phase('stage'):
+                temp_dir = tempfile.mkdtemp(prefix="pipeline_")
+                ScriptRunner._stage_input_files(files_dict, temp_dir)
+            started = time.time()
+            report['parallel'] = PipelineRunner._parallel_steps(pipeline, run_info, max_parallel)
+            PipelineRunner._run_steps(
+                pipeline, scripts, temp_dir, pool, output, metrics_registry, render_profile, token, report,
+                report['parallel']
+            )
+            report['seconds'] = round(time.time() - started, 3)
+            PipelineRunner._write_results(pipeline, temp_dir, report)
+        except Exception as e:
+            output.stderr.feed(f"Error running pipeline: {e}\n".encode('utf-8'))
+        finally:
+            output.close()
+
+        failed = [name for name, step in report['steps'].items() if step['status'] != 'success']
+        if token.is_set:
+            run_info['stopped'] = token.reason
+        returncode = 1 if failed else 0
+        if metrics_registry is not None:
+            metrics_registry.observe_run(f"pipeline:{pipeline.name}", run_info, returncode)
+        return output.stdout.text(), output.stderr.text(), returncode, temp_dir
+
+    #จำนวนขั้นที่รันพร้อมกันได้จริง: ไม่เกินจำนวนขั้นในระดับที่กว้างที่สุดของ DAG (pipeline แบบเส้นตรงรันทีละขั้นเสมอ)
+    #งานจาก RunScheduler ถือช่องรันอยู่ 1 ช่อง ขั้นที่รันพร้อมกันเกินจากนั้นต้องยืมช่องที่ว่างจาก scheduler
+    #(นับรวมใน RUN_MAX_CONCURRENT / RUN_MAX_PER_USER) ไม่ได้ช่องเพิ่มก็รันทีละขั้น
+    @staticmethod
+    def _parallel_steps(pipeline, run_info, max_parallel):
+        widest = max((len(level) for level in pipeline.levels()), default=1)
+        parallel = max(1, min(max_parallel, widest))
+        borrow_slots = run_info.get('borrow_slots')
+        if borrow_slots is not None:
+            parallel = 1 + borrow_slots(parallel - 1)
+        return parallel
+
+    #ส่งขั้นที่ขั้นก่อนหน้าสำเร็จครบแล้วเข้า thread pool จนกว่าทุกขั้นจะจบหรือถูกข้าม
+    @staticmethod
+    def _run_steps(pipeline, scripts, temp_dir, pool, output, metrics_registry, render_profile, token, report,
+                   max_parallel):
+        steps = report['steps']
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="pipeline") as executor:
+            while True:
+                for name in pipeline.order:
+                    step = steps[name]
+                    if step['status'] != 'pending':
+                        continue
+                    if token.is_set:
+                        PipelineRunner._finish_step(output, step, name, 'cancelled')
+                        continue
+                    statuses = [steps[d]['status'] for d in pipeline.dependencies[name]]
+                    if any(status in ('failed', 'skipped', 'cancelled') for status in statuses):
+                        PipelineRunner._finish_step(output, step, name, 'skipped')
+                    elif all(status == 'success' for status in statuses):
+                        step['status'] = 'running'
+                        output.stdout.feed(f"[pipeline] ▶ {name} ({step['script']})\n".encode('utf-8'))
+                        running[executor.submit(
+                            PipelineRunner._run_step, pipeline.step(name), scripts.get(pipeline.step(name)['script']),
+                            temp_dir, pool, metrics_registry, render_profile, token.child()
+                        )] = name
+                if not running:
+                    return
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    steps[name].update(future.result())
+                    PipelineRunner._finish_step(output, steps[name], name, steps[name]['status'])
+
+    @staticmethod
+    def _finish_step(output, step, name, status):
+        step['status'] = status
+        line = f"[pipeline] {name}: {status}"
+        if step.get('seconds') is not None:
+            line += f" ({step['seconds']:.2f}s)"
+        if step.get('error'):
+            line += f" - {step['error']}"
+        stream = output.stdout if status == 'success' else output.stderr
+        stream.feed(f"{line}\n".encode('utf-8'))
+
+    #รันหนึ่งขั้นใน workspace ร่วม (manifest ของขั้นแยกไว้ใน .runner/steps/<ชื่อขั้น>)
+    @staticmethod
+    def _run_step(step, script_doc, temp_dir, pool, metrics_registry, render_profile, token):
+        result = {'stdout': "", 'stderr': "", 'returncode': None, 'error': None}
+        if script_doc is None or 'content' not in script_doc:
+            result.update(status='failed', error=f"Script '{step['script']}' not found", seconds=0.0)
+            return result
+        missing = [name for name in step['inputs'] if not os.path.exists(os.path.join(temp_dir, name))]
+        if missing:
+            result.update(status='failed', error=f"Missing input {', '.join(missing)}", seconds=0.0)
+            return result
+
+        policy = RunPolicy.from_document(script_doc)
+        step_output = RunOutput()
+        step_info = {'cancel_token': token, 'metrics': RunMetrics()}
+        started = time.time()
+        try:
+            stdout, stderr, returncode = ScriptRunner._execute(
+                script_doc['content'].replace("encoding='tis-620'", "encoding='utf-8'"), temp_dir, pool,
+                step_info, step_output, use_harness=True, render=RENDER_PROFILES[render_profile], policy=policy,
+                manifest_dir=PipelineRunner.manifest_dir(step['name'])
+            )
+        except subprocess.TimeoutExpired:
+            step_info['stopped'] = 'timeout'
+            stdout, stderr, returncode = step_output.stdout.text(), policy.message('timeout'), 1
+        except Exception as e:
+            stdout, stderr, returncode = "", f"Error running script: {str(e)}", 1
+        result.update(
+            stdout=stdout, stderr=stderr, returncode=returncode, seconds=round(time.time() - started, 3),
+            phases=step_info['metrics'].phases, mode=step_info.get('mode'), log_dir=step_info.get('log_dir'),
+        )
+        if metrics_registry is not None:
+            metrics_registry.observe_run(step['script'], step_info, returncode)
+
+        if step_info.get('stopped'):
+            result.update(status='cancelled' if step_info['stopped'] == 'cancelled' else 'failed',
+                          error=policy.message(step_info['stopped']))
+        elif returncode != 0:
+            result.update(status='failed', error=f"exit code {returncode}")
+        else:
+            missing = [name for name in step['outputs'] if not os.path.exists(os.path.join(temp_dir, name))]
+            if missing:
+                result.update(status='failed', error=f"Declared output not written: {', '.join(missing)}")
+            else:
+                result['status'] = 'success'
+        return result
+
+    @staticmethod
+    def manifest_dir(step_name):
+        return f"{MANIFEST_DIR}/steps/{step_name}"
+
+    #เขียนรายงานเวลาและ manifest รวม (แต่ละไฟล์บอกว่ามาจากขั้นไหน) ให้ ZIP/preview ใช้เหมือนการรันเดี่ยว
+    @staticmethod
+    def _write_results(pipeline, temp_dir, report):
+        files = {}
+        for name in pipeline.order:
+            for entry in OutputManifest.read(temp_dir, PipelineRunner.manifest_dir(name)) or []:
+                previous = files.get(entry['path'])
+                entry['step'] = name
+                if previous is not None and entry.get('producer') is None and previous.get('producer') is not None:
+                    # ขั้นที่รันพร้อมกันเห็นไฟล์ของกันและกันจากการเทียบ workspace ใช้ขั้นที่ harness บันทึกไว้
+                    continue
+                if previous is not None:
+                    # ขั้นหลังแก้ไฟล์ของขั้นก่อน ถือว่าไฟล์ถูกสร้างในขั้นแรกที่เขียน
+                    entry['created'] = previous.get('created')
+                files[entry['path']] = entry
+
+        report_view = {
+            'pipeline': report['pipeline'], 'seconds': report.get('seconds'), 'levels': report['levels'],
+            'steps': {
+                name: {key: step.get(key) for key in ('script', 'status', 'depends_on', 'seconds', 'returncode',
+                                                         'error', 'mode', 'phases')}
+                for name, step in report['steps'].items()
+            },
+        }
+        with open(os.path.join(temp_dir, PIPELINE_REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report_view, f, indent=2, ensure_ascii=False)
+        files[PIPELINE_REPORT_FILE] = {
+            'path': PIPELINE_REPORT_FILE, 'size': os.path.getsize(os.path.join(temp_dir, PIPELINE_REPORT_FILE)),
+            'type': file_type(PIPELINE_REPORT_FILE), 'created': True, 'site': None, 'producer': 'pipeline', 'step': None,
+        }
+        OutputManifest.write(temp_dir, [files[path] for path in sorted(files)])
@@ -0,0 +1,186 @@
+"""Worker process ของ WorkerPool
+
+โหลด library หนักๆ (pandas, numpy, matplotlib, scikit-learn) ไว้ล่วงหน้าครั้งเดียว
+แล้วรอรับงานผ่าน pipe (JSON ทีละบรรทัด: path ของ script และ workspace ที่วางไฟล์ input ไว้แล้ว)
+ทุกงานจะ fork process ลูกใหม่จาก worker นี้
+ทำให้ได้ namespace และ working directory ที่สะอาดทุกครั้งโดยไม่ต้องเสียเวลา import ซ้ำ
+"""
+import os
+import sys
+import json
+import time
+import signal
+import harness
+
+_started_at = time.time()
+
+
+#โหลด module ที่ใช้บ่อยไว้ล่วงหน้า
+def _preload(module_names):
+    loaded = []
+    for name in module_names:
+        try:
+            if name == 'matplotlib':
+                import matplotlib
+                matplotlib.use('Agg')
+                import matplotlib.pyplot  # noqa: F401
+            else:
+                __import__(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+#อ่านขนาด memory (RSS) ของ worker ปัจจุบัน
+def _current_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return 0
+
+
+#ส่วนที่รันใน process ลูกหลัง fork
+def _run_child(job):
+    harness.reset_timings()
+    try:
+        # process group ของตัวเอง ให้ kill ทั้ง script และ process ที่ script สร้างได้ในคำสั่งเดียว
+        os.setpgid(0, 0)
+        os.chdir(job['cwd'])
+
+        out_fd = os.open(job['stdout_path'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        err_fd = os.open(job['stderr_path'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        os.close(out_fd)
+        os.close(err_fd)
+
+        sys.stdin = open(os.devnull, 'r')
+        harness.setup_output_streams()
+        sys.argv = [job['script_path']]
+        sys.path[0] = job['cwd']
+        harness.apply_limits(job.get('limits'))
+    except BaseException:
+        os._exit(1)
+
+    returncode = 0
+    code_path = job.get('code_path')
+    try:
+        if job.get('harness'):
+            harness.prepare(job['cwd'], job.get('render'))
+        harness.start_manifest(job['cwd'], [job['script_path'], code_path[:-1] if code_path else None],
+                               job.get('manifest_dir'))
+        harness.mark('prepared')
+        harness.run_script(job['script_path'], job.get('code_path'))
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException as e:
+        harness.print_user_traceback(e, job['script_path'], job.get('code_path'))
+        returncode = 1
+
+    harness.finish_manifest()
+    harness.mark('finished')
+    if job.get('timings_path'):
+        harness.write_timings(job['timings_path'])
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        pass
+    os._exit(returncode)
+
+
+#การใช้ทรัพยากรของ process ลูกจาก wait4 (ru_maxrss ของ Linux หน่วยเป็น KB)
+def _rusage_dict(rusage):
+    return {
+        'max_rss_bytes': rusage.ru_maxrss * 1024,
+        'user_cpu_seconds': rusage.ru_utime,
+        'system_cpu_seconds': rusage.ru_stime,
+    }
+
+
+#kill process ที่ยังเหลือใน process group ของงาน (เช่น multiprocessing worker ที่ script ไม่ได้ปิด)
+def _kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+#รอ process ลูกจนจบหรือหมดเวลา คืน (returncode, หมดเวลาหรือไม่, rusage)
+def _wait_child(pid, timeout):
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if waited_pid == pid:
+            _kill_group(pid)
+            return os.waitstatus_to_exitcode(status), False, _rusage_dict(rusage)
+        if time.monotonic() >= deadline:
+            _kill_group(pid)
+            _, _, rusage = os.wait4(pid, 0)
+            return 1, True, _rusage_dict(rusage)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+
+def main():
+    # ใช้ stdout เดิมเป็นช่องทางสื่อสารกับ pool เท่านั้น กันไม่ให้ข้อความจาก library ปนเข้ามา
+    channel = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+
+    preload = [name for name in os.environ.get('WORKER_PRELOAD_MODULES', '').split(',') if name]
+    loaded = _preload(preload)
+
+    channel.write(json.dumps({
+        'ready': True,
+        'pid': os.getpid(),
+        'preloaded': loaded,
+        'warmup_seconds': time.time() - _started_at,
+    }) + '\n')
+    channel.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        if job.get('shutdown'):
+            break
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        fork_started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            channel.close()
+            _run_child(job)
+        fork_seconds = time.perf_counter() - fork_started
+        try:
+            # ตั้งจากฝั่ง parent ด้วย กันกรณีถูก kill ก่อนที่ process ลูกจะตั้ง group เอง
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        # แจ้ง pid (= process group) ให้ฝั่ง server ใช้ยกเลิกงานระหว่างรัน
+        channel.write(json.dumps({'started': True, 'pid': pid}) + '\n')
+        channel.flush()
+
+        returncode, timed_out, rusage = _wait_child(pid, job.get('timeout', 60))
+        channel.write(json.dumps({
+            'returncode': returncode,
+            'timed_out': timed_out,
+            'rusage': rusage,
+            'fork_seconds': fork_seconds,
+            'rss_bytes': _current_rss_bytes(),
+        }) + '\n')
+        channel.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import os
+import codecs
+import hashlib
+import streamlit as st
+import pandas as pd
+from contextlib import contextmanager
+from .config import PREVIEW_ROWS, PREVIEW_CACHE_ENTRIES
+
+CHUNK_SIZE = 1024 * 1024
+# บรรทัดที่ยาวกว่านี้จะถูกตัดในตัวอย่าง (กันไฟล์ที่ไม่มีการขึ้นบรรทัดใหม่เลย)
+MAX_LINE_BYTES = 64 * 1024
+
+
+class FilePreview:
+    """อ่านไฟล์เท่าที่ต้องแสดงเท่านั้น (N แถว/บรรทัดแรก) และ cache ผลตาม hash ของเนื้อหา
+
+    source เป็นได้ทั้ง path ของไฟล์ หรือไฟล์ที่อัปโหลด (UploadedFile)
+    key ใช้แยก cache: ไฟล์อัปโหลดใช้ SHA-256 ของเนื้อหา, ไฟล์บน disk ใช้ inode + ขนาด + เวลาแก้ไข
+    rerun ของ Streamlit จึงไม่ต้องอ่านไฟล์ซ้ำ
+    """
+
+    #key ของไฟล์ที่อัปโหลด (hash ครั้งเดียวต่อการอัปโหลด เก็บไว้ใน session)
+    @staticmethod
+    def upload_key(uploaded_file):
+        if 'preview_digests' not in st.session_state:
+            st.session_state.preview_digests = {}
+        digests = st.session_state.preview_digests
+        upload_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+        if upload_id not in digests:
+            digests[upload_id] = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        return digests[upload_id]
+
+    #key ของไฟล์บน disk จาก stat (ไม่ต้องอ่านเนื้อหา)
+    @staticmethod
+    def file_key(file_path):
+        stat = os.stat(file_path)
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    #N แถวแรกของ Excel คืน (DataFrame, จำนวนคอลัมน์)
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def excel_head(key, _source, extension, rows=PREVIEW_ROWS):
+        if extension != 'xlsx':
+            # .xls (xlrd) ไม่มีโหมดอ่านทีละแถว ใช้ nrows ของ pandas แทน
+            with _open(_source) as f:
+                df = pd.read_excel(f, nrows=rows)
+            return df, len(df.columns)
+
+        from openpyxl import load_workbook
+        with _open(_source) as f:
+            workbook = load_workbook(f, read_only=True, data_only=True)
+            try:
+                sheet = workbook.active
+                values = list(sheet.iter_rows(max_row=rows + 1, values_only=True))
+            finally:
+                workbook.close()
+        if not values:
+            return pd.DataFrame(), 0
+        header = [
+            str(name) if name is not None else f"Unnamed: {i}"
+            for i, name in enumerate(values[0])
+        ]
+        return pd.DataFrame(values[1:], columns=header), len(header)
+
+    #นับจำนวนแถวข้อมูลของ Excel (ไม่รวมหัวตาราง) เรียกเมื่อผู้ใช้ขอเท่านั้น
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def excel_row_count(key, _source, extension):
+        if extension != 'xlsx':
+            with _open(_source) as f:
+                return len(pd.read_excel(f, usecols=[0]))
+
+        from openpyxl import load_workbook
+        with _open(_source) as f:
+            workbook = load_workbook(f, read_only=True, data_only=True)
+            try:
+                sheet = workbook.active
+                # ใช้ขนาดจาก <dimension> ของ sheet ถ้ามี ไม่งั้นนับทีละแถว
+                count = sheet.max_row
+                if not count:
+                    count = sum(1 for _ in sheet.iter_rows(values_only=True))
+            finally:
+                workbook.close()
+        return max(count - 1, 0)
+
+    #N แถวแรกของ CSV
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def csv_head(key, _source, rows=PREVIEW_ROWS):
+        with _open(_source) as f:
+            return pd.read_csv(f, nrows=rows)
+
+    #นับจำนวนแถวข้อมูลของ CSV จากจำนวนบรรทัด (ไม่ parse ข้อมูล)
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def csv_row_count(key, _source):
+        lines = 0
+        last = b'\n'
+        with _open(_source) as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines += chunk.count(b'\n')
+                last = chunk[-1:]
+        if last != b'\n':
+            lines += 1
+        return max(lines - 1, 0)
+
+    #N แถวแรกของไฟล์ columnar (Parquet / Feather / Arrow IPC) คืน (DataFrame, จำนวนคอลัมน์)
+    #อ่านผ่าน memory map ของ pyarrow: Parquet อ่านเฉพาะ row group แรก, Feather/Arrow อ่านเฉพาะ record batch แรก
+    #ไม่มี pyarrow ใช้ pandas อ่านทั้งไฟล์แทน (ต้องมี engine อื่นของ Parquet เช่น fastparquet)
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def columnar_head(key, _source, extension, rows=PREVIEW_ROWS):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            with _open(_source) as f:
+                df = pd.read_parquet(f) if extension == 'parquet' else pd.read_feather(f)
+            return df.head(rows), len(df.columns)
+
+        with _arrow_source(_source) as source:
+            if extension == 'parquet':
+                import pyarrow.parquet as pq
+                parquet = pq.ParquetFile(source)
+                batch = next(parquet.iter_batches(batch_size=rows), None)
+                schema = parquet.schema_arrow
+            else:
+                schema, batch = _first_ipc_batch(source)
+            table = pa.Table.from_batches([batch.slice(0, rows)]) if batch is not None else schema.empty_table()
+            df = table.to_pandas()
+        return df, len(df.columns)
+
+    #นับจำนวนแถวของไฟล์ columnar จาก metadata (Parquet) หรือขนาดของแต่ละ record batch (Feather/Arrow)
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def columnar_row_count(key, _source, extension):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            with _open(_source) as f:
+                return len(pd.read_parquet(f) if extension == 'parquet' else pd.read_feather(f))
+
+        with _arrow_source(_source) as source:
+            if extension == 'parquet':
+                import pyarrow.parquet as pq
+                return pq.ParquetFile(source).metadata.num_rows
+            try:
+                reader = pa.ipc.open_file(source)
+                return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                source.seek(0)
+                return sum(batch.num_rows for batch in pa.ipc.open_stream(source))
+
+    #N บรรทัดแรกของไฟล์ text คืน (ข้อความ, มีบรรทัดเหลืออีกหรือไม่)
+    #ถ้า decode เป็น utf-8 ไม่ได้จะ raise UnicodeDecodeError เหมือนเดิม
+    @staticmethod
+    @st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+    def text_head(key, _source, lines=PREVIEW_ROWS):
+        head = []
+        with _open(_source) as f:
+            while len(head) < lines:
+                line = f.readline(MAX_LINE_BYTES)
+                if not line:
+                    break
+                head.append(line)
+                if not line.endswith(b'\n') and len(line) == MAX_LINE_BYTES:
+                    break
+            has_more = bool(f.read(1))
+        # decode แบบไม่ final: ตัวอักษรหลาย byte ที่ถูกตัดกลางตรงท้ายจะถูกข้ามไป ไม่นับเป็น binary
+        text = codecs.getincrementaldecoder('utf-8')().decode(b''.join(head))
+        return text.rstrip('\n'), has_more
+
+
+#เปิด source เป็น binary stream (ไฟล์อัปโหลดใช้ตัวเดิมโดย seek กลับไปต้นไฟล์)
+@contextmanager
+def _open(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield f
+    else:
+        source.seek(0)
+        try:
+            yield source
+        finally:
+            source.seek(0)
+
+
+#เปิด source เป็น input ของ pyarrow โดยไม่คัดลอกข้อมูล: ไฟล์บน disk ใช้ memory map, ไฟล์อัปโหลดอ่านจาก buffer เดิม
+@contextmanager
+def _arrow_source(source):
+    import pyarrow as pa
+    if isinstance(source, (str, os.PathLike)):
+        with pa.memory_map(os.fspath(source), 'r') as f:
+            yield f
+    else:
+        yield pa.BufferReader(pa.py_buffer(source.getbuffer()))
+
+
+#schema และ record batch แรกของไฟล์ Arrow IPC (รูปแบบ file ของ Feather v2 หรือรูปแบบ stream)
+def _first_ipc_batch(source):
+    import pyarrow as pa
+    try:
+        reader = pa.ipc.open_file(source)
+        return reader.schema, reader.get_batch(0) if reader.num_record_batches else None
+    except pa.ArrowInvalid:
+        source.seek(0)
+        reader = pa.ipc.open_stream(source)
+        try:
+            return reader.schema, reader.read_next_batch()
+        except StopIteration:
+            return reader.schema, None
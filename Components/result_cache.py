@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from .config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+from .blob_store import BlobHandle
+from .file_links import link_or_copy
+from .harness import HARNESS_VERSION
+from .manifest import OutputManifest
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ResultCache:
+    """cache ผลการรัน script บน disk
+
+    key มาจาก hash ของเนื้อหา script + เนื้อหาไฟล์ input ทุกไฟล์ + เวอร์ชันของ harness
+    ถ้าเจอใน cache จะคืน stdout / stderr / return code / ไฟล์ที่สร้าง ทันทีโดยไม่ต้องเปิด process
+    จำกัดขนาดรวมและลบรายการที่ไม่ได้ใช้นานที่สุดก่อน (LRU)
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, max_mb=RESULT_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._sizes = self._scan_sizes()
+
+    #สร้าง key จาก script + ไฟล์ input (ใช้ digest ของ BlobHandle ไม่ต้องอ่านไฟล์ซ้ำ)
+    @staticmethod
+    def make_key(script_content, files_dict=None, extra=None):
+        hasher = hashlib.sha256()
+        hasher.update(f"harness:{HARNESS_VERSION}\n".encode('utf-8'))
+        hasher.update(hashlib.sha256(script_content.encode('utf-8')).hexdigest().encode('utf-8'))
+        for filename in sorted(files_dict or {}):
+            content = files_dict[filename]
+            if isinstance(content, BlobHandle):
+                digest = content.digest
+            else:
+                digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            hasher.update(f"\n{filename}\0{digest}".encode('utf-8'))
+        if extra:
+            hasher.update(f"\nextra:{json.dumps(extra, sort_keys=True)}".encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _scan_sizes(self):
+        sizes = {}
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, 'meta.json'), 'r', encoding='utf-8') as f:
+                    sizes[entry.name] = json.load(f)['size']
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return sizes
+
+    #ดึงผลลัพธ์จาก cache: สร้าง temp directory ใหม่ที่มีไฟล์ผลลัพธ์ และส่ง log เดิมเข้า output
+    def get(self, key, output=None):
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        temp_dir = tempfile.mkdtemp(prefix="script_runner_")
+        files_dir = os.path.join(entry_dir, 'files')
+        try:
+            for relative_path in meta['files']:
+                target_path = os.path.join(temp_dir, relative_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                link_or_copy(os.path.join(files_dir, relative_path), target_path)
+            if meta.get('manifest') is not None:
+                OutputManifest.write(temp_dir, meta['manifest'])
+            if output is not None:
+                _replay_log(os.path.join(entry_dir, 'stdout.log'), output.stdout)
+                _replay_log(os.path.join(entry_dir, 'stderr.log'), output.stderr)
+        except OSError:
+            # entry เสีย (ถูกลบระหว่างใช้) ถือว่าไม่เจอ
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # อัปเดตเวลาใช้งานล่าสุดสำหรับ LRU
+        os.utime(meta_path)
+        with self._lock:
+            self.hits += 1
+        return meta['stdout'], meta['stderr'], meta['returncode'], temp_dir
+
+    #เก็บผลลัพธ์ลง cache (ไฟล์ที่สร้างใช้ hardlink จาก temp directory ถ้าทำได้)
+    def put(self, key, stdout, stderr, returncode, temp_dir, input_names=(), output=None):
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        staging_dir = tempfile.mkdtemp(prefix=".entry_", dir=self.root)
+        files_dir = os.path.join(staging_dir, 'files')
+        try:
+            files = []
+            size = len(stdout) + len(stderr)
+            # เก็บเฉพาะไฟล์ที่ script สร้าง/แก้ไข (จาก manifest หรือ scan แล้วตัดชื่อไฟล์ input ออก)
+            manifest = OutputManifest.read(temp_dir)
+            outputs = manifest if manifest is not None else OutputManifest.outputs(temp_dir, input_names)
+            for item in outputs:
+                relative_path = item['path']
+                source_path = os.path.join(temp_dir, relative_path)
+                target_path = os.path.join(files_dir, relative_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                link_or_copy(source_path, target_path)
+                files.append(relative_path)
+                size += os.path.getsize(source_path)
+
+            if output is not None:
+                for capture, name in ((output.stdout, 'stdout.log'), (output.stderr, 'stderr.log')):
+                    if os.path.exists(capture.spill_path):
+                        link_or_copy(capture.spill_path, os.path.join(staging_dir, name))
+                        size += os.path.getsize(capture.spill_path)
+
+            if size > self.max_bytes:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return
+
+            meta = {
+                'stdout': stdout,
+                'stderr': stderr,
+                'returncode': returncode,
+                'files': files,
+                'manifest': manifest,
+                'size': size,
+                'created_at': time.time(),
+            }
+            with open(os.path.join(staging_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._sizes[key] = size
+        self._evict()
+
+    #ลบรายการที่ใช้ล่าสุดเก่าที่สุดจนขนาดรวมไม่เกินที่กำหนด
+    def _evict(self):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            last_used = {}
+            for key in self._sizes:
+                try:
+                    last_used[key] = os.stat(os.path.join(self._entry_dir(key), 'meta.json')).st_mtime
+                except OSError:
+                    last_used[key] = 0
+            victims = []
+            for key in sorted(last_used, key=last_used.get):
+                if total <= self.max_bytes:
+                    break
+                total -= self._sizes[key]
+                victims.append(key)
+        for key in victims:
+            self._remove(key)
+
+    def _remove(self, key):
+        with self._lock:
+            self._sizes.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._sizes),
+                'size_bytes': sum(self._sizes.values()),
+            }
+
+
+#อ่าน log ที่เก็บไว้ส่งเข้า capture ใหม่ (ได้ทั้งส่วนหัว/ท้ายและไฟล์ log เต็มเหมือนรันจริง)
+def _replay_log(path, capture):
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            capture.feed(data)
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from .blob_store import BlobHandle
+from .file_links import link_or_copy
+from .config import (
+    RUN_HISTORY_DB, RUN_HISTORY_DIR, RUN_HISTORY_MAX_MB, RUN_HISTORY_MAX_DAYS, RUN_HISTORY_PAGE_SIZE
+)
+from .manifest import OutputManifest
+from .zip_export import build_zip
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    script TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    script_hash TEXT,
+    status TEXT NOT NULL,
+    returncode INTEGER,
+    stopped TEXT,
+    cache TEXT,
+    mode TEXT,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    wait_seconds REAL,
+    run_seconds REAL,
+    phases TEXT,
+    inputs TEXT,
+    artifacts TEXT,
+    artifact_bytes INTEGER NOT NULL DEFAULT 0,
+    artifacts_state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_finished ON runs (finished_at DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS runs_script ON runs (script, finished_at DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS runs_user ON runs (user_id, finished_at DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS runs_user_script ON runs (user_id, script, finished_at DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS runs_stored ON runs (artifacts_state, finished_at);
+"""
+
+# field ที่เก็บเป็น JSON
+JSON_FIELDS = ('phases', 'inputs', 'artifacts')
+
+# สถานะของไฟล์ผลลัพธ์และ log: stored = ดาวน์โหลดได้, evicted = ถูกลบเพราะพื้นที่เต็ม,
+# too_large = ใหญ่เกินพื้นที่ทั้งหมดจึงไม่ได้เก็บ, none = การรันไม่มีไฟล์ผลลัพธ์และ log
+ARTIFACT_STATES = ('stored', 'evicted', 'too_large', 'none')
+
+
+class RunHistory:
+    """ประวัติการรันที่อยู่ข้ามการ reload หน้าและการ restart server
+
+    ข้อมูลการรัน (script, hash ของ script, input, เวลา, return code, รายการไฟล์ผลลัพธ์) อยู่ใน SQLite ที่มี index
+    ตาม script / ผู้ใช้ / เวลาจบ แบ่งหน้าด้วย cursor (finished_at, run_id) ของแถวสุดท้ายแทน OFFSET
+    ไฟล์ผลลัพธ์และ log ของแต่ละการรัน hardlink ไว้ใน <root>/<run_id>/ จึงดาวน์โหลดซ้ำได้โดยไม่ต้องรันใหม่
+    ลบข้อมูลการรันที่เก่ากว่า max_days และลบไฟล์ของการรันเก่าสุดก่อนเมื่อขนาดรวมเกิน max_mb (ข้อมูลการรันยังอยู่)
+    """
+
+    def __init__(self, db_path=RUN_HISTORY_DB, root=RUN_HISTORY_DIR, max_mb=RUN_HISTORY_MAX_MB,
+                 max_days=RUN_HISTORY_MAX_DAYS, page_size=RUN_HISTORY_PAGE_SIZE):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age_seconds = max_days * 24 * 3600
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # ใช้ connection เดียวร่วมทุก thread (ป้องกันด้วย lock) WAL ให้ process อื่นอ่านได้ระหว่างเขียน
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    #รายการ input ของการรัน: ชื่อไฟล์, sha256 และขนาด (BlobHandle ใช้ digest ที่มีอยู่แล้ว ไม่อ่านไฟล์ซ้ำ)
+    @staticmethod
+    def describe_inputs(files_dict):
+        inputs = []
+        for filename in sorted(files_dict or {}):
+            content = files_dict[filename]
+            if isinstance(content, BlobHandle):
+                inputs.append({'name': filename, 'digest': content.digest, 'size': content.size})
+            else:
+                data = content.encode('utf-8')
+                inputs.append({'name': filename, 'digest': hashlib.sha256(data).hexdigest(), 'size': len(data)})
+        return inputs
+
+    @staticmethod
+    def script_hash(script_content):
+        return hashlib.sha256(script_content.encode('utf-8')).hexdigest()
+
+    def _run_dir(self, run_id):
+        return os.path.join(self.root, run_id)
+
+    #บันทึกงานที่จบแล้ว (RunJob จาก RunScheduler) พร้อมเก็บไฟล์ผลลัพธ์และ log
+    def record(self, job):
+        run_info = job.run_info
+        inputs = run_info.get('inputs', [])
+        mode = run_info.get('mode')
+        kind = mode if mode in ('pipeline', 'batch') else 'script'
+        outputs = OutputManifest.outputs(job.temp_dir, [item['name'] for item in inputs])
+        artifacts = [
+            {key: entry.get(key) for key in ('path', 'size', 'type', 'site')}
+            for entry in outputs
+        ]
+        state, stored_bytes = self._store_files(job.run_id, job.temp_dir, artifacts, job.output)
+        metrics = run_info.get('metrics')
+
+        row = {
+            'run_id': job.run_id,
+            'user_id': job.history_user,
+            'script': job.label,
+            'kind': kind,
+            'script_hash': run_info.get('script_hash'),
+            'status': job.status,
+            'returncode': job.result[2] if job.result else None,
+            'stopped': run_info.get('stopped'),
+            'cache': run_info.get('cache'),
+            'mode': mode,
+            'error': job.error,
+            'submitted_at': job.submitted_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at or time.time(),
+            'wait_seconds': round(job.wait_seconds, 3),
+            'run_seconds': round(job.run_seconds, 3),
+            'phases': json.dumps({k: round(v, 4) for k, v in (metrics.phases if metrics else {}).items()}),
+            'inputs': json.dumps(inputs),
+            'artifacts': json.dumps(artifacts),
+            'artifact_bytes': stored_bytes,
+            'artifacts_state': state,
+        }
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' for _ in row)
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO runs ({columns}) VALUES ({placeholders})", tuple(row.values()))
+            self._db.commit()
+        self.enforce_retention()
+
+    #hardlink ไฟล์ผลลัพธ์ + log ลง <root>/<run_id>/ (เขียนลงโฟลเดอร์ชั่วคราวแล้ว rename) คืน (สถานะ, ขนาดรวม)
+    def _store_files(self, run_id, temp_dir, artifacts, output):
+        logs = []
+        if output is not None:
+            for capture, name in ((output.stdout, 'stdout.log'), (output.stderr, 'stderr.log')):
+                if os.path.exists(capture.spill_path):
+                    logs.append((capture.spill_path, name))
+        if not artifacts and not logs:
+            return 'none', 0
+
+        size = sum(entry['size'] or 0 for entry in artifacts) + sum(os.path.getsize(path) for path, _ in logs)
+        if size > self.max_bytes:
+            return 'too_large', 0
+
+        staging_dir = tempfile.mkdtemp(prefix=".run_", dir=self.root)
+        try:
+            for entry in artifacts:
+                target_path = os.path.join(staging_dir, 'files', entry['path'])
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                link_or_copy(os.path.join(temp_dir, entry['path']), target_path)
+            for source_path, name in logs:
+                link_or_copy(source_path, os.path.join(staging_dir, name))
+            run_dir = self._run_dir(run_id)
+            shutil.rmtree(run_dir, ignore_errors=True)
+            os.rename(staging_dir, run_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return 'none', 0
+        return 'stored', size
+
+    @staticmethod
+    def _to_dict(row):
+        item = dict(row)
+        for field in JSON_FIELDS:
+            item[field] = json.loads(item[field]) if item[field] else ([] if field != 'phases' else {})
+        return item
+
+    @staticmethod
+    def _where(script=None, user_id=None):
+        clauses, params = [], []
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if script:
+            clauses.append("script = ?")
+            params.append(script)
+        return clauses, params
+
+    #หน้าถัดไปของประวัติ (ใหม่สุดก่อน) คืน (รายการ, cursor ของหน้าถัดไป หรือ None ถ้าหมดแล้ว)
+    #after = cursor ที่ได้จากหน้าก่อน: (finished_at, run_id) ของแถวสุดท้าย
+    def page(self, script=None, user_id=None, after=None, limit=None):
+        limit = limit or self.page_size
+        clauses, params = self._where(script, user_id)
+        if after is not None:
+            clauses.append("(finished_at < ? OR (finished_at = ? AND run_id < ?))")
+            params.extend([after[0], after[0], after[1]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM runs {where} ORDER BY finished_at DESC, run_id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        items = [self._to_dict(row) for row in rows[:limit]]
+        next_cursor = (items[-1]['finished_at'], items[-1]['run_id']) if len(rows) > limit else None
+        return items, next_cursor
+
+    def count(self, script=None, user_id=None):
+        clauses, params = self._where(script, user_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+
+    #ชื่อ script ที่มีในประวัติ (ของผู้ใช้คนเดียวถ้าระบุ user_id)
+    def scripts(self, user_id=None):
+        clauses, params = self._where(user_id=user_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(f"SELECT DISTINCT script FROM runs {where} ORDER BY script", params).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, run_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    #path ของไฟล์ผลลัพธ์ที่เก็บไว้ (None ถ้าไม่ใช่ไฟล์ผลลัพธ์ของการรันนี้ หรือถูกลบไปแล้ว)
+    def artifact_path(self, run_id, relative_path):
+        run = self.get(run_id)
+        if run is None or run['artifacts_state'] != 'stored':
+            return None
+        if relative_path not in {entry['path'] for entry in run['artifacts']}:
+            return None
+        path = os.path.join(self._run_dir(run_id), 'files', relative_path)
+        return path if os.path.isfile(path) else None
+
+    #path ของ log (stream = stdout / stderr) หรือ None ถ้าไม่ได้เก็บไว้
+    def log_path(self, run_id, stream='stdout'):
+        if stream not in ('stdout', 'stderr'):
+            return None
+        path = os.path.join(self._run_dir(run_id), f"{stream}.log")
+        return path if os.path.isfile(path) else None
+
+    #ZIP ของไฟล์ผลลัพธ์ทั้งหมดของการรัน (spooled temp file ที่ seek ไปต้นไฟล์แล้ว) หรือ None ถ้าไม่มีไฟล์
+    def artifacts_zip(self, run_id):
+        run = self.get(run_id)
+        if run is None or run['artifacts_state'] != 'stored':
+            return None
+        files_dir = os.path.join(self._run_dir(run_id), 'files')
+        return build_zip([os.path.join(files_dir, entry['path']) for entry in run['artifacts']], files_dir)
+
+    #ลบข้อมูลการรันที่เก่ากว่ากำหนด แล้วลบไฟล์ของการรันเก่าสุดจนขนาดรวมไม่เกินที่กำหนด
+    def enforce_retention(self, now=None):
+        now = now or time.time()
+        cutoff = now - self.max_age_seconds
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT run_id FROM runs WHERE finished_at < ?", (cutoff,)
+            ).fetchall()]
+            self._db.execute("DELETE FROM runs WHERE finished_at < ?", (cutoff,))
+
+            evicted = []
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(artifact_bytes), 0) FROM runs WHERE artifacts_state = 'stored'"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                for run_id, size in self._db.execute(
+                    "SELECT run_id, artifact_bytes FROM runs WHERE artifacts_state = 'stored' ORDER BY finished_at"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    total -= size
+                    evicted.append(run_id)
+                self._db.executemany(
+                    "UPDATE runs SET artifacts_state = 'evicted', artifact_bytes = 0 WHERE run_id = ?",
+                    [(run_id,) for run_id in evicted]
+                )
+            self._db.commit()
+        for run_id in expired + evicted:
+            shutil.rmtree(self._run_dir(run_id), ignore_errors=True)
+        return {'expired': len(expired), 'evicted': len(evicted)}
+
+    def stats(self):
+        with self._lock:
+            runs, stored_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(artifact_bytes), 0) FROM runs"
+            ).fetchone()
+        return {'runs': runs, 'stored_bytes': stored_bytes, 'max_bytes': self.max_bytes}
@@ -0,0 +1,178 @@
+import os
+import time
+import uuid
+import signal
+import threading
+from .config import RUN_TIMEOUT_SECONDS, RUN_MEMORY_LIMIT_MB, RUN_CPU_LIMIT_SECONDS, RUN_MAX_OUTPUT_MB, RUN_CGROUP_ROOT
+
+# ข้อความที่ต่อท้าย stderr เมื่อการรันถูกหยุด (ตามสาเหตุ)
+STOP_MESSAGES = {
+    'timeout': "Script execution timeout ({timeout:g} seconds)",
+    'cancelled': "Script cancelled by user",
+    'output_limit': "Output limit exceeded ({max_output_mb:g} MB)",
+    'memory_limit': "Memory limit exceeded ({memory_mb:g} MB)",
+    'cpu_limit': "CPU time limit exceeded ({cpu_seconds:g} seconds)",
+}
+
+
+class RunPolicy:
+    """ข้อจำกัดของการรัน script หนึ่งตัว อ่านจาก field run_policy ในเอกสารของ script
+
+    {"run_policy": {"timeout": 120, "memory_mb": 2048, "cpu_seconds": 300, "max_output_mb": 50}}
+    field ที่ไม่ระบุใช้ค่าเริ่มต้นจาก config (0 = ไม่จำกัด ยกเว้น timeout)
+    memory จำกัดด้วย cgroup (memory.max) ถ้าตั้ง RUN_CGROUP_ROOT ไว้ ไม่งั้นใช้ RLIMIT_AS (นับจากขนาดตอนเริ่ม script)
+    """
+
+    FIELDS = ('timeout', 'memory_mb', 'cpu_seconds', 'max_output_mb')
+
+    def __init__(self, timeout=RUN_TIMEOUT_SECONDS, memory_mb=RUN_MEMORY_LIMIT_MB, cpu_seconds=RUN_CPU_LIMIT_SECONDS,
+                 max_output_mb=RUN_MAX_OUTPUT_MB, cgroup_root=RUN_CGROUP_ROOT):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.max_output_mb = max_output_mb
+        self.cgroup_root = cgroup_root
+
+    #สร้างจากเอกสาร script (ค่าที่ไม่ใช่ตัวเลขหรือติดลบถูกข้ามไป)
+    @classmethod
+    def from_document(cls, doc):
+        values = (doc or {}).get('run_policy') or {}
+        kwargs = {}
+        for field in cls.FIELDS:
+            value = values.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                continue
+            if field == 'timeout' and value == 0:
+                continue
+            kwargs[field] = value
+        return cls(**kwargs)
+
+    @property
+    def max_output_bytes(self):
+        return int(self.max_output_mb * 1024 * 1024)
+
+    #ข้อจำกัดที่ส่งให้ harness ตั้งกับ process ของ script เอง (ดู harness.apply_limits)
+    def limits(self, cgroup=None):
+        return {
+            'memory_bytes': int(self.memory_mb * 1024 * 1024),
+            'cpu_seconds': int(self.cpu_seconds),
+            'cgroup': cgroup,
+        }
+
+    #ข้อความสรุปสำหรับแสดงใน UI
+    def describe(self):
+        parts = [f"เวลา {self.timeout:g} วินาที"]
+        if self.memory_mb:
+            parts.append(f"memory {self.memory_mb:g} MB")
+        if self.cpu_seconds:
+            parts.append(f"CPU {self.cpu_seconds:g} วินาที")
+        if self.max_output_mb:
+            parts.append(f"output {self.max_output_mb:g} MB")
+        return " · ".join(parts)
+
+    def message(self, reason):
+        return STOP_MESSAGES.get(reason, reason).format(
+            timeout=self.timeout, memory_mb=self.memory_mb, cpu_seconds=self.cpu_seconds, max_output_mb=self.max_output_mb
+        )
+
+    #สร้าง cgroup ของการรันครั้งนี้ (คืน None ถ้าไม่ได้ตั้ง RUN_CGROUP_ROOT หรือไม่มีสิทธิ์)
+    def create_cgroup(self):
+        if not self.cgroup_root or not self.memory_mb:
+            return None
+        path = os.path.join(self.cgroup_root, f"run_{uuid.uuid4().hex}")
+        try:
+            os.mkdir(path)
+            with open(os.path.join(path, 'memory.max'), 'w') as f:
+                f.write(str(int(self.memory_mb * 1024 * 1024)))
+            # ไม่ให้หนีไปใช้ swap แทน (ไฟล์นี้ไม่มีถ้าระบบไม่ได้เปิด swap accounting)
+            if os.path.exists(os.path.join(path, 'memory.swap.max')):
+                with open(os.path.join(path, 'memory.swap.max'), 'w') as f:
+                    f.write('0')
+        except OSError:
+            RunPolicy.remove_cgroup(path)
+            return None
+        return path
+
+    #cgroup นี้เคยถูก kill เพราะ memory เกินหรือไม่
+    @staticmethod
+    def cgroup_oom_killed(path):
+        try:
+            with open(os.path.join(path, 'memory.events'), 'r') as f:
+                events = dict(line.split() for line in f if line.strip())
+        except (OSError, ValueError):
+            return False
+        return int(events.get('oom_kill', 0)) > 0
+
+    #ลบ cgroup (ต้องไม่มี process เหลือแล้ว ลองซ้ำสั้นๆ ระหว่างที่ kernel เก็บ process ที่เพิ่งถูก kill)
+    @staticmethod
+    def remove_cgroup(path, attempts=20):
+        for _ in range(attempts):
+            try:
+                os.rmdir(path)
+                return True
+            except FileNotFoundError:
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
+
+class CancelToken:
+    """หยุดการรันหนึ่งครั้ง: จำ process group ที่กำลังรันอยู่ แล้ว kill ทั้งกลุ่มเมื่อถูกยกเลิก/หมดเวลา/เกินข้อจำกัด
+
+    reason = สาเหตุแรกที่ทำให้หยุด ('timeout', 'cancelled', 'output_limit', ...) หรือ None ถ้ายังไม่ถูกหยุด
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._groups = set()
+        self._children = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_set(self):
+        return self.reason is not None
+
+    #ผูก process group ที่เพิ่งเริ่ม (ถ้าถูกยกเลิกไปก่อนแล้วจะ kill ทันที)
+    def attach(self, pgid):
+        with self._lock:
+            if self.reason is None:
+                self._groups.add(pgid)
+                return
+        kill_group(pgid)
+
+    def detach(self, pgid):
+        with self._lock:
+            self._groups.discard(pgid)
+
+    #token ย่อย (เช่นแต่ละขั้นของ pipeline): หยุดเองได้โดยไม่กระทบตัวแม่ แต่ถูกหยุดตามเมื่อตัวแม่ถูกหยุด
+    def child(self):
+        token = CancelToken()
+        with self._lock:
+            if self.reason is None:
+                self._children.append(token)
+                return token
+        token.cancel(self.reason)
+        return token
+
+    #หยุดการรัน คืน True ถ้าเป็นการหยุดครั้งแรก
+    def cancel(self, reason='cancelled'):
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            groups = list(self._groups)
+            children = list(self._children)
+        for pgid in groups:
+            kill_group(pgid)
+        for child in children:
+            child.cancel(reason)
+        return True
+
+
+#kill ทุก process ใน process group (รวม multiprocessing/joblib worker ที่ script สร้าง)
+def kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -0,0 +1,170 @@
+import os
+import time
+import pymongo as pm
+from .blob_store import BlobStore, BlobLease
+from .config import RUN_MAX_CONCURRENT, HEADLESS_MAX_PER_USER, RENDER_PROFILES, DEFAULT_RENDER_PROFILE
+from .gridfs_store import GridFSStore
+from .manifest import OutputManifest
+from .result_cache import ResultCache
+from .run_history import RunHistory
+from .run_policy import RunPolicy
+from .scheduler import RunScheduler
+from .script_cache import ScriptCache
+from .script_runner import ScriptRunner
+from .zip_export import build_zip
+
+
+class ScriptNotFound(LookupError):
+    pass
+
+
+class RunService:
+    """รัน script ที่เก็บใน MongoDB โดยไม่ผ่าน Streamlit (ใช้โดย headless.py ทั้ง CLI และ HTTP API)
+
+    ใช้ ScriptCache / RunScheduler / WorkerPool / ResultCache ชุดเดียวกับหน้าเว็บ แต่ไม่ต้อง rerun หน้า Streamlit
+    ทุกงานส่งผ่าน RunScheduler จึงรันพร้อมกันได้ตามจำนวนช่อง และได้ run_id กลับทันที
+    งานที่จบถูกบันทึกลง RunHistory (ถ้ามี) ดาวน์โหลดผลลัพธ์ซ้ำได้หลังงานหลุดจาก scheduler แล้ว
+    """
+
+    def __init__(self, collection, pool=None, scheduler=None, result_cache=None, metrics_registry=None,
+                 blob_store=None, content_store=None, history=None):
+        self.collection = collection
+        self.pool = pool
+        self.history = history
+        self.scheduler = scheduler or RunScheduler(RUN_MAX_CONCURRENT, HEADLESS_MAX_PER_USER, history=history)
+        self.result_cache = result_cache
+        self.metrics_registry = metrics_registry
+        self.blob_store = blob_store or BlobStore()
+        self.script_cache = ScriptCache(collection, content_store=content_store)
+
+    #เชื่อมต่อ MongoDB จาก environment (MONGO_URL, MONGO_DB_NAME, MONGO_COLLECTION_NAME) เหมือน main.py
+    @classmethod
+    def from_env(cls, **kwargs):
+        mongo_url = os.getenv("MONGO_URL")
+        db_name = os.getenv("MONGO_DB_NAME")
+        collection_name = os.getenv("MONGO_COLLECTION_NAME")
+        if not mongo_url or not db_name or not collection_name:
+            raise ValueError("One or more required environment variables (MONGO_URL, MONGO_DB_NAME, MONGO_COLLECTION_NAME) are not set.")
+        db = pm.MongoClient(mongo_url)[db_name]
+        kwargs.setdefault('result_cache', ResultCache())
+        kwargs.setdefault('history', RunHistory())
+        return cls(db[collection_name], content_store=GridFSStore(db), **kwargs)
+
+    #เก็บไฟล์ input ลง BlobStore (อ่านจาก stream ทีละ chunk)
+    #lease = BlobLease ที่ถือ blob ไว้จนกว่าจะ submit (หลัง submit งานในคิวถือ lease ของตัวเอง)
+    def store_input(self, filename, stream, lease=None):
+        handle = self.blob_store.put_stream(stream, filename)
+        if lease is not None:
+            lease.add([handle])
+        return handle
+
+    #ส่งงานเข้าคิว คืน run_id (ScriptNotFound ถ้าไม่มี script นี้ในฐานข้อมูล)
+    #inputs = {ชื่อไฟล์: BlobHandle} ไม่มี input จะรันแบบ run_script เหมือนหน้าเว็บ
+    def submit(self, script_name, inputs=None, user_id='headless', force_rerun=False, render_profile=None):
+        script_doc = self.script_cache.get_script(script_name)
+        if not script_doc or 'content' not in script_doc:
+            raise ScriptNotFound(f"Script '{script_name}' not found")
+        policy = RunPolicy.from_document(script_doc)
+        if inputs:
+            if render_profile not in RENDER_PROFILES:
+                render_profile = script_doc.get('render_profile', DEFAULT_RENDER_PROFILE)
+            run_id = self.scheduler.submit(
+                user_id, script_name,
+                ScriptRunner.run_script_with_memory_files,
+                script_doc['content'], script_name, dict(inputs),
+                pool=self.pool, result_cache=self.result_cache, force_rerun=force_rerun,
+                render_profile=render_profile, metrics_registry=self.metrics_registry, policy=policy
+            )
+        else:
+            run_id = self.scheduler.submit(
+                user_id, script_name,
+                ScriptRunner.run_script,
+                script_doc['content'], script_name,
+                pool=self.pool, result_cache=self.result_cache, force_rerun=force_rerun,
+                metrics_registry=self.metrics_registry, policy=policy
+            )
+        # ชื่อไฟล์ input ใช้ตัดออกจากผลลัพธ์ (กรณีผลลัพธ์ไม่มี manifest)
+        self.scheduler.get(run_id).run_info['input_names'] = sorted(inputs or ())
+        return run_id
+
+    def job(self, run_id):
+        return self.scheduler.get(run_id)
+
+    #รอจนงานจบ คืน RunJob (None ถ้าไม่พบ หรือยังไม่จบเมื่อครบ timeout)
+    def wait(self, run_id, timeout=None):
+        job = self.scheduler.get(run_id)
+        if job is None or not job.done.wait(timeout):
+            return None
+        return job
+
+    def cancel(self, run_id):
+        return self.scheduler.cancel(run_id)
+
+    def discard(self, run_id):
+        return self.scheduler.discard(run_id)
+
+    #ไฟล์ผลลัพธ์ของงานที่จบแล้ว (รายการจาก manifest: path เทียบกับ workspace, size, type, site)
+    def outputs(self, run_id):
+        job = self.scheduler.get(run_id)
+        if job is None or not job.is_finished or not job.temp_dir:
+            return []
+        return OutputManifest.outputs(job.temp_dir, job.run_info.get('input_names', ()))
+
+    #path จริงของไฟล์ผลลัพธ์ (None ถ้าไม่ใช่ไฟล์ผลลัพธ์ของงานนี้)
+    def artifact_path(self, run_id, relative_path):
+        if relative_path not in {entry['path'] for entry in self.outputs(run_id)}:
+            return None
+        return os.path.join(self.job(run_id).temp_dir, relative_path)
+
+    #ZIP ของไฟล์ผลลัพธ์ทั้งหมด (spooled temp file ที่ seek ไปต้นไฟล์แล้ว)
+    def artifacts_zip(self, run_id):
+        job = self.scheduler.get(run_id)
+        paths = [os.path.join(job.temp_dir, entry['path']) for entry in self.outputs(run_id)]
+        return build_zip(paths, job.temp_dir)
+
+    #สถานะของงานเป็น dict (ใช้ตอบ API)
+    def describe(self, run_id):
+        job = self.scheduler.get(run_id)
+        if job is None:
+            return None
+        info = {
+            'run_id': job.run_id,
+            'script': job.label,
+            'status': job.status,
+            'submitted_at': job.submitted_at,
+            'wait_seconds': round(job.wait_seconds, 3),
+            'run_seconds': round(job.run_seconds, 3),
+            'queue_position': self.scheduler.queue_position(run_id),
+            'stdout_bytes': job.output.stdout.byte_count,
+            'stderr_bytes': job.output.stderr.byte_count,
+        }
+        if job.is_finished:
+            info.update(
+                returncode=job.result[2] if job.result else None,
+                error=job.error,
+                stopped=job.run_info.get('stopped'),
+                cache=job.run_info.get('cache'),
+                mode=job.run_info.get('mode'),
+                finished_at=job.finished_at,
+                outputs=[
+                    {key: entry.get(key) for key in ('path', 'size', 'type', 'site')}
+                    for entry in self.outputs(run_id)
+                ],
+            )
+        return info
+
+    #อ่าน log ของงานต่อเนื่องตั้งแต่ offset จนงานจบ (yield เป็น bytes ทีละ chunk)
+    def follow_log(self, run_id, stream='stdout', offset=0, poll_interval=0.1, chunk_size=64 * 1024):
+        job = self.scheduler.get(run_id)
+        capture = job.output.stdout if stream == 'stdout' else job.output.stderr
+        with open(capture.spill_path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                finished = job.output.finished.is_set()
+                data = f.read(chunk_size)
+                if data:
+                    yield data
+                    continue
+                if finished:
+                    return
+                time.sleep(poll_interval)
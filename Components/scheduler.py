@@ -0,0 +1,252 @@
+import time
+import uuid
+import shutil
+import threading
+from functools import partial
+from collections import OrderedDict, deque
+from .blob_store import BlobLease
+from .config import RUN_MAX_CONCURRENT, RUN_MAX_PER_USER, RUN_JOB_RETENTION_SECONDS
+from .output_stream import RunOutput
+from .run_policy import CancelToken
+
+
+class RunJob:
+    """ข้อมูลของการรันหนึ่งครั้งที่ส่งเข้าคิว"""
+
+    def __init__(self, user_id, label, func, args, kwargs, queue_depth, history_user=None):
+        self.run_id = uuid.uuid4().hex
+        self.user_id = user_id
+        # เจ้าของงานในประวัติการรัน (หน้าเว็บใช้ id จาก cookie ส่วนคิวและโควต้าใช้ user_id ของ session)
+        self.history_user = history_user or user_id
+        self.label = label
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # blob ของ input ต้องอยู่จนงานจบ แม้ผู้ใช้ลบไฟล์ออกจาก Memory ระหว่างรอคิว
+        self.lease = BlobLease(BlobLease.handles_in(args, kwargs))
+        self.status = 'queued'
+        # ช่องรันที่ยืมเพิ่มจาก scheduler ระหว่างรัน (batch / pipeline ที่รันงานย่อยพร้อมกัน)
+        self.extra_slots = 0
+        self.queue_depth = queue_depth
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.output = RunOutput()
+        # ScriptRunner ผูก process group ที่กำลังรันไว้กับ token นี้ (ใช้ยกเลิกงาน)
+        self.cancel_token = CancelToken()
+        self.run_info = {'cancel_token': self.cancel_token}
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def is_finished(self):
+        return self.done.is_set()
+
+    @property
+    def wait_seconds(self):
+        end = self.started_at or time.time()
+        return end - self.submitted_at
+
+    @property
+    def run_seconds(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.time()
+        return end - self.started_at
+
+    #temp directory ของผลลัพธ์ (ค่าที่ 4 ของ tuple ที่ ScriptRunner คืนมา)
+    @property
+    def temp_dir(self):
+        if self.result and len(self.result) >= 4:
+            return self.result[3]
+        return None
+
+
+class RunScheduler:
+    """คิวรัน script แบบไม่ block: ส่งงานแล้วได้ run_id กลับทันที
+
+    จำกัดจำนวนงานที่รันพร้อมกันทั้งระบบและต่อผู้ใช้ และสลับคิวระหว่างผู้ใช้แบบ round-robin
+    งานที่รันงานย่อยพร้อมกันเอง (batch / pipeline) ยืมช่องว่างเพิ่มได้ผ่าน borrow_slots โดยนับรวมในขีดจำกัดเดียวกัน
+    ไม่มีการเปลี่ยน working directory ของ server (แต่ละงานใช้ cwd ของ process ลูกเอง)
+    history = RunHistory ที่บันทึกทุกงานที่จบ (ไฟล์ผลลัพธ์อยู่ต่อหลังงานถูกลบออกจาก scheduler)
+    """
+
+    def __init__(self, max_concurrent=RUN_MAX_CONCURRENT, max_per_user=RUN_MAX_PER_USER,
+                 retention_seconds=RUN_JOB_RETENTION_SECONDS, history=None):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.retention_seconds = retention_seconds
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queues = OrderedDict()
+        self._running = {}
+
+    #ส่งงานเข้าคิว func จะถูกเรียกด้วย output=RunOutput และ run_info=dict เพิ่มเติม
+    #history_user = ผู้ใช้ที่บันทึกในประวัติการรัน (ค่าเริ่มต้น = user_id)
+    def submit(self, user_id, label, func, *args, history_user=None, **kwargs):
+        with self._lock:
+            self._expire_finished()
+            job = RunJob(user_id, label, func, args, kwargs, self._queued_count(), history_user)
+            job.run_info['borrow_slots'] = partial(self.borrow_slots, job.run_id)
+            self._jobs[job.run_id] = job
+            self._queues.setdefault(user_id, deque()).append(job)
+            self._dispatch()
+        # ลบ log เก่าครั้งเดียวต่องานที่ส่งเข้าคิว (ไม่ใช่ทุก RunOutput ที่ batch / pipeline สร้างต่อ item / ขั้น)
+        RunOutput.cleanup_old_logs()
+        return job.run_id
+
+    def get(self, run_id):
+        with self._lock:
+            return self._jobs.get(run_id)
+
+    def _queued_count(self):
+        return sum(len(q) for q in self._queues.values())
+
+    #จำนวนช่องรันที่ใช้อยู่ (งานละ 1 ช่อง + ช่องที่ยืมเพิ่ม) ทั้งระบบ หรือของผู้ใช้คนเดียว
+    def _slots_in_use(self, user_id=None):
+        return sum(
+            1 + job.extra_slots for job in self._running.values()
+            if user_id is None or job.user_id == user_id
+        )
+
+    #ยืมช่องรันเพิ่มให้งานที่กำลังรันและแตกงานย่อยพร้อมกันเอง (เช่น item ของ batch) คืนจำนวนที่ได้ (อาจเป็น 0)
+    #ได้เฉพาะช่องที่ว่างอยู่ภายใต้ max_concurrent และ max_per_user ช่องที่ยืมคืนอัตโนมัติเมื่องานจบหรือถูกยกเลิก
+    #งานเรียกผ่าน run_info['borrow_slots'](จำนวน)
+    def borrow_slots(self, run_id, wanted):
+        with self._lock:
+            job = self._running.get(run_id)
+            if job is None or wanted <= 0:
+                return 0
+            granted = max(0, min(
+                wanted,
+                self.max_concurrent - self._slots_in_use(),
+                self.max_per_user - self._slots_in_use(job.user_id),
+            ))
+            job.extra_slots += granted
+            return granted
+
+    #ตำแหน่งในคิว (0 = กำลังจะได้รันเป็นงานถัดไป) หรือ None ถ้าไม่ได้อยู่ในคิวแล้ว
+    def queue_position(self, run_id):
+        with self._lock:
+            position = 0
+            for user_queue in self._queues.values():
+                for job in user_queue:
+                    if job.run_id == run_id:
+                        return position
+                    position += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queued_count(),
+                'running': len(self._running),
+                'borrowed': sum(job.extra_slots for job in self._running.values()),
+                'slots': self.max_concurrent,
+                'users_waiting': len(self._queues),
+            }
+
+    #เลือกงานถัดไปแบบ round-robin ระหว่างผู้ใช้ที่ยังไม่เกินโควต้า
+    def _dispatch(self):
+        while self._slots_in_use() < self.max_concurrent and self._queues:
+            picked = None
+            for user_id in list(self._queues):
+                if self._slots_in_use(user_id) < self.max_per_user:
+                    picked = user_id
+                    break
+            if picked is None:
+                return
+
+            user_queue = self._queues.pop(picked)
+            job = user_queue.popleft()
+            if user_queue:
+                # ย้ายผู้ใช้คนนี้ไปท้ายคิว ให้คนอื่นได้รันก่อน
+                self._queues[picked] = user_queue
+
+            job.status = 'running'
+            job.started_at = time.time()
+            self._running[job.run_id] = job
+            threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+
+    def _run_job(self, job):
+        try:
+            job.result = job.func(*job.args, output=job.output, run_info=job.run_info, **job.kwargs)
+            if job.status != 'cancelled':
+                job.status = 'finished'
+        except Exception as e:
+            job.error = str(e)
+            if job.status != 'cancelled':
+                job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            job.output.close()
+            job.func = job.args = job.kwargs = None
+            job.lease.release()
+            self._record(job)
+            with self._lock:
+                self._running.pop(job.run_id, None)
+                job.done.set()
+                self._dispatch()
+
+    #ยกเลิกงาน: งานที่รอคิวถูกนำออกจากคิว งานที่กำลังรันถูก kill ทั้ง process group
+    #และคืนช่องรันให้งานถัดไปทันทีโดยไม่ต้องรอ thread ของงานเดิมจบ
+    def cancel(self, run_id):
+        with self._lock:
+            job = self._jobs.get(run_id)
+            if job is None or job.is_finished or job.status == 'cancelled':
+                return False
+
+            queued = job.status == 'queued'
+            if queued:
+                user_queue = self._queues.get(job.user_id)
+                if user_queue is not None and job in user_queue:
+                    user_queue.remove(job)
+                    if not user_queue:
+                        del self._queues[job.user_id]
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                job.output.close()
+                job.func = job.args = job.kwargs = None
+                job.lease.release()
+                job.done.set()
+            else:
+                job.status = 'cancelled'
+                self._running.pop(run_id, None)
+                self._dispatch()
+        if queued:
+            # งานที่กำลังรันบันทึกประวัติเมื่อ thread ของงานจบ ส่วนงานที่ยังไม่ได้รันบันทึกตอนนี้
+            self._record(job)
+        else:
+            job.cancel_token.cancel('cancelled')
+        return True
+
+    #บันทึกงานที่จบลงประวัติ (ข้อผิดพลาดของประวัติไม่ทำให้งานล้มเหลว)
+    def _record(self, job):
+        if self.history is None:
+            return
+        try:
+            self.history.record(job)
+        except Exception as e:
+            job.run_info['history_error'] = str(e)
+
+    #ลบงานที่จบนานเกินกำหนด พร้อม temp directory ของงานนั้น
+    def _expire_finished(self):
+        now = time.time()
+        for run_id, job in list(self._jobs.items()):
+            if job.is_finished and now - job.finished_at > self.retention_seconds:
+                del self._jobs[run_id]
+                if job.temp_dir:
+                    shutil.rmtree(job.temp_dir, ignore_errors=True)
+
+    #ลบงาน (และ temp directory) ทันทีเมื่อผู้ใช้ไม่ต้องการผลลัพธ์แล้ว
+    def discard(self, run_id):
+        with self._lock:
+            job = self._jobs.get(run_id)
+            if job is None or not job.is_finished:
+                return False
+            del self._jobs[run_id]
+        if job.temp_dir:
+            shutil.rmtree(job.temp_dir, ignore_errors=True)
+        return True
@@ -0,0 +1,199 @@
+import os
+import marshal
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from .config import SCRIPT_CACHE_DIR, SCRIPT_CACHE_POLL_INTERVAL
+
+# field ที่ใช้แสดงรายการ script (ไม่ดึง content ทั้งก้อน)
+LISTING_FIELDS = {"filename": 1, "uploaded_at": 1, "size": 1, "file_type": 1, "content_hash": 1}
+
+
+class ScriptCache:
+    """cache ของ script จาก MongoDB ใน memory + bytecode ที่ compile แล้วบน disk
+
+    แต่ละ script ถูกดึงจากฐานข้อมูลครั้งเดียวต่อเวอร์ชัน (content_hash หรือ uploaded_at)
+    การกดปุ่ม/เปลี่ยน widget ใน Streamlit จึงไม่ต้อง query ฐานข้อมูลซ้ำ
+    เมื่อ mongodb.py อัปเดตเอกสาร cache จะรู้ผ่าน change stream หรือการ poll เป็นระยะ (ถ้า server ไม่รองรับ)
+    script ขนาดใหญ่ที่เก็บ content ไว้ใน GridFS จะถูกอ่านผ่าน content_store (GridFSStore)
+    """
+
+    def __init__(self, collection, poll_interval=SCRIPT_CACHE_POLL_INTERVAL, content_store=None):
+        self.collection = collection
+        self.content_store = content_store
+        self.poll_interval = poll_interval
+        self.watch_mode = None
+        self._lock = threading.Lock()
+        self._listing = None
+        self._entries = {}
+        self._filenames_by_id = {}
+        self._stop_event = threading.Event()
+        self.stats = {'db_fetches': 0, 'hits': 0, 'invalidations': 0}
+
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    #เวอร์ชันของเอกสาร ใช้ตัดสินว่า content ใน cache ยังใช้ได้หรือไม่
+    @staticmethod
+    def document_version(doc):
+        if doc.get('content_hash'):
+            return doc['content_hash']
+        uploaded_at = doc.get('uploaded_at')
+        if uploaded_at is not None:
+            return f"{uploaded_at.isoformat() if hasattr(uploaded_at, 'isoformat') else uploaded_at}:{doc.get('size')}"
+        if 'content' in doc:
+            return hashlib.sha256(doc['content'].encode('utf-8')).hexdigest()
+        return None
+
+    #รายการ script ทั้งหมด (โหลดจากฐานข้อมูลครั้งแรกครั้งเดียว หลังจากนั้นอัปเดตผ่าน watcher)
+    def list_scripts(self):
+        with self._lock:
+            listing = self._listing
+        if listing is None:
+            listing = self._load_listing()
+        return list(listing.values())
+
+    def _load_listing(self):
+        docs = list(self.collection.find({}, LISTING_FIELDS))
+        listing = {doc['filename']: doc for doc in docs if 'filename' in doc}
+        with self._lock:
+            self._listing = listing
+            self._filenames_by_id = {doc['_id']: doc['filename'] for doc in docs if 'filename' in doc}
+            # เอกสารที่เวอร์ชันเปลี่ยนหรือถูกลบไปแล้ว ต้องดึง content ใหม่
+            for filename in list(self._entries):
+                doc = listing.get(filename)
+                if doc is None or self.document_version(doc) != self._entries[filename]['version']:
+                    del self._entries[filename]
+                    self.stats['invalidations'] += 1
+        return listing
+
+    #เอกสาร script พร้อม content (ดึงจากฐานข้อมูลเฉพาะครั้งแรกหรือเมื่อเวอร์ชันเปลี่ยน)
+    def get_script(self, filename):
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None:
+                self.stats['hits'] += 1
+                return entry['doc']
+
+        doc = self.collection.find_one({"filename": filename})
+        if doc is not None and self.content_store is not None:
+            self.content_store.load_content(doc)
+        with self._lock:
+            self.stats['db_fetches'] += 1
+            if doc is None:
+                return None
+            self._entries[filename] = {'doc': doc, 'version': self.document_version(doc)}
+            self._filenames_by_id[doc['_id']] = filename
+        if 'content' in doc:
+            # compile ไว้ล่วงหน้า ตอนกดรันจะได้ใช้ bytecode ทันที
+            ScriptCache.compile_source(doc['content'])
+        return doc
+
+    #ล้าง cache ทั้งหมด (ปุ่ม Refresh)
+    def refresh(self):
+        with self._lock:
+            self._entries.clear()
+            loaded = self._listing is not None
+        if loaded:
+            self._load_listing()
+
+    def _invalidate(self, filename):
+        with self._lock:
+            if self._entries.pop(filename, None) is not None:
+                self.stats['invalidations'] += 1
+
+    #ติดตามการเปลี่ยนแปลงของ collection: ใช้ change stream ถ้าได้ ไม่งั้น poll
+    def _watch(self):
+        try:
+            self._watch_change_stream()
+        except Exception:
+            # standalone mongod / mongomock ไม่รองรับ change stream
+            self.watch_mode = 'poll'
+            self._watch_polling()
+
+    def _watch_change_stream(self):
+        with self.collection.watch(full_document='updateLookup') as stream:
+            self.watch_mode = 'change_stream'
+            for change in stream:
+                if self._stop_event.is_set():
+                    return
+                doc = change.get('fullDocument') or {}
+                doc_id = change.get('documentKey', {}).get('_id')
+                with self._lock:
+                    filename = doc.get('filename') or self._filenames_by_id.get(doc_id)
+                if filename:
+                    self._invalidate(filename)
+                self._reload_listing()
+
+    def _watch_polling(self):
+        while not self._stop_event.wait(self.poll_interval):
+            with self._lock:
+                loaded = self._listing is not None
+            if loaded:
+                self._reload_listing()
+            else:
+                self._check_entries()
+
+    #ตรวจเวอร์ชันเฉพาะ script ที่อยู่ใน cache (ไม่ต้องโหลดรายการทั้ง collection)
+    def _check_entries(self):
+        with self._lock:
+            filenames = list(self._entries)
+        if not filenames:
+            return
+        try:
+            docs = {doc['filename']: doc for doc in self.collection.find({"filename": {"$in": filenames}}, LISTING_FIELDS)}
+        except Exception:
+            return
+        for filename in filenames:
+            doc = docs.get(filename)
+            with self._lock:
+                entry = self._entries.get(filename)
+            if entry is not None and (doc is None or self.document_version(doc) != entry['version']):
+                self._invalidate(filename)
+
+    #โหลดรายการใหม่เฉพาะเมื่อเคยมีผู้เรียก list_scripts (รายการหลักอยู่ที่ ScriptCatalog)
+    def _reload_listing(self):
+        with self._lock:
+            if self._listing is None:
+                return
+        try:
+            self._load_listing()
+        except Exception:
+            pass
+
+    def stop(self):
+        self._stop_event.set()
+
+    #compile script เป็น bytecode แล้วเก็บไว้บน disk (key = SHA-256 ของ source)
+    #คืน (path ของ source, path ของ bytecode) ที่ harness ใช้รันได้โดยไม่ต้อง compile ใหม่
+    @staticmethod
+    def compile_source(source, cache_dir=SCRIPT_CACHE_DIR):
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        entry_dir = os.path.join(cache_dir, digest[:2])
+        source_path = os.path.join(entry_dir, digest + '.py')
+        code_path = source_path + 'c'
+        if os.path.exists(code_path) and os.path.exists(source_path):
+            return source_path, code_path
+
+        os.makedirs(entry_dir, exist_ok=True)
+        if not os.path.exists(source_path):
+            _write_atomic(source_path, source.encode('utf-8'))
+        try:
+            code = compile(source, source_path, 'exec', dont_inherit=True)
+        except SyntaxError:
+            # ให้ harness compile เองตอนรันเพื่อแสดง SyntaxError ให้ผู้ใช้เห็นตามปกติ
+            return source_path, None
+        _write_atomic(code_path, importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+        return source_path, code_path
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -0,0 +1,175 @@
+import re
+import time
+import threading
+from pymongo.errors import PyMongoError, OperationFailure
+from .config import CATALOG_PAGE_SIZE, CATALOG_CACHE_SECONDS
+
+# field ที่ใช้แสดงในรายการ script (ไม่ดึง content)
+CATALOG_FIELDS = {"filename": 1, "uploaded_at": 1, "size": 1, "file_type": 1, "content_hash": 1, "tags": 1, "description": 1}
+TEXT_INDEX_NAME = "catalog_text"
+
+# ลำดับการเรียงที่รองรับ (ทุกแบบปิดท้ายด้วย filename เพื่อให้ลำดับแน่นอนสำหรับ cursor)
+SORT_ORDERS = {
+    'filename': [("filename", 1)],
+    'uploaded_at': [("uploaded_at", -1), ("filename", 1)],
+}
+
+
+class ScriptCatalog:
+    """ค้นหาและแบ่งหน้ารายการ script ฝั่งฐานข้อมูล (รองรับ collection ที่มี script หลายพันไฟล์)
+
+    - index บน filename, tags, uploaded_at และ text index (filename/description/tags)
+    - ค้นหาแบบขึ้นต้นด้วย (prefix ของ filename ใช้ index ได้) หรือแบบข้อความ ($text)
+    - แบ่งหน้าด้วย cursor (ค่าของแถวสุดท้าย) แทน skip ทำให้หน้าหลังๆ เร็วเท่าหน้าแรก
+    ผลการค้นหาแต่ละหน้าและจำนวนถูก cache ไว้ช่วงสั้นๆ ใช้ร่วมกันทุก session
+    """
+
+    def __init__(self, collection, page_size=CATALOG_PAGE_SIZE, cache_seconds=CATALOG_CACHE_SECONDS):
+        self.collection = collection
+        self.page_size = page_size
+        self.cache_seconds = cache_seconds
+        self.text_search_available = False
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.ensure_indexes()
+
+    #สร้าง index ที่ใช้ค้นหา (ข้าม index ที่มีอยู่แล้ว เช่น unique index ของ filename จาก mongodb.py)
+    def ensure_indexes(self):
+        try:
+            existing = self.collection.index_information()
+        except PyMongoError:
+            return
+        existing_keys = [list(info.get('key', [])) for info in existing.values()]
+        for keys in ([("filename", 1)], [("tags", 1), ("filename", 1)], [("uploaded_at", -1), ("filename", 1)]):
+            if keys in existing_keys:
+                continue
+            try:
+                self.collection.create_index(keys)
+            except PyMongoError:
+                # ไม่มีสิทธิ์สร้าง index ก็ยังค้นหาได้ แค่ช้าลง
+                pass
+
+        self.text_search_available = any(
+            any(direction == 'text' for _, direction in keys) for keys in existing_keys
+        )
+        if not self.text_search_available:
+            try:
+                self.collection.create_index(
+                    [("filename", "text"), ("description", "text"), ("tags", "text")],
+                    name=TEXT_INDEX_NAME
+                )
+                self.text_search_available = True
+            except (PyMongoError, NotImplementedError):
+                pass
+
+    @staticmethod
+    def build_query(search="", mode='prefix', tag=None):
+        query = {}
+        search = search.strip()
+        if search and mode == 'text':
+            query["$text"] = {"$search": search}
+        elif search:
+            # prefix ที่ขึ้นต้นด้วย ^ และไม่มี flag ใช้ index ของ filename ได้
+            query["filename"] = {"$regex": "^" + re.escape(search)}
+        if tag:
+            query["tags"] = tag
+        return query
+
+    #หน้าถัดไปของผลการค้นหา คืน (รายการเอกสาร, cursor ของหน้าถัดไป หรือ None ถ้าหมดแล้ว)
+    def search(self, search="", mode='prefix', tag=None, sort='filename', after=None, limit=None):
+        limit = limit or self.page_size
+        key = ('search', search.strip(), mode, tag, sort, after, limit)
+        return self._cached(key, lambda: self._search(search, mode, tag, sort, after, limit))
+
+    def _search(self, search, mode, tag, sort, after, limit):
+        def run(query):
+            if after is not None:
+                query = {"$and": [query, self._after_query(sort, after)]} if query else self._after_query(sort, after)
+            # ขอเกิน 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+            return list(self.collection.find(query, CATALOG_FIELDS).sort(SORT_ORDERS[sort]).limit(limit + 1))
+
+        docs = self._execute(run, self.build_query(search, mode, tag))
+        next_cursor = self._cursor_of(sort, docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+
+    #จำนวน script ที่ตรงเงื่อนไข (ไม่มีเงื่อนไขใช้ค่าประมาณจาก metadata ของ collection)
+    def count(self, search="", mode='prefix', tag=None):
+        key = ('count', search.strip(), mode, tag)
+
+        def run(query):
+            if not query:
+                return self.collection.estimated_document_count()
+            return self.collection.count_documents(query)
+        return self._cached(key, lambda: self._execute(run, self.build_query(search, mode, tag)))
+
+    #เอกสาร (ไม่มี content) ของ script ชื่อนี้ ใช้ index ของ filename
+    def get(self, filename):
+        return self._cached(('get', filename), lambda: self.collection.find_one({"filename": filename}, CATALOG_FIELDS))
+
+    #tag ทั้งหมดที่ใช้อยู่
+    def tags(self):
+        return self._cached(('tags',), lambda: sorted(t for t in self.collection.distinct("tags") if t))
+
+    #ล้าง cache (ปุ่ม Refresh)
+    def refresh(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and now - entry[0] < self.cache_seconds:
+                return entry[1]
+        value = load()
+        with self._lock:
+            # ตัดรายการที่หมดอายุทิ้งเป็นครั้งคราวไม่ให้ cache โตไม่จำกัด
+            if len(self._cache) > 1000:
+                self._cache = {k: v for k, v in self._cache.items() if now - v[0] < self.cache_seconds}
+            self._cache[key] = (now, value)
+        return value
+
+    def _execute(self, run, query):
+        try:
+            return run(self._text_fallback(query))
+        except (OperationFailure, NotImplementedError):
+            if "$text" not in query or not self.text_search_available:
+                raise
+            # text index ถูกลบไปหรือ server ไม่รองรับ $text
+            self.text_search_available = False
+            return run(self._text_fallback(query))
+
+    #server ที่ไม่มี text index (หรือ mongomock) ค้นหาด้วย regex แบบไม่สนตัวพิมพ์แทน
+    def _text_fallback(self, query):
+        if "$text" not in query or self.text_search_available:
+            return query
+        query = dict(query)
+        words = query.pop("$text")["$search"].split()
+        pattern = "|".join(re.escape(word) for word in words)
+        query["$or"] = [
+            {"filename": {"$regex": pattern, "$options": "i"}},
+            {"description": {"$regex": pattern, "$options": "i"}},
+            {"tags": {"$regex": pattern, "$options": "i"}},
+        ]
+        return query
+
+    @staticmethod
+    def _cursor_of(sort, doc):
+        if sort == 'uploaded_at':
+            return (doc.get('uploaded_at'), doc['filename'])
+        return doc['filename']
+
+    #เงื่อนไขของแถวที่อยู่หลัง cursor ตามลำดับการเรียง
+    @staticmethod
+    def _after_query(sort, after):
+        if sort == 'uploaded_at':
+            uploaded_at, filename = after
+            if uploaded_at is None:
+                # เอกสารที่ไม่มี uploaded_at อยู่ท้ายสุดของการเรียงจากใหม่ไปเก่า
+                return {"uploaded_at": None, "filename": {"$gt": filename}}
+            return {"$or": [
+                {"uploaded_at": {"$lt": uploaded_at}},
+                {"uploaded_at": uploaded_at, "filename": {"$gt": filename}},
+                {"uploaded_at": None},
+            ]}
+        return {"filename": {"$gt": after}}
@@ -2,194 +2,442 @@ import tempfile
 import subprocess
 import sys
 import os
+import json
+import time
 import base64
 import shutil
+import signal
+import threading
+from .blob_store import BlobStore, BlobHandle
+from .file_links import link_or_copy
+from .harness import MANIFEST_DIR
+from .manifest import OutputManifest
+from .output_stream import RunOutput, pump_pipe, follow_file
+from .result_cache import ResultCache
+from .run_history import RunHistory
+from .script_cache import ScriptCache
+from .metrics import RunMetrics
+from .run_policy import RunPolicy, CancelToken, kill_group
+from .config import RENDER_PROFILES, DEFAULT_RENDER_PROFILE
+
+HARNESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'harness.py')
 
 class ScriptRunner:
     
     #รัน script พร้อมไฟล์แบบ in-memory โดยไม่รบกวนพื้นที่เครื่อง
+    #ไม่เปลี่ยน working directory ของ server (process ลูกรันใน temp directory เอง) จึงรันพร้อมกันหลายงานได้
+    #metrics_registry = MetricsRegistry ที่รวมเวลา/ทรัพยากรของทุกการรัน (run_info['metrics'] เก็บของการรันนี้)
+    #policy = RunPolicy ของ script (เวลา/memory/CPU/output) ยกเลิกระหว่างรันได้ผ่าน run_info['cancel_token']
     @staticmethod
-    def run_script_with_memory_files(script_content, filename, files_dict):
-        temp_dir = None
-        original_cwd = os.getcwd()
-        try:
-            # สร้าง temp directory แยกต่างหาก
-            temp_dir = tempfile.mkdtemp(prefix="script_runner_")
-            
-            # เปลี่ยน working directory ไป temp
-            os.chdir(temp_dir)
-            
-            # สร้าง modified script ที่มีการสร้างไฟล์ชั่วคราว
-            modified_script = ScriptRunner._create_modified_script_with_temp_dir(
-                script_content, files_dict, temp_dir
-            )
+    def run_script_with_memory_files(script_content, filename, files_dict, pool=None, run_info=None, output=None,
+                                     result_cache=None, force_rerun=False, render_profile=None, metrics_registry=None,
+                                     policy=None):
+        if run_info is None:
+            run_info = {}
+        if output is None:
+            output = RunOutput()
+        if policy is None:
+            policy = RunPolicy()
+        metrics = run_info.setdefault('metrics', RunMetrics())
+        run_info['script_hash'] = RunHistory.script_hash(script_content)
+        run_info['inputs'] = RunHistory.describe_inputs(files_dict)
+        
+        render_profile = render_profile if render_profile in RENDER_PROFILES else DEFAULT_RENDER_PROFILE
+        run_info['render_profile'] = render_profile
+        cache_key = ResultCache.make_key(
+            script_content, files_dict, extra={'render': render_profile}
+        ) if result_cache is not None else None
+        result = ScriptRunner._lookup_cache(result_cache, cache_key, force_rerun, run_info, output)
+        
+        if result is None:
+            temp_dir = None
+            try:
+                with metrics.phase('stage'):
+                    # สร้าง temp directory แยกต่างหาก
+                    temp_dir = tempfile.mkdtemp(prefix="script_runner_")
+                    
+                    # สร้าง modified script ที่มีการสร้างไฟล์ชั่วคราว
+                    modified_script = ScriptRunner._create_modified_script_with_temp_dir(
+                        script_content, files_dict, temp_dir
+                    )
+                
+                stdout, stderr, returncode = ScriptRunner._execute(
+                    modified_script, temp_dir, pool, run_info, output, use_harness=True,
+                    render=RENDER_PROFILES[render_profile], policy=policy
+                )
+                
+                result = (stdout, stderr, returncode, temp_dir)
+                ScriptRunner._store_cache(result_cache, cache_key, result, files_dict, output)
+                
+            except subprocess.TimeoutExpired:
+                run_info['timed_out'] = True
+                run_info['stopped'] = 'timeout'
+                result = ("", policy.message('timeout'), 1, temp_dir)
+            except Exception as e:
+                result = ("", f"Error running script: {str(e)}", 1, temp_dir)
+        
+        if metrics_registry is not None:
+            metrics_registry.observe_run(filename, run_info, result[2])
+        return result
+
+    #รัน script แบบไม่มีไฟล์เพิ่มเติม
+    @staticmethod
+    def run_script(script_content, filename, pool=None, run_info=None, output=None,
+                   result_cache=None, force_rerun=False, metrics_registry=None, policy=None):
+        if run_info is None:
+            run_info = {}
+        if output is None:
+            output = RunOutput()
+        if policy is None:
+            policy = RunPolicy()
+        metrics = run_info.setdefault('metrics', RunMetrics())
+        run_info['script_hash'] = RunHistory.script_hash(script_content)
+        
+        cache_key = ResultCache.make_key(script_content, extra={'plain': True}) if result_cache is not None else None
+        result = ScriptRunner._lookup_cache(result_cache, cache_key, force_rerun, run_info, output)
+        
+        if result is None:
+            temp_dir = None
+            try:
+                with metrics.phase('stage'):
+                    temp_dir = tempfile.mkdtemp(prefix="script_runner_")
+                
+                stdout, stderr, returncode = ScriptRunner._execute(
+                    script_content, temp_dir, pool, run_info, output, policy=policy
+                )
+                
+                result = (stdout, stderr, returncode, temp_dir)
+                ScriptRunner._store_cache(result_cache, cache_key, result, {}, output)
+            except subprocess.TimeoutExpired:
+                run_info['timed_out'] = True
+                run_info['stopped'] = 'timeout'
+                result = ("", policy.message('timeout'), 1, temp_dir)
+            except Exception as e:
+                result = ("", f"Error running script: {str(e)}", 1, temp_dir)
+        
+        if metrics_registry is not None:
+            metrics_registry.observe_run(filename, run_info, result[2])
+        return result
+
+    #ค้นผลลัพธ์เดิมใน cache (ข้ามได้ด้วย force_rerun)
+    @staticmethod
+    def _lookup_cache(result_cache, cache_key, force_rerun, run_info, output):
+        if result_cache is None:
+            return None
+        if force_rerun:
+            run_info['cache'] = 'bypass'
+            return None
+        cached = result_cache.get(cache_key, output)
+        run_info['cache'] = 'hit' if cached is not None else 'miss'
+        if cached is not None:
+            run_info['mode'] = 'cache'
+            output.close()
+        return cached
+
+    #เก็บผลลัพธ์ที่รันสำเร็จลง cache
+    @staticmethod
+    def _store_cache(result_cache, cache_key, result, files_dict, output):
+        stdout, stderr, returncode, temp_dir = result
+        if result_cache is None or returncode != 0:
+            return
+        result_cache.put(cache_key, stdout, stderr, returncode, temp_dir, files_dict.keys(), output)
+
+    #รัน script ผ่าน worker pool ถ้ามี worker ว่าง ไม่งั้น cold start ด้วย sys.executable ใหม่
+    #output ถูกส่งต่อเข้า RunOutput ทีละส่วนระหว่างรัน (UI อ่านไปแสดงได้ทันที)
+    #script รันใน process group ของตัวเอง หมดเวลา/ยกเลิก/output เกินจะ kill ทั้งกลุ่ม (รวม process ที่ script สร้าง)
+    @staticmethod
+    def _execute(script_source, temp_dir, pool=None, run_info=None, output=None, use_harness=False, render=None,
+                 policy=None, manifest_dir=None):
+        if run_info is None:
+            run_info = {}
+        if output is None:
+            output = RunOutput()
+        if policy is None:
+            policy = RunPolicy()
+        run_info['log_dir'] = output.log_dir
+        metrics = run_info.setdefault('metrics', RunMetrics())
+        token = run_info.setdefault('cancel_token', CancelToken())
+        
+        with metrics.phase('stage'):
+            # ไฟล์ที่อยู่ใน workspace ก่อนรัน (ไฟล์ input) ใช้แยกขนาดไฟล์ที่ script เขียนเอง
+            before = ScriptRunner._workspace_snapshot(temp_dir)
             
             with tempfile.NamedTemporaryFile(
                 mode='w', suffix='.py', delete=False, 
                 encoding='utf-8', dir=temp_dir
             ) as f:
-                f.write(modified_script)
+                f.write(script_source)
                 temp_file_path = f.name
             
-            result = subprocess.run(
-                [sys.executable, temp_file_path],
-                capture_output=True, 
-                text=True, 
-                timeout=60,
-                cwd=temp_dir  # รันใน temp directory
-            )
-            
-            # คืน working directory กลับ
-            os.chdir(original_cwd)
-            
+            # bytecode ที่ compile ไว้แล้ว (script เดิมไม่ต้อง compile ใหม่ทุกครั้งที่รัน)
+            try:
+                _, code_path = ScriptCache.compile_source(script_source)
+            except OSError:
+                code_path = None
+        
+        # harness เขียนเวลาของแต่ละจุดลงไฟล์นี้ (อยู่นอก workspace ไม่ปนกับไฟล์ผลลัพธ์)
+        timings_fd, timings_path = tempfile.mkstemp(prefix="script_timings_", suffix=".json")
+        os.close(timings_fd)
+        cgroup = policy.create_cgroup()
+        limits = policy.limits(cgroup)
+        stop_watch = threading.Event()
+        threading.Thread(target=ScriptRunner._watch, args=(token, output, policy, stop_watch), daemon=True).start()
+        launched = time.time()
+        try:
+            returncode = None
+            if pool is not None and not token.is_set:
+                # worker ตายหลังรับงาน (WorkerLost) ไม่ fallback เพราะ script อาจรันไปแล้วบางส่วน
+                returncode = ScriptRunner._execute_in_pool(
+                    pool, temp_file_path, temp_dir, run_info, output, use_harness, code_path, render, timings_path,
+                    policy, limits, token, manifest_dir
+                )
+            if returncode is None and token.is_set:
+                # ถูกยกเลิกก่อนเริ่มรัน (รวมถึงระหว่างรอ worker)
+                returncode = -signal.SIGKILL
+            elif returncode is None:
+                launched = time.time()
+                returncode = ScriptRunner._execute_streaming(
+                    temp_file_path, temp_dir, run_info, output, use_harness, code_path, render, timings_path,
+                    limits, token, manifest_dir
+                )
+            returncode = ScriptRunner._check_stopped(returncode, run_info, output, policy, token, cgroup)
+            return output.stdout.text(), output.stderr.text(), returncode
+        finally:
+            stop_watch.set()
+            if cgroup:
+                RunPolicy.remove_cgroup(cgroup)
+            metrics.add_harness_timings(ScriptRunner._read_timings(timings_path), launched, time.time())
+            os.unlink(timings_path)
+            output.close()
             # ลบ script file
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
-                
-            return result.stdout, result.stderr, result.returncode, temp_dir
-            
-        except subprocess.TimeoutExpired:
-            if temp_dir and os.path.exists(temp_dir):
-                os.chdir(original_cwd)
-            return "", "Script execution timeout (60 seconds)", 1, temp_dir
-        except Exception as e:
-            if temp_dir and os.path.exists(temp_dir):
-                os.chdir(original_cwd)
-            return "", f"Error running script: {str(e)}", 1, temp_dir
+            metrics.resources['workspace_bytes_written'] = ScriptRunner._bytes_written(temp_dir, before)
+            # ไฟล์ที่ harness ไม่เห็น (native writer / process ลูก) ก็เป็นผลลัพธ์ด้วย
+            try:
+                OutputManifest.reconcile(temp_dir, before, manifest_dir or MANIFEST_DIR)
+            except OSError:
+                pass
 
-    #รัน script แบบไม่มีไฟล์เพิ่มเติม
+    #เฝ้าการรัน: หยุดทั้ง process group เมื่อหมดเวลาหรือ output รวมเกินกำหนด
     @staticmethod
-    def run_script(script_content, filename):
-        temp_dir = None
-        original_cwd = os.getcwd()
+    def _watch(token, output, policy, stop_event, interval=0.05):
+        deadline = time.monotonic() + policy.timeout
+        max_output = policy.max_output_bytes
+        while not stop_event.wait(interval):
+            if time.monotonic() >= deadline:
+                token.cancel('timeout')
+                return
+            if max_output and output.stdout.byte_count + output.stderr.byte_count > max_output:
+                token.cancel('output_limit')
+                return
+
+    #หาสาเหตุที่การรันถูกหยุด (ถ้ามี) บันทึกลง run_info['stopped'] และต่อข้อความท้าย stderr
+    @staticmethod
+    def _check_stopped(returncode, run_info, output, policy, token, cgroup=None):
+        reason = token.reason
+        if reason is None and cgroup and RunPolicy.cgroup_oom_killed(cgroup):
+            reason = 'memory_limit'
+        elif reason is None and policy.cpu_seconds and returncode == -signal.SIGXCPU:
+            reason = 'cpu_limit'
+        if reason is None:
+            return returncode
+        run_info['stopped'] = reason
+        run_info['timed_out'] = reason == 'timeout'
+        output.stderr.feed(f"\n{policy.message(reason)}\n".encode('utf-8'))
+        return returncode or 1
+
+    @staticmethod
+    def _read_timings(timings_path):
         try:
-            temp_dir = tempfile.mkdtemp(prefix="script_runner_")
-            os.chdir(temp_dir)
-            
-            with tempfile.NamedTemporaryFile(
-                mode='w', suffix='.py', delete=False, 
-                encoding='utf-8', dir=temp_dir
-            ) as f:
-                f.write(script_content)
-                temp_file_path = f.name
-                
-            result = subprocess.run(
-                [sys.executable, temp_file_path], 
-                capture_output=True, text=True, timeout=60, cwd=temp_dir
-            )
-            
-            os.chdir(original_cwd)
-            os.unlink(temp_file_path)
-            
-            return result.stdout, result.stderr, result.returncode, temp_dir
-        except subprocess.TimeoutExpired:
-            if temp_dir and os.path.exists(temp_dir):
-                os.chdir(original_cwd)
-            return "", "Script execution timeout (60 seconds)", 1, temp_dir
-        except Exception as e:
-            if temp_dir and os.path.exists(temp_dir):
-                os.chdir(original_cwd)
-            return "", f"Error running script: {str(e)}", 1, temp_dir
+            with open(timings_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
-#----------------------------------------------------------------------------------------------
-    #หัวใจสำคัญที่ทำให้ script สามารถทำงานได้ใน temp directory
+    #{(device, inode): (ขนาด, เวลาแก้ไข, path เทียบกับ workspace)} ของไฟล์ทั้งหมดใน workspace
     @staticmethod
-    def _create_modified_script_with_temp_dir(script_content, files_dict, temp_dir):
-        
-        file_creation_code = f"""
-import tempfile
-import os
-import base64
-import shutil
+    def _workspace_snapshot(temp_dir):
+        snapshot = {}
+        for dirpath, _, filenames in os.walk(temp_dir):
+            for file_name in filenames:
+                path = os.path.join(dirpath, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                relative = os.path.relpath(path, temp_dir).replace(os.sep, '/')
+                snapshot[(stat.st_dev, stat.st_ino)] = (stat.st_size, stat.st_mtime_ns, relative)
+        return snapshot
 
-# กำหนด working directory เป็น temp
-TEMP_DIR = r"{temp_dir}"
-os.chdir(TEMP_DIR)
+    #ขนาดรวมของไฟล์ที่ถูกสร้างหรือแก้ไขระหว่างรัน (ไม่นับไฟล์ input ที่ไม่ได้เปลี่ยน)
+    @staticmethod
+    def _bytes_written(temp_dir, before):
+        return sum(
+            size for key, (size, mtime_ns, _) in ScriptRunner._workspace_snapshot(temp_dir).items()
+            if before.get(key, (None, None))[:2] != (size, mtime_ns)
+        )
 
-# สร้างไฟล์ชั่วคราวจาก imported files
-_temp_files = {{}}
-_text_files_data = {{}}
-_binary_files_data = {{}}
+    #cold start: เปิด process ใหม่ด้วย Popen แล้วอ่าน stdout/stderr ผ่าน pipe ระหว่างรัน
+    @staticmethod
+    def _execute_streaming(temp_file_path, temp_dir, run_info, output, use_harness, code_path=None, render=None,
+                           timings_path=None, limits=None, token=None, manifest_dir=None):
+        run_info['mode'] = 'cold'
+        run_info['startup_saved_seconds'] = 0.0
+        command = [sys.executable, HARNESS_PATH, temp_dir, temp_file_path]
+        if not use_harness:
+            command.append('--plain')
+        if code_path:
+            command.extend(['--code', code_path])
+        if render:
+            command.extend(['--render', json.dumps(render)])
+        if timings_path:
+            command.extend(['--timings', timings_path])
+        if limits and any(limits.values()):
+            command.extend(['--limits', json.dumps(limits)])
+        if manifest_dir:
+            command.extend(['--manifest', manifest_dir])
+        if token is None:
+            token = CancelToken()
+        
+        env = dict(os.environ)
+        env['PYTHONIOENCODING'] = 'utf-8'
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=temp_dir,  # รันใน temp directory
+            env=env,
+            start_new_session=True  # process group ใหม่ (pgid = pid)
+        )
+        token.attach(process.pid)
+        readers = [
+            threading.Thread(target=pump_pipe, args=(process.stdout, output.stdout), daemon=True),
+            threading.Thread(target=pump_pipe, args=(process.stderr, output.stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        
+        try:
+            # หมดเวลา/ยกเลิกจะถูก kill ทั้งกลุ่มจาก CancelToken จึงรอได้โดยไม่ต้องกำหนดเวลา
+            returncode = ScriptRunner._wait_with_rusage(process, run_info)
+        finally:
+            # process ที่ script สร้างไว้แล้วยังไม่จบจะถือ pipe ค้างไว้ kill ทิ้งก่อนรอ reader
+            kill_group(process.pid)
+            token.detach(process.pid)
+            for reader in readers:
+                reader.join()
+        return returncode
 
-"""
+    #รอ process จบด้วย wait4 เพื่อเก็บ max RSS และ CPU time ของ process นั้นโดยเฉพาะ
+    #(getrusage(RUSAGE_CHILDREN) ปนกับงานอื่นที่รันพร้อมกัน)
+    @staticmethod
+    def _wait_with_rusage(process, run_info, timeout=None):
+        if not hasattr(os, 'wait4'):
+            return process.wait(timeout=timeout)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delay = 0.001
+        while True:
+            pid, status, rusage = os.wait4(process.pid, 0 if deadline is None else os.WNOHANG)
+            if pid == process.pid:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                run_info['metrics'].resources.update({
+                    'max_rss_bytes': rusage.ru_maxrss * 1024,
+                    'user_cpu_seconds': rusage.ru_utime,
+                    'system_cpu_seconds': rusage.ru_stime,
+                })
+                return process.returncode
+            if time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(process.args, timeout)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    #ส่งงานให้ worker pool คืนค่า None ถ้าไม่มี worker พร้อม
+    @staticmethod
+    def _execute_in_pool(pool, temp_file_path, temp_dir, run_info, output, use_harness, code_path=None, render=None,
+                         timings_path=None, policy=None, limits=None, token=None, manifest_dir=None):
+        if policy is None:
+            policy = RunPolicy()
+        if token is None:
+            token = CancelToken()
+        started_groups = []
         
-        # 1.แยกไฟล์ Text และ Binary
-        for filename, content in files_dict.items():
-            if content.startswith("__BINARY__"):
-                binary_content = content[10:]
-                file_creation_code += f'_binary_files_data["{filename}"] = "{binary_content}"\n'
-            else:
-                encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
-                file_creation_code += f'_text_files_data["{filename}"] = "{encoded_content}"\n'
-        
-        file_creation_code += """
-# 2.สร้างไฟล์ Text ใน temp directory
-for filename, encoded_content in _text_files_data.items():
-    try:
-        content = base64.b64decode(encoded_content).decode('utf-8')
-    except UnicodeDecodeError:
+        def on_start(pid):
+            started_groups.append(pid)
+            token.attach(pid)
+        
+        out_fd, stdout_path = tempfile.mkstemp(prefix="script_stdout_")
+        err_fd, stderr_path = tempfile.mkstemp(prefix="script_stderr_")
+        os.close(out_fd)
+        os.close(err_fd)
+        
+        # process ลูกของ worker เขียนลงไฟล์ เราตามอ่านไฟล์นั้นส่งต่อให้ output
+        stop_event = threading.Event()
+        followers = [
+            threading.Thread(target=follow_file, args=(stdout_path, output.stdout, stop_event), daemon=True),
+            threading.Thread(target=follow_file, args=(stderr_path, output.stderr, stop_event), daemon=True),
+        ]
+        for follower in followers:
+            follower.start()
         try:
-            content = base64.b64decode(encoded_content).decode('tis-620')
-        except:
-            try:
-                content = base64.b64decode(encoded_content).decode('cp874')
-            except:
-                content = base64.b64decode(encoded_content).decode('utf-8', errors='ignore')
-    
-    file_path = os.path.join(TEMP_DIR, filename)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    _temp_files[filename] = file_path
-
-# 3.สร้างไฟล์ Binary ใน temp directory
-for filename, encoded_content in _binary_files_data.items():
-    binary_data = base64.b64decode(encoded_content)
-    file_path = os.path.join(TEMP_DIR, filename)
-    with open(file_path, 'wb') as f:
-        f.write(binary_data)
-    _temp_files[filename] = file_path
-
-# 4.Matplotlib Part
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-
-# Override plt.show() to save figures in temp directory
-_original_show = plt.show
-_figure_counter = 0
-
-def _custom_show():
-    global _figure_counter
-    _figure_counter += 1
-    filename = f"plot_{_figure_counter}.png"
-    file_path = os.path.join(TEMP_DIR, filename)
-    plt.savefig(file_path, dpi=300, bbox_inches='tight')
-    print(f"Plot saved as: {filename}")
-    plt.close()
-
-plt.show = _custom_show
-
-# 5.Pandas Part
-import pandas as pd
-_original_to_csv = pd.DataFrame.to_csv
-
-def _custom_to_csv(self, path_or_buf=None, **kwargs):
-    if path_or_buf and isinstance(path_or_buf, str):
-        # ถ้าเป็น relative path ให้บันทึกใน temp directory
-        if not os.path.isabs(path_or_buf):
-            path_or_buf = os.path.join(TEMP_DIR, path_or_buf)
-    return _original_to_csv(self, path_or_buf, **kwargs)
-
-pd.DataFrame.to_csv = _custom_to_csv
-
-# ===== Original Script Content =====
-"""
+            # เวลาใน worker เป็นแค่ตัวกันเหนียว ปกติ CancelToken หยุดงานก่อนตาม policy.timeout
+            reply = pool.run(
+                temp_file_path, temp_dir, stdout_path, stderr_path,
+                timeout=policy.timeout + 5, use_harness=use_harness, code_path=code_path, render=render,
+                timings_path=timings_path, limits=limits, on_start=on_start, manifest_dir=manifest_dir
+            )
+        finally:
+            for pid in started_groups:
+                token.detach(pid)
+            stop_event.set()
+            for follower in followers:
+                follower.join()
+            os.unlink(stdout_path)
+            os.unlink(stderr_path)
+        
+        if reply is None:
+            return None
+        
+        run_info['mode'] = 'pool'
+        run_info['startup_saved_seconds'] = reply['startup_saved_seconds']
+        run_info['metrics'].resources.update(reply.get('rusage', {}))
+        if reply['timed_out']:
+            raise subprocess.TimeoutExpired(sys.executable, policy.timeout)
+        return reply['returncode']
+
+#----------------------------------------------------------------------------------------------
+    #หัวใจสำคัญที่ทำให้ script สามารถทำงานได้ใน temp directory
+    #วางไฟล์ input ลง temp directory เป็น bytes ก่อนรัน แล้วคืน script ที่พร้อมรันผ่าน harness
+    @staticmethod
+    def _create_modified_script_with_temp_dir(script_content, files_dict, temp_dir):
+        ScriptRunner._stage_input_files(files_dict, temp_dir)
         
         # แก้ไข encoding problems ใน script content
         script_content = script_content.replace("encoding='tis-620'", "encoding='utf-8'")
         
-        # เพิ่ม original script
-        modified_script = file_creation_code + script_content
-        
-        return modified_script
+        return script_content
+
+    #เขียนไฟล์ input ลง workspace โดยตรง (reflink จาก BlobStore ถ้าทำได้ ไม่งั้น copy)
+    #ไม่ hardlink เพราะ script เขียนทับไฟล์ input ได้ทุกทาง (sqlite3, os.truncate, โปรแกรมภายนอก) ซึ่ง harness ดักไม่ได้
+    @staticmethod
+    def _stage_input_files(files_dict, temp_dir):
+        blob_store = None
+        staged = {}
+        for filename, content in files_dict.items():
+            if not isinstance(content, BlobHandle):
+                # รองรับค่าแบบเดิม (text หรือ "__BINARY__" + base64) ด้วยการเก็บลง store ก่อน
+                if blob_store is None:
+                    blob_store = BlobStore()
+                if content.startswith("__BINARY__"):
+                    content = blob_store.put_bytes(base64.b64decode(content[10:]), filename)
+                else:
+                    content = blob_store.put_bytes(content.encode('utf-8'), filename)
+            
+            if not content.is_intact():
+                raise ValueError(f"ไฟล์ input {filename} ใน BlobStore ถูกแก้ไขหรือหายไป กรุณา import ใหม่")
+            file_path = os.path.join(temp_dir, filename)
+            link_or_copy(content.path, file_path, hardlink=False)
+            staged[filename] = file_path
+        return staged
 #----------------------------------------------------------------------------------------------
\ No newline at end of file
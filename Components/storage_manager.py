@@ -0,0 +1,203 @@
+import time
+import threading
+from collections.abc import MutableMapping
+from .blob_store import BlobStore
+from .config import (
+    STORAGE_SESSION_MAX_MB, STORAGE_GLOBAL_MAX_MB, STORAGE_SESSION_IDLE_SECONDS, STORAGE_GC_INTERVAL
+)
+
+
+class StorageQuotaExceeded(Exception):
+    """เก็บไฟล์เพิ่มไม่ได้เพราะเกินพื้นที่ที่กำหนด"""
+
+
+class _Session:
+    def __init__(self):
+        self.files = {}
+        self.last_seen = time.time()
+        self.evicted = False
+
+
+class SessionFiles(MutableMapping):
+    """ไฟล์ใน Memory ของผู้ใช้หนึ่งคน (ใช้แทน dict เดิมใน st.session_state.imported_files)
+
+    เก็บเฉพาะ BlobHandle เนื้อไฟล์อยู่ใน BlobStore บน disk
+    การเพิ่มไฟล์ผ่าน StorageManager เพื่อตรวจพื้นที่ต่อ session และพื้นที่รวมทั้งระบบ
+    """
+
+    def __init__(self, manager, session_id):
+        self._manager = manager
+        self.session_id = session_id
+
+    def _files(self):
+        return self._manager._session(self.session_id).files
+
+    def __getitem__(self, filename):
+        return self._files()[filename]
+
+    def __setitem__(self, filename, handle):
+        self._manager.add(self.session_id, filename, handle)
+
+    def __delitem__(self, filename):
+        self._manager.remove(self.session_id, filename)
+
+    def __iter__(self):
+        return iter(list(self._files()))
+
+    def __len__(self):
+        return len(self._files())
+
+    def clear(self):
+        self._manager.clear(self.session_id)
+
+    #ตรวจก่อนเขียนไฟล์ลง disk ว่ายังมีพื้นที่พอ
+    def check_quota(self, filename, size):
+        self._manager.check_quota(self.session_id, filename, size)
+
+    @property
+    def evicted(self):
+        return self._manager._session(self.session_id).evicted
+
+    def usage(self):
+        return self._manager.usage(self.session_id)
+
+
+class StorageManager:
+    """จัดการพื้นที่ของไฟล์ที่ผู้ใช้ import (ใช้ร่วมกันทุก session)
+
+    - จำกัดขนาดรวมต่อ session และขนาดรวมทั้งระบบ (นับ blob ที่ซ้ำกันครั้งเดียว)
+    - ถ้าพื้นที่รวมเต็ม ปล่อยไฟล์ของ session ที่ไม่ได้ใช้งานนานที่สุดก่อน (LRU)
+    - session ที่ไม่ได้ใช้งานเกินกำหนดถูกปล่อยอัตโนมัติ และ blob ที่ไม่มี session ใดใช้และไม่มี BlobLease ถืออยู่ถูกลบจาก disk
+    """
+
+    def __init__(self, blob_store=None, session_max_mb=STORAGE_SESSION_MAX_MB, global_max_mb=STORAGE_GLOBAL_MAX_MB,
+                 idle_seconds=STORAGE_SESSION_IDLE_SECONDS, gc_interval=STORAGE_GC_INTERVAL):
+        self.blob_store = blob_store or BlobStore()
+        self.session_max_bytes = session_max_mb * 1024 * 1024
+        self.global_max_bytes = global_max_mb * 1024 * 1024
+        self.idle_seconds = idle_seconds
+        self.gc_interval = gc_interval
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._evicted_ids = set()
+        self.stats = {'evicted_sessions': 0, 'removed_blobs': 0}
+
+        threading.Thread(target=self._gc_loop, daemon=True).start()
+
+    #ไฟล์ของ session (เรียกทุก rerun เพื่อบันทึกว่ายังใช้งานอยู่)
+    def session(self, session_id):
+        with self._lock:
+            self._session(session_id).last_seen = time.time()
+        return SessionFiles(self, session_id)
+
+    def _session(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _Session()
+                # session ที่เคยถูกปล่อยไฟล์ไปแล้ว แจ้งผู้ใช้ครั้งถัดไปที่เข้ามา
+                session.evicted = session_id in self._evicted_ids
+                self._evicted_ids.discard(session_id)
+                self._sessions[session_id] = session
+            return session
+
+    @staticmethod
+    def _unique_size(file_maps):
+        sizes = {}
+        for files in file_maps:
+            for handle in files.values():
+                sizes[handle.digest] = handle.size
+        return sum(sizes.values())
+
+    #(พื้นที่ที่ session ใช้, พื้นที่รวมทั้งระบบ) หน่วย bytes
+    def usage(self, session_id):
+        with self._lock:
+            session_bytes = self._unique_size([self._session(session_id).files])
+            total_bytes = self._unique_size(s.files for s in self._sessions.values())
+        return session_bytes, total_bytes
+
+    def check_quota(self, session_id, filename, size):
+        with self._lock:
+            files = dict(self._session(session_id).files)
+            files.pop(filename, None)
+            session_bytes = self._unique_size([files]) + size
+            if session_bytes > self.session_max_bytes:
+                raise StorageQuotaExceeded(
+                    f"พื้นที่ของ session เต็ม ({session_bytes / 1024 ** 2:,.1f} / "
+                    f"{self.session_max_bytes / 1024 ** 2:,.0f} MB) กรุณาล้างไฟล์ที่ไม่ใช้ก่อน"
+                )
+            self._make_room(session_id, size)
+
+    def add(self, session_id, filename, handle):
+        with self._lock:
+            self.check_quota(session_id, filename, handle.size)
+            session = self._session(session_id)
+            session.files[filename] = handle
+            session.last_seen = time.time()
+            session.evicted = False
+
+    #blob ที่ไม่มีใครใช้แล้วจะถูกลบในรอบเก็บกวาดถัดไป (background thread)
+    def remove(self, session_id, filename):
+        with self._lock:
+            self._session(session_id).files.pop(filename)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._session(session_id).files.clear()
+
+    #ปล่อยไฟล์ของ session อื่นที่ไม่ได้ใช้งานนานที่สุดจนพื้นที่รวมพอสำหรับไฟล์ใหม่
+    def _make_room(self, session_id, size):
+        total_bytes = self._unique_size(s.files for s in self._sessions.values())
+        if total_bytes + size <= self.global_max_bytes:
+            return
+        candidates = sorted(
+            (sid for sid, s in self._sessions.items() if sid != session_id and s.files),
+            key=lambda sid: self._sessions[sid].last_seen
+        )
+        for sid in candidates:
+            self._evict(sid)
+            total_bytes = self._unique_size(s.files for s in self._sessions.values())
+            if total_bytes + size <= self.global_max_bytes:
+                return
+        raise StorageQuotaExceeded(
+            f"พื้นที่เก็บไฟล์ของระบบเต็ม ({self.global_max_bytes / 1024 ** 2:,.0f} MB) กรุณาลองใหม่ภายหลัง"
+        )
+
+    def _evict(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None and session.files:
+            self._evicted_ids.add(session_id)
+            self.stats['evicted_sessions'] += 1
+
+    #ปล่อย session ที่ไม่ได้ใช้งานเกินกำหนด และลบ blob ที่ไม่มี session ใดอ้างถึง
+    def collect_garbage(self):
+        now = time.time()
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_seen > self.idle_seconds:
+                    self._evict(session_id)
+            referenced = {h.digest for s in self._sessions.values() for h in s.files.values()}
+
+        # blob ที่เพิ่งถูกเก็บ (ยังไม่ทันผูกกับ session หรือกำลังถูกวางลง workspace) ยังไม่ลบ
+        candidates = [
+            digest for digest, _, stored_at in list(self.blob_store.list_blobs())
+            if digest not in referenced and now - stored_at >= self.gc_interval
+        ]
+        # blob ที่งานในคิว / batch / input ของ headless ถือ lease อยู่ก็ยังไม่ลบ (อ่าน lease หลังเลือก candidate)
+        leased = self.blob_store.leased_digests() if candidates else set()
+        for digest in candidates:
+            if digest in leased:
+                continue
+            with self._lock:
+                if any(h.digest == digest for s in self._sessions.values() for h in s.files.values()):
+                    continue
+                self.blob_store.remove(digest)
+                self.stats['removed_blobs'] += 1
+
+    def _gc_loop(self):
+        while True:
+            time.sleep(self.gc_interval)
+            try:
+                self.collect_garbage()
+            except Exception:
+                pass
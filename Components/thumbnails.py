@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import THUMBNAIL_SIZE, THUMBNAIL_WORKERS
+
+# ไฟล์ภาพที่สร้างภาพย่อได้ (SVG เป็น vector แสดงได้เลย, PDF แสดงในหน้าเว็บไม่ได้)
+RASTER_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp']
+THUMBNAIL_DIR = '.thumbs'
+
+
+class ThumbnailService:
+    """สร้างภาพย่อของกราฟใน background thread (ไม่ทำใน thread ที่ตอบ request)
+
+    ภาพย่อเก็บในโฟลเดอร์ .thumbs ข้างไฟล์ต้นฉบับ ชื่อไฟล์ผูกกับขนาดและเวลาแก้ไขของต้นฉบับ
+    จึงสร้างครั้งเดียวต่อไฟล์ (โฟลเดอร์ที่ขึ้นต้นด้วยจุดไม่ถูกรวมใน ZIP และ result cache)
+    """
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_workers=THUMBNAIL_WORKERS):
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        # RLock: callback ของ future ที่เสร็จทันทีจะถูกเรียกใน thread เดียวกันขณะถือ lock อยู่
+        self._lock = threading.RLock()
+        self._futures = {}
+        self._failed = set()
+
+    @staticmethod
+    def is_raster(image_path):
+        return image_path.rsplit('.', 1)[-1].lower() in RASTER_EXTENSIONS
+
+    def thumbnail_path(self, image_path):
+        stat = os.stat(image_path)
+        directory, name = os.path.split(image_path)
+        return os.path.join(directory, THUMBNAIL_DIR, f"{name}.{self.size}.{stat.st_size}.{stat.st_mtime_ns}.png")
+
+    #คืน path ของภาพย่อถ้าสร้างเสร็จแล้ว ไม่งั้นสั่งสร้างใน background แล้วคืน None
+    def get(self, image_path):
+        thumbnail_path = self.thumbnail_path(image_path)
+        if os.path.exists(thumbnail_path):
+            return thumbnail_path
+
+        with self._lock:
+            if thumbnail_path in self._failed:
+                # สร้างภาพย่อไม่ได้ ใช้ภาพต้นฉบับแทน
+                return image_path
+            if thumbnail_path not in self._futures:
+                future = self._executor.submit(self._generate, image_path, thumbnail_path)
+                self._futures[thumbnail_path] = future
+                future.add_done_callback(lambda _: self._forget(thumbnail_path))
+        return None
+
+    def _forget(self, thumbnail_path):
+        with self._lock:
+            self._futures.pop(thumbnail_path, None)
+
+    #ภาพ raster ที่ยังไม่มีภาพย่อ (สั่งสร้างไปพร้อมกัน)
+    def pending(self, image_paths):
+        return [path for path in image_paths if self.is_raster(path) and self.get(path) is None]
+
+    def _generate(self, image_path, thumbnail_path):
+        from PIL import Image
+
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        tmp_path = thumbnail_path + '.tmp'
+        try:
+            with Image.open(image_path) as image:
+                image.thumbnail((self.size, self.size))
+                if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                    image = image.convert('RGBA')
+                image.save(tmp_path, format='PNG', optimize=True)
+            os.replace(tmp_path, thumbnail_path)
+        except Exception:
+            # ภาพเสีย/อ่านไม่ได้: จำไว้ว่าสร้างไม่ได้ จะได้ไม่ค้างสถานะรอ
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            with self._lock:
+                self._failed.add(thumbnail_path)
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+from .config import WORKER_POOL_SIZE, WORKER_MAX_RUNS, WORKER_MAX_RSS_MB, WORKER_ACQUIRE_TIMEOUT, WORKER_PRELOAD_MODULES
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pool_worker.py')
+
+
+class WorkerLost(RuntimeError):
+    """worker ตายหลังรับงานไปแล้ว (script อาจรันไปแล้วบางส่วน จึงรันซ้ำแบบ cold start ไม่ได้)"""
+
+
+class _Worker:
+    """process ที่ import library หนักไว้แล้ว หนึ่งตัวรับได้ทีละงาน"""
+
+    def __init__(self):
+        env = dict(os.environ)
+        env['WORKER_PRELOAD_MODULES'] = ','.join(WORKER_PRELOAD_MODULES)
+        env['MPLBACKEND'] = 'Agg'
+
+        spawn_started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, '-u', WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            env=env
+        )
+        ready = self._read_message()
+        if not ready or not ready.get('ready'):
+            self.close()
+            raise RuntimeError("Worker process failed to start")
+
+        # เวลาที่ cold start ต้องเสียทุกครั้ง (เปิด interpreter + import library)
+        self.warmup_seconds = time.perf_counter() - spawn_started
+        self.preloaded = ready.get('preloaded', [])
+        self.runs = 0
+        self.rss_bytes = 0
+
+    def _read_message(self):
+        line = self.process.stdout.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    #on_start(pid) ถูกเรียกเมื่อ process ลูกของงานเริ่มแล้ว (pid = process group ของงาน)
+    #คืนค่า None ถ้าส่งงานไม่ถึง worker (worker ตายไปก่อนแล้ว)
+    def run(self, job, on_start=None):
+        try:
+            self.process.stdin.write(json.dumps(job) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            return None
+        reply = self._read_message()
+        while reply is not None and reply.get('started'):
+            if on_start is not None:
+                on_start(reply['pid'])
+            reply = self._read_message()
+        if reply is None:
+            raise WorkerLost("Worker process exited unexpectedly")
+        self.runs += 1
+        self.rss_bytes = reply.get('rss_bytes', 0)
+        return reply
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        try:
+            if self.is_alive():
+                self.process.stdin.write(json.dumps({'shutdown': True}) + '\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class WorkerPool:
+    """pool ของ worker ที่อุ่นเครื่องไว้ล่วงหน้า ใช้แทนการเปิด sys.executable ใหม่ทุกครั้ง"""
+
+    def __init__(self, size=WORKER_POOL_SIZE, max_runs=WORKER_MAX_RUNS, max_rss_mb=WORKER_MAX_RSS_MB):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self._idle = queue.Queue()
+        self._closed = False
+        self.stats = {'pool_runs': 0, 'cold_fallbacks': 0, 'recycled': 0, 'lost': 0, 'startup_saved_seconds': 0.0}
+
+        for _ in range(size):
+            self._spawn_async()
+
+    #สร้าง worker ใหม่ใน background เพื่อไม่ให้ผู้ใช้ต้องรอ
+    def _spawn_async(self):
+        def spawn():
+            try:
+                worker = _Worker()
+            except Exception:
+                return
+            if self._closed:
+                worker.close()
+            else:
+                self._idle.put(worker)
+
+        threading.Thread(target=spawn, daemon=True).start()
+
+    #ตรวจว่า worker ควรถูกเปลี่ยนตัวหรือยัง (รันครบจำนวนครั้ง หรือ memory โตเกินกำหนด)
+    def _should_recycle(self, worker):
+        if not worker.is_alive():
+            return True
+        if self.max_runs and worker.runs >= self.max_runs:
+            return True
+        if self.max_rss_bytes and worker.rss_bytes > self.max_rss_bytes:
+            return True
+        return False
+
+    def _release(self, worker):
+        if self._closed:
+            worker.close()
+        elif self._should_recycle(worker):
+            worker.close()
+            self.stats['recycled'] += 1
+            self._spawn_async()
+        else:
+            self._idle.put(worker)
+
+    #รัน script ใน worker ที่ว่าง คืนค่า None ถ้าไม่มี worker พร้อม (ให้ผู้เรียก fallback เป็น cold start)
+    #ถ้า worker ตายหลังรับงานไปแล้ว raise WorkerLost แทน เพราะ script อาจรันไปแล้ว
+    def run(self, script_path, cwd, stdout_path, stderr_path, timeout=60, use_harness=False, code_path=None,
+            render=None, timings_path=None, limits=None, on_start=None, manifest_dir=None):
+        if self._closed:
+            return None
+        try:
+            worker = self._idle.get(timeout=WORKER_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            self.stats['cold_fallbacks'] += 1
+            return None
+
+        job = {
+            'script_path': script_path,
+            'code_path': code_path,
+            'harness': use_harness,
+            'render': render,
+            'timings_path': timings_path,
+            'cwd': cwd,
+            'stdout_path': stdout_path,
+            'stderr_path': stderr_path,
+            'timeout': timeout,
+            'limits': limits,
+            'manifest_dir': manifest_dir,
+        }
+        try:
+            reply = worker.run(job, on_start)
+        except Exception as e:
+            worker.close()
+            self._spawn_async()
+            self.stats['lost'] += 1
+            if isinstance(e, WorkerLost):
+                raise
+            raise WorkerLost(f"Worker failed during run: {e}") from e
+        if reply is None:
+            worker.close()
+            self._spawn_async()
+            self.stats['cold_fallbacks'] += 1
+            return None
+
+        # เวลาที่ประหยัดได้ = เวลาอุ่นเครื่องของ worker - เวลาที่ใช้ fork
+        reply['startup_saved_seconds'] = max(worker.warmup_seconds - reply.get('fork_seconds', 0.0), 0.0)
+        reply['worker_runs'] = worker.runs
+        self.stats['pool_runs'] += 1
+        self.stats['startup_saved_seconds'] += reply['startup_saved_seconds']
+
+        self._release(worker)
+        return reply
+
+    def idle_count(self):
+        return self._idle.qsize()
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
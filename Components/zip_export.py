@@ -0,0 +1,119 @@
+import os
+import time
+import zlib
+import shutil
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .config import ZIP_STORED_EXTENSIONS, ZIP_PARALLEL_MIN_MB, ZIP_SPOOL_MAX_MB
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+
+#ชื่อไฟล์ใน ZIP: path เทียบกับ base_dir (เก็บโครงสร้างโฟลเดอร์ย่อยไว้) ถ้าอยู่นอก base_dir ใช้ชื่อไฟล์
+def archive_name(file_path, base_dir=None):
+    if base_dir:
+        relative_path = os.path.relpath(file_path, base_dir)
+        if not relative_path.startswith(os.pardir + os.sep) and relative_path != os.pardir:
+            return relative_path.replace(os.sep, '/')
+    return os.path.basename(file_path)
+
+
+#สร้าง ZIP ลง spooled temp file (เล็กอยู่ใน memory ใหญ่ลง disk) คืน file object ที่ seek ไปต้นไฟล์แล้ว
+#ไฟล์ที่บีบอัดอยู่แล้ว (png/jpg/xlsx/zip ...) เก็บแบบ STORED ไม่บีบซ้ำ
+#ไฟล์ text ขนาดใหญ่บีบอัดพร้อมกันหลาย thread (zlib ปล่อย GIL ระหว่างบีบอัด)
+def build_zip(file_paths, base_dir=None, spool_max_mb=ZIP_SPOOL_MAX_MB, parallel_min_mb=ZIP_PARALLEL_MIN_MB):
+    archive = tempfile.SpooledTemporaryFile(max_size=spool_max_mb * 1024 * 1024)
+    parallel_min_bytes = parallel_min_mb * 1024 * 1024
+
+    members = []
+    for file_path in file_paths:
+        if os.path.isfile(file_path):
+            members.append((file_path, archive_name(file_path, base_dir)))
+
+    large_members = [
+        (file_path, arcname) for file_path, arcname in members
+        if not _is_precompressed(file_path) and os.path.getsize(file_path) >= parallel_min_bytes
+    ]
+    large_paths = {file_path for file_path, _ in large_members}
+
+    with ThreadPoolExecutor(max_workers=max(os.cpu_count() or 1, 1)) as executor:
+        futures = [(arcname, executor.submit(_deflate_to_temp, file_path)) for file_path, arcname in large_members]
+
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as zip_file:
+            # ไฟล์เล็กและไฟล์ที่ไม่ต้องบีบ เขียนระหว่างรอไฟล์ใหญ่บีบอัดเสร็จ
+            for file_path, arcname in members:
+                if file_path in large_paths:
+                    continue
+                compress_type = zipfile.ZIP_STORED if _is_precompressed(file_path) else zipfile.ZIP_DEFLATED
+                zip_file.write(file_path, arcname, compress_type=compress_type)
+
+            for arcname, future in futures:
+                compressed = future.result()
+                try:
+                    _write_precompressed(zip_file, arcname, compressed)
+                finally:
+                    compressed['data'].close()
+
+    archive.seek(0)
+    return archive
+
+
+def _is_precompressed(file_path):
+    extension = file_path.rsplit('.', 1)[-1].lower() if '.' in file_path else ''
+    return extension in ZIP_STORED_EXTENSIONS
+
+
+#บีบอัดไฟล์แบบ raw deflate ลง temp file พร้อมคำนวณ CRC (รันใน thread)
+def _deflate_to_temp(file_path):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    output = tempfile.TemporaryFile()
+    crc = 0
+    file_size = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            output.write(compressor.compress(chunk))
+    output.write(compressor.flush())
+    compress_size = output.tell()
+    output.seek(0)
+    return {
+        'data': output,
+        'crc': crc,
+        'file_size': file_size,
+        'compress_size': compress_size,
+        'mtime': os.stat(file_path).st_mtime,
+    }
+
+
+#เขียน member ที่บีบอัดมาแล้วลง ZIP โดยตรง (ทำแบบเดียวกับ ZipFile.write แต่ข้ามขั้นบีบอัด)
+def _write_precompressed(zip_file, arcname, compressed):
+    zip_info = zipfile.ZipInfo(arcname, _date_time(compressed['mtime']))
+    zip_info.external_attr = 0o644 << 16
+    zip_info.compress_type = zipfile.ZIP_DEFLATED
+    zip_info.CRC = compressed['crc']
+    zip_info.file_size = compressed['file_size']
+    zip_info.compress_size = compressed['compress_size']
+
+    zip64 = zip_info.file_size > zipfile.ZIP64_LIMIT or zip_info.compress_size > zipfile.ZIP64_LIMIT
+    archive = zip_file.fp
+    zip_info.header_offset = archive.tell()
+    archive.write(zip_info.FileHeader(zip64))
+    shutil.copyfileobj(compressed['data'], archive, CHUNK_SIZE)
+
+    zip_file.filelist.append(zip_info)
+    zip_file.NameToInfo[zip_info.filename] = zip_info
+    zip_file.start_dir = archive.tell()
+
+
+def _date_time(timestamp):
+    date_time = time.localtime(timestamp)[:6]
+    # ZIP รองรับปีตั้งแต่ 1980 เท่านั้น
+    if date_time[0] < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return date_time
@@ -0,0 +1,634 @@
+"""Benchmark ของ pipeline การรัน script ผ่านโค้ดจริงของ Components (ไม่ต้องใช้ MongoDB หรือ browser)
+
+ชุดที่วัด (--suites):
+    run_script    ScriptRunner.run_script กับ script ตัวอย่าง trivial / pandas / plot (cold start และ worker pool)
+    memory_files  ScriptRunner.run_script_with_memory_files พร้อมไฟล์ input
+    staging       BlobStore.put_stream (ingest) และ _create_modified_script_with_temp_dir ตามขนาดไฟล์ (--sizes)
+    legacy_staging  เตรียมไฟล์ + รัน script: แบบเดิม (ฝัง base64 ลงใน script) เทียบกับ stage ลง disk แล้วรันผ่าน harness (--sizes)
+    zip           FileManager.create_zip_from_files กับชุดไฟล์ผลลัพธ์ผสม (png / csv ใหญ่-เล็ก / xlsx)
+    preview       FilePreview.* กับไฟล์ที่อัปโหลด (CSV / Excel / text) และไฟล์ Parquet บน disk (memory map)
+    startup       เวลาเปิด process ของ script trivial: interpreter เปล่า เทียบกับผ่าน harness (patch แบบ lazy)
+    ui            เวลาวาดหน้าเว็บ (main.py) ผ่าน AppTest หลังเลือกไฟล์ไว้ --counts ไฟล์ แยกตาม fragment และทั้งหน้า (page)
+                  ต้องตั้ง MONGO_URL / MONGO_DB_NAME / MONGO_COLLECTION_NAME (หรือ .env) เหมือนตอนรัน main.py
+                  ไม่อยู่ในชุดเริ่มต้น; p90 ของ fragment ที่เกิน --target-ms นับเป็น regression ด้วย
+
+แต่ละ case รันใน process แยก peak RSS จึงไม่ปนกัน (วัดด้วย wait4)
+ผลลัพธ์เป็น JSON: percentiles ของ latency, throughput และ peak RSS
+เทียบกับ baseline ได้ด้วย --baseline (exit code 1 ถ้าช้าลง/ใช้ memory มากขึ้นเกิน --threshold)
+
+วิธีใช้:
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --suites staging --sizes 1KB,1MB,100MB,1GB
+    python benchmarks/bench_pipeline.py --suites legacy_staging --sizes 1MB,100MB,1GB
+    python benchmarks/bench_pipeline.py --suites ui --counts 10,100,500 --file-size 64KB --target-ms 200
+    python benchmarks/bench_pipeline.py --baseline baseline.json --threshold 0.2
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+SUITES = ['run_script', 'memory_files', 'staging', 'legacy_staging', 'zip', 'preview', 'startup', 'ui']
+# ui ต้องใช้ MongoDB จึงต้องเลือกเองด้วย --suites
+DEFAULT_SUITES = [s for s in SUITES if s != 'ui']
+FRAGMENTS = ['import', 'memory', 'scripts', 'pipeline', 'history']
+
+# script ตัวอย่างจากเบาไปหนัก (plot ใช้ savefig เองเพื่อให้ได้ไฟล์ทั้งแบบมีและไม่มี harness)
+SCRIPTS = {
+    'trivial': "print('hello')\n",
+    'pandas': (
+        "import numpy as np\n"
+        "import pandas as pd\n"
+        "df = pd.DataFrame(np.random.default_rng(0).random((200000, 8)), columns=list('abcdefgh'))\n"
+        "df['k'] = (df['a'] * 100).astype(int)\n"
+        "summary = df.groupby('k').agg(['mean', 'std'])\n"
+        "summary.to_csv('summary.csv')\n"
+        "print(len(summary))\n"
+    ),
+    'plot': (
+        "import numpy as np\n"
+        "import matplotlib\n"
+        "matplotlib.use('Agg')\n"
+        "import matplotlib.pyplot as plt\n"
+        "rng = np.random.default_rng(0)\n"
+        "for i in range(8):\n"
+        "    plt.figure()\n"
+        "    plt.scatter(rng.random(5000), rng.random(5000), s=2)\n"
+        "    plt.savefig(f'plot_{i}.png', dpi=100)\n"
+        "    plt.close()\n"
+        "print('done')\n"
+    ),
+}
+CSV_ROW = "1.234,5.678,9.012,3.456,7.890,1.357,2.468,3.579,Smell_A\n"
+CSV_HEADER = "s1,s2,s3,s4,s5,s6,s7,s8,Smell\n"
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def format_size(size):
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+#เขียนไฟล์ CSV ขนาดตามที่ต้องการลง disk ทีละ chunk (ไม่สร้างทั้งก้อนใน memory)
+def write_csv(path, size):
+    block = CSV_ROW * 4096
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(CSV_HEADER)
+        remaining = size - len(CSV_HEADER)
+        while remaining > 0:
+            chunk = block[:remaining] if remaining < len(block) else block
+            f.write(chunk)
+            remaining -= len(chunk)
+    return path
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+#รายชื่อ case ตาม suite ที่เลือก
+def list_cases(suites, sizes, modes, counts=(), file_size=0):
+    cases = []
+    for suite in suites:
+        if suite in ('run_script', 'memory_files'):
+            cases += [f"{suite}/{name}/{mode}" for name in SCRIPTS for mode in modes]
+        elif suite == 'staging':
+            for size in sizes:
+                cases += [f"staging/ingest/{format_size(size)}", f"staging/stage/{format_size(size)}"]
+        elif suite == 'legacy_staging':
+            for size in sizes:
+                cases += [f"legacy_staging/legacy/{format_size(size)}", f"legacy_staging/staged/{format_size(size)}"]
+        elif suite == 'zip':
+            cases.append("zip/mixed")
+        elif suite == 'preview':
+            cases += [f"preview/{name}" for name in ('csv_head', 'csv_row_count', 'excel_head', 'excel_row_count', 'text_head',
+                                                              'columnar_head', 'columnar_row_count')]
+        elif suite == 'startup':
+            cases += [f"startup/{name}" for name in ('python', 'harness', 'harness_plain')]
+        elif suite == 'ui':
+            # case เดียวต่อจำนวนไฟล์ ได้ผลแยกเป็น ui/<count>x<size>/<fragment> และ .../page
+            cases += [f"ui/{count}x{format_size(file_size)}" for count in counts]
+    return cases
+
+
+# ======= ส่วนที่รันใน process ของแต่ละ case =======
+#เตรียม case คืน (ฟังก์ชันที่ถูกจับเวลา, จำนวน bytes ต่อรอบ, ฟังก์ชันคืนข้อมูลเพิ่มเติม)
+def setup_case(name, work_dir):
+    suite, variant = name.split('/', 1)
+    if suite in ('run_script', 'memory_files'):
+        return _setup_run(suite, *variant.split('/'), work_dir)
+    if suite == 'staging':
+        action, size = variant.split('/')
+        return _setup_staging(action, parse_size(size), work_dir)
+    if suite == 'legacy_staging':
+        variant, size = variant.split('/')
+        return _setup_legacy_staging(variant, parse_size(size), work_dir)
+    if suite == 'zip':
+        return _setup_zip(work_dir)
+    if suite == 'preview':
+        return _setup_preview(variant, work_dir)
+    if suite == 'startup':
+        return _setup_startup(variant, work_dir)
+    if suite == 'ui':
+        count, size = variant.split('x')
+        return _setup_ui(int(count), parse_size(size))
+    raise ValueError(f"Unknown case: {name}")
+
+
+def _setup_run(suite, script_name, mode, work_dir):
+    from Components.script_runner import ScriptRunner
+    from Components.blob_store import BlobStore
+
+    pool = None
+    if mode == 'pool':
+        from Components.worker_pool import WorkerPool
+        pool = WorkerPool(size=1)
+        # รอ worker อุ่นเครื่องเสร็จก่อนเริ่มจับเวลา
+        deadline = time.monotonic() + 120
+        while pool.idle_count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    files_dict = {}
+    input_bytes = 0
+    if suite == 'memory_files':
+        store = BlobStore(os.path.join(work_dir, 'blobs'))
+        csv_path = write_csv(os.path.join(work_dir, 'data.csv'), UNITS['MB'])
+        with open(csv_path, 'rb') as f:
+            files_dict['data.csv'] = store.put_stream(f, 'data.csv')
+        input_bytes = files_dict['data.csv'].size
+
+    child_rss = []
+    script = SCRIPTS[script_name]
+
+    def run_once():
+        run_info = {}
+        if suite == 'memory_files':
+            result = ScriptRunner.run_script_with_memory_files(script, f"{script_name}.py", files_dict, pool=pool, run_info=run_info)
+        else:
+            result = ScriptRunner.run_script(script, f"{script_name}.py", pool=pool, run_info=run_info)
+        stdout, stderr, returncode, temp_dir = result
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if returncode != 0:
+            raise RuntimeError(stderr.strip().splitlines()[-1:] or "script failed")
+        if pool is not None and run_info.get('mode') != 'pool':
+            raise RuntimeError("worker pool was not used")
+        child_rss.append(run_info['metrics'].resources.get('max_rss_bytes', 0))
+
+    def extra():
+        return {'script_peak_rss_mb': max(child_rss) / 1024 ** 2 if child_rss else None}
+
+    return run_once, input_bytes, extra
+
+
+def _setup_staging(action, size, work_dir):
+    from Components.script_runner import ScriptRunner
+    from Components.blob_store import BlobStore
+
+    store = BlobStore(os.path.join(work_dir, 'blobs'))
+    csv_path = write_csv(os.path.join(work_dir, 'raw.csv'), size)
+
+    if action == 'ingest':
+        counter = [0]
+
+        def run_once():
+            # ให้เนื้อหาไม่ซ้ำกันทุกรอบ ไม่งั้น store จะข้ามไฟล์ที่มีอยู่แล้ว
+            counter[0] += 1
+            with open(csv_path, 'r+b') as f:
+                f.write(f"{counter[0]:08d}".encode('ascii')[:8])
+            with open(csv_path, 'rb') as f:
+                store.put_stream(f, 'raw.csv')
+        return run_once, size, dict
+
+    with open(csv_path, 'rb') as f:
+        files_dict = {'raw.csv': store.put_stream(f, 'raw.csv')}
+
+    def run_once():
+        temp_dir = tempfile.mkdtemp(prefix="bench_stage_", dir=work_dir)
+        try:
+            ScriptRunner._create_modified_script_with_temp_dir("print('done')\n", files_dict, temp_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return run_once, size, dict
+
+
+#วิธีเดิม: ฝังไฟล์เป็น base64 string ใน script แล้วให้ process ลูก decode เอง
+def legacy_generate(script_content, files_dict, temp_dir):
+    file_creation_code = f"""
+import tempfile
+import os
+import base64
+import shutil
+
+TEMP_DIR = r"{temp_dir}"
+os.chdir(TEMP_DIR)
+
+_temp_files = {{}}
+_text_files_data = {{}}
+_binary_files_data = {{}}
+
+"""
+    for filename, content in files_dict.items():
+        if content.startswith("__BINARY__"):
+            file_creation_code += f'_binary_files_data["{filename}"] = "{content[10:]}"\n'
+        else:
+            encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
+            file_creation_code += f'_text_files_data["{filename}"] = "{encoded_content}"\n'
+
+    file_creation_code += """
+for filename, encoded_content in _text_files_data.items():
+    try:
+        content = base64.b64decode(encoded_content).decode('utf-8')
+    except UnicodeDecodeError:
+        content = base64.b64decode(encoded_content).decode('tis-620')
+    file_path = os.path.join(TEMP_DIR, filename)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    _temp_files[filename] = file_path
+
+for filename, encoded_content in _binary_files_data.items():
+    binary_data = base64.b64decode(encoded_content)
+    file_path = os.path.join(TEMP_DIR, filename)
+    with open(file_path, 'wb') as f:
+        f.write(binary_data)
+    _temp_files[filename] = file_path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+"""
+    return file_creation_code + script_content
+
+
+#เตรียมไฟล์ + รัน script ต่อรอบ: legacy (base64 ใน script) หรือ staged (BlobStore -> workspace -> harness)
+def _setup_legacy_staging(variant, size, work_dir):
+    from Components.script_runner import ScriptRunner, HARNESS_PATH
+    from Components.blob_store import BlobStore
+
+    store = BlobStore(os.path.join(work_dir, 'blobs'))
+    csv_path = write_csv(os.path.join(work_dir, 'raw.csv'), size)
+    child_rss = []
+
+    def run_once():
+        temp_dir = tempfile.mkdtemp(prefix="bench_stage_", dir=work_dir)
+        try:
+            script_path = os.path.join(temp_dir, 'script.py')
+            if variant == 'legacy':
+                with open(csv_path, encoding='utf-8') as f:
+                    files_dict = {'raw.csv': f.read()}
+                script = legacy_generate("print('done')\n", files_dict, temp_dir)
+                command = [sys.executable, script_path]
+            else:
+                with open(csv_path, 'rb') as f:
+                    files_dict = {'raw.csv': store.put_stream(f, 'raw.csv')}
+                script = ScriptRunner._create_modified_script_with_temp_dir("print('done')\n", files_dict, temp_dir)
+                command = [sys.executable, HARNESS_PATH, temp_dir, script_path]
+            with open(script_path, 'w', encoding='utf-8') as f:
+                f.write(script)
+            # peak RSS ของ process ลูกที่รัน script แยกจากของ process ที่เตรียมไฟล์
+            with tempfile.TemporaryFile() as err:
+                proc = subprocess.Popen(command, cwd=temp_dir, stdout=subprocess.DEVNULL, stderr=err)
+                _, status, usage = os.wait4(proc.pid, 0)
+                if os.waitstatus_to_exitcode(status) != 0:
+                    err.seek(0)
+                    raise RuntimeError(err.read().decode('utf-8', 'replace').strip().splitlines()[-1:])
+            child_rss.append(usage.ru_maxrss * 1024)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def extra():
+        return {'script_peak_rss_mb': max(child_rss) / 1024 ** 2 if child_rss else None}
+
+    return run_once, size, extra
+
+
+#ชุดไฟล์ผลลัพธ์ผสม: ภาพ (บีบอัดแล้ว), CSV ใหญ่ (บีบอัดแบบขนาน), CSV เล็ก และ xlsx
+def _setup_zip(work_dir):
+    from Components.file_manager import FileManager
+
+    output_dir = os.path.join(work_dir, 'outputs')
+    os.makedirs(os.path.join(output_dir, 'radarPlot'))
+    file_paths = []
+    for i in range(24):
+        path = os.path.join(output_dir, 'radarPlot' if i % 2 else '', f"plot_{i}.png")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(256 * 1024))
+        file_paths.append(path)
+    for i in range(3):
+        file_paths.append(write_csv(os.path.join(output_dir, f"large_{i}.csv"), 16 * UNITS['MB']))
+    for i in range(20):
+        file_paths.append(write_csv(os.path.join(output_dir, f"small_{i}.csv"), 64 * UNITS['KB']))
+    xlsx_path = os.path.join(output_dir, 'report.xlsx')
+    with open(xlsx_path, 'wb') as f:
+        f.write(os.urandom(2 * UNITS['MB']))
+    file_paths.append(xlsx_path)
+    total = sum(os.path.getsize(path) for path in file_paths)
+
+    def run_once():
+        FileManager.create_zip_from_files(file_paths, output_dir)
+    return run_once, total, dict
+
+
+#เปิด process ใหม่รัน script trivial: python script.py / harness.py (มีและไม่มี --plain)
+def _setup_startup(variant, work_dir):
+    from Components.script_runner import HARNESS_PATH
+
+    script_path = os.path.join(work_dir, 'script.py')
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write(SCRIPTS['trivial'])
+    if variant == 'python':
+        command = [sys.executable, script_path]
+    else:
+        command = [sys.executable, HARNESS_PATH, work_dir, script_path] + (['--plain'] if variant == 'harness_plain' else [])
+
+    def run_once():
+        subprocess.run(command, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return run_once, 0, dict
+
+
+def _setup_preview(function_name, work_dir):
+    from Components.preview import FilePreview
+
+    if function_name.startswith('excel'):
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([f"s{i}" for i in range(1, 9)] + ['Smell'])
+        for i in range(20000):
+            sheet.append([1.234, 5.678, 9.012, 3.456, 7.890, 1.357, 2.468, i, 'Smell_A'])
+        path = os.path.join(work_dir, 'upload.xlsx')
+        workbook.save(path)
+    elif function_name.startswith('columnar'):
+        # ข้อมูลเดียวกับชุด CSV เขียนเป็น Parquet (หลาย row group) อ่านจาก path ผ่าน memory map เหมือนไฟล์ผลลัพธ์
+        import pandas as pd
+        csv_path = write_csv(os.path.join(work_dir, 'upload.csv'), 50 * UNITS['MB'])
+        path = os.path.join(work_dir, 'output.parquet')
+        pd.read_csv(csv_path).to_parquet(path, row_group_size=100000)
+    else:
+        path = write_csv(os.path.join(work_dir, 'upload.csv'), 50 * UNITS['MB'])
+    with open(path, 'rb') as f:
+        upload = io.BytesIO(f.read())
+    size = len(upload.getbuffer())
+
+    function = getattr(FilePreview, function_name)
+    counter = [0]
+
+    def run_once():
+        # key ใหม่ทุกรอบ เพื่อวัดการอ่านไฟล์จริง ไม่ใช่ cache hit
+        counter[0] += 1
+        key = f"bench-{counter[0]}"
+        if function_name.startswith('excel'):
+            function(key, upload, 'xlsx')
+        elif function_name.startswith('columnar'):
+            function(key, path, 'parquet')
+        else:
+            function(key, upload)
+    return run_once, size, dict
+
+
+#ไฟล์ CSV ตัวอย่าง count ไฟล์ ขนาดประมาณ size (เนื้อหาไม่ซ้ำกัน preview จึงไม่ได้ cache ข้ามไฟล์)
+def make_upload_files(count, size):
+    files = []
+    for i in range(count):
+        row = f"{i},1.234,5.678,9.012,3.456,7.890,1.357,2.468,Smell_{i}\n"
+        content = CSV_HEADER + row * max((size - len(CSV_HEADER)) // len(row), 1)
+        files.append((f"bench_{i:05d}.csv", content.encode('utf-8'), "text/csv"))
+    return files
+
+
+#เลือกไฟล์ + เก็บลง Memory แล้ว rerun ทั้งหน้าทุกรอบ
+#AppTest rerun ทั้งหน้าเสมอ เวลาของ fragment จึงอ่านจากที่ main.py บันทึกไว้ (st.session_state.ui_render_ms)
+def _setup_ui(count, size):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT_DIR, 'main.py'), default_timeout=120)
+    at.run()
+    at.file_uploader[0].set_value(make_upload_files(count, size)).run()
+    save_all = [b for b in at.button if b.label.startswith("💾 เก็บไฟล์ทั้งหมด")]
+    if save_all:
+        save_all[0].click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    def run_once():
+        started = time.perf_counter()
+        at.run()
+        timings = {'page': time.perf_counter() - started}
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        timings.update({fragment: ms / 1000 for fragment, ms in at.session_state['ui_render_ms'].items()})
+        return timings
+    return run_once, 0, dict
+
+
+def run_case(name, iterations, warmup):
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        run_once, bytes_per_iteration, extra = setup_case(name, work_dir)
+        for _ in range(warmup):
+            run_once()
+        latencies = {}
+        for _ in range(iterations):
+            started = time.perf_counter()
+            parts = run_once()
+            elapsed = time.perf_counter() - started
+            # case ที่วัดหลายส่วนในรอบเดียว (ui) คืนเวลาของแต่ละส่วนเอง
+            for part, seconds in (parts or {'': elapsed}).items():
+                latencies.setdefault(part, []).append(seconds)
+        return {'latencies': latencies, 'bytes_per_iteration': bytes_per_iteration, **extra()}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ======= ส่วน driver =======
+#รัน case ใน process แยก แล้ววัด peak RSS ของ process นั้นด้วย wait4
+def measure(name, iterations, warmup):
+    command = [sys.executable, os.path.abspath(__file__), '--case', name,
+               '--iterations', str(iterations), '--warmup', str(warmup)]
+    # เขียนผลลงไฟล์แทน pipe เพื่อให้ wait4 เก็บ process เองได้โดยไม่ติด buffer เต็ม
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(command, stdout=out, stderr=err)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode('utf-8', 'replace')
+        stderr = err.read().decode('utf-8', 'replace')
+    if proc.returncode != 0:
+        return [{'case': name, 'error': stderr.strip().splitlines()[-1:]}]
+
+    raw = json.loads(stdout.strip().splitlines()[-1])
+    series = raw.pop('latencies')
+    bytes_per_iteration = raw.pop('bytes_per_iteration')
+    results = []
+    for part, latencies in series.items():
+        result = summarize(f"{name}/{part}" if part else name, latencies, bytes_per_iteration, usage.ru_maxrss)
+        result.update(raw)
+        results.append(result)
+    return results
+
+
+def summarize(name, latencies, bytes_per_iteration, max_rss):
+    mean = sum(latencies) / len(latencies)
+    return {
+        'case': name,
+        'iterations': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': mean * 1000,
+        'min_ms': min(latencies) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'ops_per_second': 1 / mean if mean else None,
+        'mb_per_second': bytes_per_iteration / UNITS['MB'] / mean if mean and bytes_per_iteration else None,
+        # ru_maxrss บน Linux มีหน่วยเป็น KB
+        'peak_rss_mb': max_rss / 1024,
+    }
+
+
+#เทียบกับ baseline คืนรายการ case/metric ที่แย่ลงเกิน threshold (ทุก metric ยิ่งน้อยยิ่งดี)
+def compare(results, baseline, metrics, threshold):
+    previous = {r['case']: r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        before = previous.get(result['case'])
+        if before is None or 'error' in result:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            result.setdefault('change', {})[metric] = change
+            if change > threshold:
+                regressions.append({'case': result['case'], 'metric': metric, 'baseline': old, 'current': new, 'change': change})
+    return regressions
+
+
+#ผล ui ของแต่ละ fragment เทียบกับเป้าเวลาวาด (page แสดงไว้เทียบเท่านั้น) คืนรายการที่ p90 เกินเป้า
+def check_targets(results, target_ms):
+    over = []
+    for result in results:
+        if not result['case'].startswith('ui/') or result['case'].endswith('/page') or 'error' in result:
+            continue
+        result['target_ms'] = target_ms
+        if result['p90_ms'] > target_ms:
+            over.append({'case': result['case'], 'metric': 'p90_ms', 'target': target_ms, 'current': result['p90_ms']})
+    return over
+
+
+def print_table(results):
+    print(f"{'case':<40} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>8} {'MB/s':>8} {'RSS MB':>8} {'Δp50':>7}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['case']:<40} error: {r['error']}")
+            continue
+        mb_per_second = f"{r['mb_per_second']:.1f}" if r['mb_per_second'] else '-'
+        change = r.get('change', {}).get('p50_ms')
+        change = f"{change:+.0%}" if change is not None else '-'
+        print(f"{r['case']:<40} {r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['ops_per_second']:>8.2f} {mb_per_second:>8} {r['peak_rss_mb']:>8.1f} {change:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', default=','.join(DEFAULT_SUITES), help="ชุดที่วัด คั่นด้วย , (ค่าเริ่มต้น: ทั้งหมดยกเว้น ui)")
+    parser.add_argument('--sizes', default='1KB,1MB,100MB', help="ขนาดไฟล์ของชุด staging และ legacy_staging (เช่น 1KB,1MB,100MB,1GB)")
+    parser.add_argument('--modes', default='cold,pool', help="วิธีรัน script: cold (process ใหม่) และ/หรือ pool")
+    parser.add_argument('--counts', default='10,100,300', help="จำนวนไฟล์ที่เลือกในชุด ui คั่นด้วย ,")
+    parser.add_argument('--file-size', default='16KB', help="ขนาดของแต่ละไฟล์ในชุด ui")
+    parser.add_argument('--target-ms', type=float, help="เป้าเวลาวาดของแต่ละ fragment (ค่าเริ่มต้นจาก UI_RERUN_TARGET_MS)")
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--output', help="บันทึกผลเป็นไฟล์ JSON (ใช้เป็น baseline ครั้งต่อไปได้)")
+    parser.add_argument('--baseline', help="ไฟล์ผลครั้งก่อนสำหรับเทียบ")
+    parser.add_argument('--threshold', type=float, default=0.2, help="สัดส่วนที่ยอมให้แย่ลงได้ (0.2 = 20%%)")
+    parser.add_argument('--metrics', default='p50_ms', help="metric ที่ใช้เทียบกับ baseline เช่น p50_ms,p90_ms,peak_rss_mb")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.iterations, args.warmup)))
+        return 0
+
+    suites = [s for s in args.suites.split(',') if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    modes = [m for m in args.modes.split(',') if m]
+    counts = [int(c) for c in args.counts.split(',') if c]
+    target_ms = args.target_ms
+    if target_ms is None:
+        from Components.config import UI_RERUN_TARGET_MS
+        target_ms = UI_RERUN_TARGET_MS
+
+    results = []
+    for name in list_cases(suites, sizes, modes, counts, parse_size(args.file_size)):
+        # staging ขนาดใหญ่ใช้เวลาต่อรอบนาน ลดจำนวนรอบลง
+        iterations = args.iterations
+        if name.startswith(('staging/', 'legacy_staging/')) and parse_size(name.rsplit('/', 1)[-1]) >= 100 * UNITS['MB']:
+            iterations = min(iterations, 3)
+        print(f"running {name} ...", file=sys.stderr)
+        results.extend(measure(name, iterations, args.warmup))
+
+    regressions = check_targets(results, target_ms)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions += compare(results, baseline, args.metrics.split(','), args.threshold)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+        'regressions': regressions,
+    }
+    print_table(results)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    for r in regressions:
+        if 'target' in r:
+            print(f"❌ {r['case']} {r['metric']}: {r['current']:.2f} > target {r['target']:g}", file=sys.stderr)
+        else:
+            print(f"❌ {r['case']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} ({r['change']:+.0%})", file=sys.stderr)
+    if any('error' in r for r in results):
+        return 1
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,471 @@
+"""รัน script ที่เก็บใน MongoDB โดยไม่ต้องเปิดหน้าเว็บ (สำหรับงานอัตโนมัติ เช่น nightly job)
+
+ใช้ ScriptRunner / FileManager / RunScheduler ชุดเดียวกับ main.py แต่ไม่มีการ rerun หน้า Streamlit
+
+วิธีใช้:
+    python headless.py run <script> [--input file ...] [--output-dir DIR] [--force] [--render-profile NAME] [--pool]
+    python headless.py serve [--host 0.0.0.0] [--port 8600] [--no-pool]
+
+HTTP API (serve, HTTP/1.1 keep-alive, รันหลายงานพร้อมกันผ่าน RunScheduler):
+    POST   /runs?script=<name>[&force=1][&render_profile=NAME]  multipart/form-data (ไฟล์ input) -> {"run_id": ...}
+    GET    /runs/<run_id>                     สถานะ + รายการไฟล์ผลลัพธ์
+    GET    /runs/<run_id>/wait?timeout=60     รอจนงานจบ (หรือครบเวลา) แล้วตอบสถานะ
+    GET    /runs/<run_id>/logs/stdout?offset=0  log แบบ stream (chunked) จนงานจบ (stderr ก็ได้)
+    GET    /runs/<run_id>/artifacts/<path>    ดาวน์โหลดไฟล์ผลลัพธ์
+    GET    /runs/<run_id>/artifacts.zip       ZIP ของไฟล์ผลลัพธ์ทั้งหมด
+    DELETE /runs/<run_id>                     ยกเลิกงานที่ยังไม่จบ หรือลบผลลัพธ์ของงานที่จบแล้ว
+    GET    /history?script=&user=&after=&limit=  ประวัติการรัน (ใหม่สุดก่อน) ส่ง "next" กลับมาเป็น after ของหน้าถัดไป
+    GET    /history/<run_id>                  ข้อมูลของการรันที่จบแล้ว (ทั้งงานเก่าที่ไม่อยู่ใน /runs แล้ว)
+    GET    /history/<run_id>/artifacts/<path>, /history/<run_id>/artifacts.zip, /history/<run_id>/logs/stdout
+    GET    /health, /metrics
+
+ตัวอย่าง:
+    curl -F "script=processDataset.py" -F "files=@raw.csv" -F "files=@smell_Name.xlsx" http://localhost:8600/runs
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import shutil
+import argparse
+import tempfile
+import threading
+import mimetypes
+from email.parser import HeaderParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from dotenv import load_dotenv
+from Components.blob_store import BlobLease
+from Components.config import HEADLESS_PORT, HEADLESS_MAX_UPLOAD_MB
+from Components.metrics import MetricsRegistry
+from Components.run_service import RunService, ScriptNotFound
+from Components.worker_pool import WorkerPool
+
+CHUNK_SIZE = 64 * 1024
+
+
+#ส่วนของไฟล์ที่ map ไว้ อ่านเป็น stream ได้ (ส่งต่อให้ BlobStore.put_stream โดยไม่ copy ทั้งก้อน)
+class _Range:
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.position = start
+        self.end = end
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.end - self.position
+        data = self.buffer[self.position:min(self.position + size, self.end)]
+        self.position += len(data)
+        return data
+
+
+class BadRequest(ValueError):
+    """ค่าใน query string ใช้ไม่ได้ (ตอบ 400)"""
+
+
+#ค่าตัวเลขจาก query string (ไม่มี = default) ค่าที่ไม่ใช่ตัวเลขจำกัดที่ไม่ติดลบ raise BadRequest
+def query_number(query, key, default, kind=int):
+    value = query.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        raise BadRequest(f"'{key}' must be a number") from None
+    if not math.isfinite(number) or number < 0:
+        raise BadRequest(f"'{key}' must be a non-negative number")
+    return number
+
+
+#cursor ของหน้าประวัติ "<finished_at>:<run_id>" คืน (finished_at, run_id) หรือ None
+def history_cursor(query):
+    value = query.get('after')
+    if not value:
+        return None
+    finished_at, _, run_id = value.partition(':')
+    try:
+        finished_at = float(finished_at)
+    except ValueError:
+        finished_at = None
+    if finished_at is None or not math.isfinite(finished_at) or not run_id:
+        raise BadRequest("'after' must be a cursor returned in 'next'")
+    return finished_at, run_id
+
+
+#แยก multipart/form-data จากไฟล์ body คืน (fields, [(ชื่อไฟล์, _Range)])
+#ชื่อไฟล์ที่ว่าง / . / .. (หลังตัด path ออก) raise ValueError
+def parse_multipart(body, boundary):
+    fields = {}
+    files = []
+    if os.fstat(body.fileno()).st_size == 0:
+        return fields, files, None
+    buffer = mmap.mmap(body.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        delimiter = b'--' + boundary
+        position = buffer.find(delimiter)
+        while position >= 0:
+            start = position + len(delimiter)
+            if buffer[start:start + 2] == b'--':
+                break
+            header_end = buffer.find(b'\r\n\r\n', start)
+            if header_end < 0:
+                raise ValueError("Malformed multipart body")
+            headers = HeaderParser().parsestr(buffer[start + 2:header_end].decode('utf-8', errors='replace'))
+            content_start = header_end + 4
+            next_position = buffer.find(b'\r\n' + delimiter, content_start)
+            if next_position < 0:
+                raise ValueError("Malformed multipart body")
+
+            filename = headers.get_filename()
+            if filename is not None:
+                filename = os.path.basename(filename.replace('\\', '/'))
+                if filename in ('', '.', '..'):
+                    raise ValueError(f"Invalid file name in multipart part: {headers.get_filename()!r}")
+                files.append((filename, _Range(buffer, content_start, next_position)))
+            else:
+                name = headers.get_param('name', header='content-disposition')
+                fields[name] = buffer[content_start:next_position].decode('utf-8', errors='replace')
+            position = next_position + 2
+    except ValueError:
+        buffer.close()
+        raise
+    return fields, files, buffer
+
+
+def make_handler(service, metrics_registry=None, max_upload_mb=HEADLESS_MAX_UPLOAD_MB):
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1: เชื่อมต่อเดิมใช้ส่งหลายคำขอได้ (ทุกคำตอบมี Content-Length หรือเป็น chunked)
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _route(self):
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip('/').split('/', 3) if part]
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return parts, query
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_file(self, stream, size, filename, content_type=None):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(filename)}"')
+            self.end_headers()
+            shutil.copyfileobj(stream, self.wfile, CHUNK_SIZE)
+
+        def _job_or_404(self, run_id):
+            job = service.job(run_id)
+            if job is None:
+                self._send_json(404, {'error': f"Run '{run_id}' not found"})
+            return job
+
+        def do_GET(self):
+            parts, query = self._route()
+            if parts == ['health']:
+                self._send_json(200, {'status': 'ok', 'scheduler': service.scheduler.stats()})
+            elif parts == ['metrics'] and metrics_registry is not None:
+                body = metrics_registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif len(parts) >= 2 and parts[0] == 'runs':
+                try:
+                    self._get_run(parts[1], parts[2:], query)
+                except BadRequest as e:
+                    self._send_json(400, {'error': str(e)})
+            elif parts and parts[0] == 'history' and service.history is not None:
+                try:
+                    self._get_history(parts[1:], query)
+                except BadRequest as e:
+                    self._send_json(400, {'error': str(e)})
+            else:
+                self._send_json(404, {'error': "Not found"})
+
+        def _get_run(self, run_id, rest, query):
+            job = self._job_or_404(run_id)
+            if job is None:
+                return
+            if not rest:
+                self._send_json(200, service.describe(run_id))
+            elif rest == ['wait']:
+                service.wait(run_id, query_number(query, 'timeout', 60, float))
+                self._send_json(200, service.describe(run_id))
+            elif rest[0] == 'logs' and len(rest) == 2 and rest[1] in ('stdout', 'stderr'):
+                self._stream_log(run_id, rest[1], query_number(query, 'offset', 0))
+            elif rest == ['artifacts.zip']:
+                if not job.is_finished:
+                    self._send_json(409, {'error': "Run has not finished"})
+                    return
+                with service.artifacts_zip(run_id) as archive:
+                    archive.seek(0, os.SEEK_END)
+                    size = archive.tell()
+                    archive.seek(0)
+                    self._send_file(archive, size, f"{job.label.replace('.py', '')}_output.zip", 'application/zip')
+            elif rest[0] == 'artifacts' and len(rest) == 2:
+                path = service.artifact_path(run_id, rest[1])
+                if path is None:
+                    self._send_json(404, {'error': f"Artifact '{rest[1]}' not found"})
+                    return
+                with open(path, 'rb') as f:
+                    self._send_file(f, os.fstat(f.fileno()).st_size, path)
+            else:
+                self._send_json(404, {'error': "Not found"})
+
+        #ประวัติการรัน: แบ่งหน้าด้วย cursor "<finished_at>:<run_id>" และไฟล์ผลลัพธ์/log ที่เก็บไว้
+        def _get_history(self, rest, query):
+            history = service.history
+            if not rest:
+                runs, next_cursor = history.page(
+                    query.get('script'), query.get('user'), history_cursor(query), query_number(query, 'limit', 0) or None
+                )
+                self._send_json(200, {
+                    'runs': runs,
+                    'next': f"{next_cursor[0]!r}:{next_cursor[1]}" if next_cursor else None,
+                })
+                return
+            run = history.get(rest[0])
+            if run is None:
+                self._send_json(404, {'error': f"Run '{rest[0]}' not found"})
+            elif len(rest) == 1:
+                self._send_json(200, run)
+            elif rest[1:] == ['artifacts.zip']:
+                archive = history.artifacts_zip(run['run_id'])
+                if archive is None:
+                    self._send_json(410, {'error': f"Artifacts are {run['artifacts_state']}"})
+                    return
+                with archive:
+                    archive.seek(0, os.SEEK_END)
+                    size = archive.tell()
+                    archive.seek(0)
+                    self._send_file(archive, size, f"{run['script'].replace('.py', '')}_output.zip", 'application/zip')
+            elif rest[1] in ('artifacts', 'logs') and len(rest) == 3:
+                if rest[1] == 'artifacts':
+                    path = history.artifact_path(run['run_id'], rest[2])
+                else:
+                    path = history.log_path(run['run_id'], rest[2])
+                if path is None:
+                    self._send_json(404, {'error': f"'{rest[2]}' not found"})
+                    return
+                with open(path, 'rb') as f:
+                    self._send_file(f, os.fstat(f.fileno()).st_size, path)
+            else:
+                self._send_json(404, {'error': "Not found"})
+
+        #ส่ง log แบบ chunked ทันทีที่ script เขียน จนกว่างานจะจบ
+        def _stream_log(self, run_id, stream, offset):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for data in service.follow_log(run_id, stream, offset):
+                    self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def do_POST(self):
+            parts, query = self._route()
+            if parts != ['runs']:
+                self.close_connection = True
+                self._send_json(404, {'error': "Not found"})
+                return
+            length = self.headers.get('Content-Length')
+            if length is None and self.headers.get('Transfer-Encoding'):
+                self.close_connection = True
+                self._send_json(411, {'error': "Content-Length required"})
+                return
+            length = int(length or 0)
+            if length > max_upload_mb * 1024 * 1024:
+                self.close_connection = True
+                self._send_json(413, {'error': f"Upload larger than {max_upload_mb} MB"})
+                return
+
+            # body ลงไฟล์ชั่วคราวก่อน (ไม่เก็บไฟล์ input ทั้งก้อนไว้ใน memory)
+            with tempfile.TemporaryFile() as body:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    body.write(chunk)
+                    remaining -= len(chunk)
+                body.flush()
+                # lease ถือ blob ของ input ไว้จนกว่างานจะเข้าคิว (งานในคิวถือ lease ของตัวเองต่อ)
+                lease = BlobLease()
+                try:
+                    fields, inputs = self._read_inputs(body, lease)
+                except ValueError as e:
+                    lease.release()
+                    self._send_json(400, {'error': str(e)})
+                    return
+
+            fields.update(query)
+            script = fields.get('script')
+            try:
+                if not script:
+                    self._send_json(400, {'error': "Missing 'script'"})
+                    return
+                run_id = service.submit(
+                    script, inputs, user_id=self.headers.get('X-User-Id') or 'headless',
+                    force_rerun=fields.get('force', '').lower() in ('1', 'true', 'yes'),
+                    render_profile=fields.get('render_profile')
+                )
+            except ScriptNotFound as e:
+                self._send_json(404, {'error': str(e)})
+                return
+            finally:
+                lease.release()
+            self._send_json(202, {'run_id': run_id, 'status': service.describe(run_id)['status'], 'url': f"/runs/{run_id}"})
+
+        def _read_inputs(self, body, lease):
+            content_type = self.headers.get('Content-Type', '')
+            if not content_type.startswith('multipart/form-data'):
+                return {}, {}
+            boundary = HeaderParser().parsestr(f"Content-Type: {content_type}\r\n\r\n").get_param('boundary')
+            if not boundary:
+                raise ValueError("Missing multipart boundary")
+            fields, files, buffer = parse_multipart(body, boundary.encode('latin-1'))
+            try:
+                inputs = {filename: service.store_input(filename, stream, lease) for filename, stream in files}
+            finally:
+                if buffer is not None:
+                    buffer.close()
+            return fields, inputs
+
+        def do_DELETE(self):
+            parts, _ = self._route()
+            if len(parts) != 2 or parts[0] != 'runs':
+                self._send_json(404, {'error': "Not found"})
+                return
+            job = self._job_or_404(parts[1])
+            if job is None:
+                return
+            if job.is_finished:
+                service.discard(job.run_id)
+                self._send_json(200, {'run_id': job.run_id, 'status': 'discarded'})
+            else:
+                service.cancel(job.run_id)
+                self._send_json(200, {'run_id': job.run_id, 'status': 'cancelled'})
+
+    return Handler
+
+
+#เปิด HTTP API (แต่ละ connection มี thread ของตัวเอง งานรันผ่าน RunScheduler ร่วมกัน)
+def serve(service, host, port, metrics_registry=None):
+    server = ThreadingHTTPServer((host, port), make_handler(service, metrics_registry))
+    server.daemon_threads = True
+    print(f"🌐 Serving on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        server.server_close()
+    return 0
+
+
+#รัน script หนึ่งครั้ง พิมพ์ stdout/stderr ของ script ระหว่างรัน แล้ว copy ไฟล์ผลลัพธ์ลง output_dir
+def run(service, script, input_paths, output_dir=None, force_rerun=False, render_profile=None):
+    inputs = {}
+    lease = BlobLease()
+    try:
+        for path in input_paths:
+            with open(path, 'rb') as f:
+                inputs[os.path.basename(path)] = service.store_input(os.path.basename(path), f, lease)
+        run_id = service.submit(script, inputs, force_rerun=force_rerun, render_profile=render_profile)
+    except ScriptNotFound as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        lease.release()
+
+    followers = [
+        threading.Thread(target=_copy_log, args=(service, run_id, stream, target), daemon=True)
+        for stream, target in (('stdout', sys.stdout.buffer), ('stderr', sys.stderr.buffer))
+    ]
+    for follower in followers:
+        follower.start()
+    try:
+        job = service.wait(run_id)
+    except KeyboardInterrupt:
+        service.cancel(run_id)
+        job = service.wait(run_id)
+    for follower in followers:
+        follower.join()
+
+    try:
+        info = service.describe(run_id)
+        if job.error:
+            print(f"❌ {job.error}", file=sys.stderr)
+            return 1
+        output_dir = output_dir or f"{os.path.splitext(os.path.basename(script))[0]}_output"
+        for entry in info['outputs']:
+            target = os.path.join(output_dir, entry['path'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(job.temp_dir, entry['path']), target)
+            print(f"📄 {target} ({entry['size']} bytes)", file=sys.stderr)
+        cache = " (cache)" if info.get('cache') == 'hit' else ""
+        print(f"{'✅' if info['returncode'] == 0 else '❌'} {script} exited with {info['returncode']} "
+              f"in {info['run_seconds']:.2f} s{cache}", file=sys.stderr)
+        return info['returncode'] if info['returncode'] is not None else 1
+    finally:
+        service.discard(run_id)
+
+
+def _copy_log(service, run_id, stream, target):
+    for data in service.follow_log(run_id, stream):
+        target.write(data)
+        target.flush()
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="รัน script หนึ่งครั้ง")
+    run_parser.add_argument('script', help="ชื่อ script ในฐานข้อมูล (filename)")
+    run_parser.add_argument('--input', '-i', nargs='+', default=[], metavar='FILE', help="ไฟล์ input ที่วางลง workspace")
+    run_parser.add_argument('--output-dir', '-o', help="โฟลเดอร์ที่ copy ไฟล์ผลลัพธ์ไปเก็บ (ค่าเริ่มต้น: <script>_output)")
+    run_parser.add_argument('--force', action='store_true', help="ไม่ใช้ผลลัพธ์ใน cache")
+    run_parser.add_argument('--render-profile', help="render profile ของกราฟ")
+    run_parser.add_argument('--pool', action='store_true', help="ใช้ worker pool (คุ้มเมื่อรันหลายครั้งใน process เดียว)")
+
+    serve_parser = commands.add_parser('serve', help="เปิด HTTP API")
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=HEADLESS_PORT)
+    serve_parser.add_argument('--no-pool', action='store_true', help="ไม่ใช้ worker pool (cold start ทุกงาน)")
+    args = parser.parse_args(argv)
+
+    for path in getattr(args, 'input', []):
+        if not os.path.isfile(path):
+            print(f"File not found: {path}", file=sys.stderr)
+            return 1
+
+    if args.command == 'run':
+        service = RunService.from_env(pool=WorkerPool() if args.pool else None)
+        return run(service, args.script, args.input, args.output_dir, args.force, args.render_profile)
+
+    # metrics ของ API แยกจากหน้าเว็บ (ไม่เขียนทับไฟล์ metrics ของ main.py) ดูได้ที่ /metrics
+    metrics_registry = MetricsRegistry(export_path=None, port=0)
+    service = RunService.from_env(pool=None if args.no_pool else WorkerPool(), metrics_registry=metrics_registry)
+    return serve(service, args.host, args.port, metrics_registry)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,29 @@
 import streamlit as st
 import pymongo as pm
 import os
+import uuid
+import mimetypes
+from functools import partial, wraps
 from datetime import datetime
 import pandas as pd
-import base64
-from Components.config import init_page_config, load_css, load_mongodb_config, BINARY_EXTENSIONS
+from Components.config import init_page_config, load_css, load_mongodb_config, RUN_POLL_INTERVAL, RENDER_PROFILES, DEFAULT_RENDER_PROFILE, PIPELINE_COLLECTION_NAME, PREVIEW_CACHE_ENTRIES, UPLOAD_DETAIL_PAGE_SIZE, RUN_HISTORY_PAGE_SIZE, RUN_HISTORY_COOKIE, RUN_HISTORY_COOKIE_DAYS
 from Components.script_runner import ScriptRunner
-from Components.file_manager import FileManager
+from Components.file_manager import FileManager, MEMORY_FRAGMENTS
+from Components.worker_pool import WorkerPool
+from Components.scheduler import RunScheduler
+from Components.run_history import RunHistory
+from Components.result_cache import ResultCache
+from Components.script_cache import ScriptCache
+from Components.script_catalog import ScriptCatalog
+from Components.preview import FilePreview
+from Components.thumbnails import ThumbnailService
+from Components.storage_manager import StorageManager
+from Components.gridfs_store import GridFSStore
+from Components.metrics import MetricsRegistry
+from Components.run_policy import RunPolicy
+from Components.manifest import OutputManifest
+from Components.pipeline import PipelineStore, PipelineRunner
+from Components.batch import BatchInputs, BatchRunner
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -33,37 +50,199 @@ if not mongo_db_name or not mongo_collection_name:
     st.error("Environment variables MONGO_DB_NAME or MONGO_COLLECTION_NAME are not set.")
     st.stop()
 
+# Worker pool ที่ import library หนักไว้ล่วงหน้า ใช้ร่วมกันทุก session
+@st.cache_resource
+def init_worker_pool():
+    return WorkerPool()
+
+worker_pool = init_worker_pool()
+
+# ประวัติการรัน (SQLite + ไฟล์ผลลัพธ์บน disk) อยู่ข้ามการ reload หน้าและการ restart server
+@st.cache_resource
+def init_run_history():
+    return RunHistory()
+
+run_history = init_run_history()
+
+# คิวรัน script ใช้ร่วมกันทุก session (จำกัดจำนวนงานที่รันพร้อมกัน) ทุกงานที่จบถูกบันทึกลงประวัติ
+@st.cache_resource
+def init_scheduler():
+    return RunScheduler(history=run_history)
+
+scheduler = init_scheduler()
+
+# cache ผลการรัน script (ใช้ร่วมกันทุก session)
+@st.cache_resource
+def init_result_cache():
+    return ResultCache()
+
+result_cache = init_result_cache()
+
+# สร้างภาพย่อของกราฟใน background (ใช้ร่วมกันทุก session)
+@st.cache_resource
+def init_thumbnail_service():
+    return ThumbnailService()
+
+thumbnail_service = init_thumbnail_service()
+
+# จัดการพื้นที่ของไฟล์ที่ import (โควต้าต่อ session / ทั้งระบบ และปล่อย session ที่ไม่ได้ใช้งาน)
+@st.cache_resource
+def init_storage_manager():
+    return StorageManager()
+
+storage_manager = init_storage_manager()
+
+# metrics ของการรัน (histogram ต่อ script) export เป็นไฟล์/endpoint แบบ Prometheus
+@st.cache_resource
+def init_metrics_registry():
+    return MetricsRegistry()
+
+metrics_registry = init_metrics_registry()
+
+# นามสกุลของกราฟที่แสดงในหน้าผลลัพธ์ และจำนวนคอลัมน์ของภาพย่อ
+PLOT_EXTENSIONS = ['png', 'jpg', 'jpeg', 'svg', 'pdf']
+PLOT_GALLERY_COLUMNS = 3
+
+# ข้อความเมื่อการรันถูกหยุดก่อนจบ (ตาม run_info['stopped'])
+STOP_LABELS = {
+    'timeout': "⏰ หยุดการรันเพราะเกินเวลาที่กำหนด",
+    'cancelled': "🛑 ยกเลิกการรันแล้ว",
+    'output_limit': "📜 หยุดการรันเพราะ output เกินขนาดที่กำหนด",
+    'memory_limit': "🧠 หยุดการรันเพราะใช้ memory เกินที่กำหนด",
+    'cpu_limit': "⚙️ หยุดการรันเพราะใช้ CPU time เกินที่กำหนด",
+}
+
+# สถานะของแต่ละขั้นใน pipeline
+PIPELINE_STATUS_LABELS = {
+    'pending': "⏳ รอ",
+    'running': "🏃 กำลังรัน",
+    'success': "✅ สำเร็จ",
+    'failed': "❌ ล้มเหลว",
+    'skipped': "⏭️ ข้าม",
+    'cancelled': "🛑 ยกเลิก",
+}
+
 db = client[mongo_db_name]
 collection = db[mongo_collection_name]
 
-# Fetch scripts จาก MongoDB
-@st.cache_data(ttl=30)
-def get_data():
+# GridFS สำหรับ content ของ script ขนาดใหญ่และไฟล์ผลลัพธ์ที่เก็บถาวร
+@st.cache_resource
+def init_gridfs_store():
+    return GridFSStore(db)
+
+gridfs_store = init_gridfs_store()
+
+# cache ของ script (ดึงจาก MongoDB ครั้งเดียวต่อเวอร์ชัน และรู้เองเมื่อ mongodb.py อัปเดตเอกสาร)
+@st.cache_resource
+def init_script_cache():
+    return ScriptCache(collection, content_store=gridfs_store)
+
+script_cache = init_script_cache()
+
+# รายการ script แบบค้นหา/แบ่งหน้าฝั่งฐานข้อมูล (ไม่โหลดทั้ง collection)
+@st.cache_resource
+def init_script_catalog():
+    return ScriptCatalog(collection)
+
+script_catalog = init_script_catalog()
+
+# pipeline ของหลาย script (เอกสารใน collection แยก ชื่อตาม MONGO_PIPELINE_COLLECTION_NAME)
+@st.cache_resource
+def init_pipeline_store():
+    return PipelineStore(db[PIPELINE_COLLECTION_NAME])
+
+pipeline_store = init_pipeline_store()
+
+# จำนวน script ทั้งหมดใน MongoDB
+def get_script_count():
     try:
-        scripts = list(collection.find({}, {"filename": 1, "uploaded_at": 1, "size": 1, "file_type": 1}))
-        return scripts
+        return script_catalog.count()
     except Exception as e:
         st.error(f"Error connecting to database: {e}")
-        return []
+        return 0
+
+# รายการ script ที่โหลดแล้วตามคำค้นปัจจุบัน (โหลดทีละหน้าเมื่อผู้ใช้กด 'โหลดเพิ่ม')
+def load_script_page(search, mode, tag, sort, more=False):
+    search_key = (search.strip(), mode, tag, sort, st.session_state.refresh_counter)
+    state = st.session_state.get('script_catalog_state')
+    if state is None or state['key'] != search_key:
+        state = {'key': search_key, 'scripts': {}, 'cursor': None, 'done': False}
+        more = True
+    if more and not state['done']:
+        docs, next_cursor = script_catalog.search(search, mode, tag, sort, after=state['cursor'])
+        for doc in docs:
+            state['scripts'][doc['filename']] = doc
+        state['cursor'] = next_cursor
+        state['done'] = next_cursor is None
+    st.session_state.script_catalog_state = state
+    return state
+
+# ผู้ใช้เดิมเมื่อ reload หน้า: id สำหรับดูประวัติการรันเก็บใน cookie ของ browser (ไม่อยู่ใน URL จึงไม่ติดไปกับลิงก์ที่แชร์)
+# ใช้กับประวัติการรันเท่านั้น ไฟล์ใน Memory / โควต้า / คิวรันผูกกับ user_id ที่สุ่มใหม่ทุก session
+def restore_history_id():
+    try:
+        return uuid.UUID(hex=st.context.cookies.get(RUN_HISTORY_COOKIE, '')).hex
+    except ValueError:
+        return uuid.uuid4().hex
+
+# เขียน (หรือต่ออายุ) cookie ครั้งเดียวต่อ session
+def remember_history_id(history_id):
+    st.html(
+        f"<script>document.cookie = '{RUN_HISTORY_COOKIE}={history_id}; "
+        f"max-age={RUN_HISTORY_COOKIE_DAYS * 24 * 60 * 60}; path=/; SameSite=Strict';</script>",
+        unsafe_allow_javascript=True
+    )
 
 # Initialize Session States
 if 'refresh_counter' not in st.session_state:
     st.session_state.refresh_counter = 0
-if 'imported_files' not in st.session_state:
-    st.session_state.imported_files = {}
 if 'clear_file_uploader' not in st.session_state:
     st.session_state.clear_file_uploader = False
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
 if 'script_error' not in st.session_state:
     st.session_state.script_error = None
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = uuid.uuid4().hex
+if 'history_id' not in st.session_state:
+    st.session_state.history_id = restore_history_id()
+    remember_history_id(st.session_state.history_id)
+if 'current_run_id' not in st.session_state:
+    st.session_state.current_run_id = None
+if 'current_pipeline_run_id' not in st.session_state:
+    st.session_state.current_pipeline_run_id = None
+if 'current_batch_run_id' not in st.session_state:
+    st.session_state.current_batch_run_id = None
+
+# ไฟล์ใน Memory ของผู้ใช้นี้ (เนื้อไฟล์อยู่บน disk จำกัดพื้นที่ผ่าน StorageManager)
+def refresh_imported_files():
+    st.session_state.imported_files = storage_manager.session(st.session_state.user_id)
+
+refresh_imported_files()
+
+# แต่ละส่วนของหน้าเป็น fragment: การกดใน fragment หนึ่ง rerun เฉพาะ fragment นั้น ไม่ใช่ทั้งหน้า
+# วัดเวลาวาดทุกครั้ง (histogram script_runner_ui_render_seconds และค่าล่าสุดใน session ใช้โดย benchmarks/bench_pipeline.py --suites ui)
+def timed_fragment(key):
+    def decorator(func):
+        @wraps(func)
+        def render(*args, **kwargs):
+            # rerun เฉพาะ fragment ไม่ผ่านโค้ดระดับบนสุด บันทึกว่า session ยังใช้งานอยู่ที่นี่ด้วย
+            refresh_imported_files()
+            timing = {}
+            try:
+                with metrics_registry.ui_render(key) as timing:
+                    return func(*args, **kwargs)
+            finally:
+                st.session_state.setdefault('ui_render_ms', {})[key] = timing.get('seconds', 0) * 1000
+        return st.fragment(render, key=key)
+    return decorator
 
 # หน้าหลัก
 st.title("🐍 Python Script Runner")
 st.markdown("โปรแกรมอำนวยความสะดวกในการรันสคริปต์")
 st.markdown("---")
 
-scripts = get_data()
+script_count = get_script_count()
 
 # ======= ส่วน Import Files =======
 st.subheader("📤 Import Files")
@@ -84,314 +263,987 @@ with st.expander("📋 ไฟล์ที่ Scripts ต้องการ", exp
     
     **dendrogram_plot.py และ pcaPlotNormal.py ต้องการ :**
     - `average_smell_sensor_values.csv` - ข้อมูลสำหรับสร้าง Dendrogram และ PCA plot
+    
+    💡 ถ้ามี pipeline ที่ต่อ scripts เหล่านี้ไว้ ใช้ส่วน 🔗 Pipeline ด้านล่างรันทั้งชุดได้ในครั้งเดียว (import แค่ไฟล์ของขั้นแรก)
     """)
 
 st.markdown("")
 
-# File uploader section
-col_upload, col_cancel = st.columns([4, 1])
+# ตารางสรุปไฟล์ที่เลือก (cache ตามชื่อและขนาดของชุดไฟล์ ไม่สร้าง DataFrame ใหม่ทุกครั้งที่ส่วน Import วาดใหม่)
+@st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def upload_summary(files):
+    file_data = []
+    for name, size in files:
+        file_extension = name.split('.')[-1].lower() if '.' in name else 'unknown'
+        file_data.append({
+            "📄 ชื่อไฟล์": name,
+            "📁 ประเภท": file_extension.upper(),
+            "📏 ขนาด (bytes)": size
+        })
+    return pd.DataFrame(file_data)
 
-with col_upload:
-    if st.session_state.clear_file_uploader:
-        st.session_state.clear_file_uploader = False
-        uploaded_files = st.file_uploader("เลือกไฟล์ที่ต้องการ Import :", 
-                                          accept_multiple_files=True,
-                                          key=f"import_files_{st.session_state.uploader_key}", 
-                                          help="รองรับไฟล์ทุกประเภท (txt, py, json, html, css, js, md, csv, log, xlsx, xls, pdf, png, jpg)")
-        st.info("✅ ยกเลิกการเลือกไฟล์แล้ว กรุณาเลือกไฟล์ใหม่")
-    else:
+# File uploader section (เลือก/ดูตัวอย่างไฟล์ rerun เฉพาะส่วนนี้)
+@timed_fragment('import')
+def render_import_section():
+    col_upload, col_cancel = st.columns([4, 1])
+    
+    with col_upload:
         uploaded_files = st.file_uploader("เลือกไฟล์ที่ต้องการ Import :", 
                                           accept_multiple_files=True,
                                           key=f"import_files_{st.session_state.uploader_key}", 
                                           help="รองรับไฟล์ทุกประเภท (txt, py, json, html, css, js, md, csv, log, xlsx, xls, pdf, png, jpg)")
-
-with col_cancel:
-    st.markdown("&nbsp;")
-    if st.button("❌ ยกเลิกการเลือกไฟล์", type="secondary", use_container_width=True):
-        FileManager.clear_file_selection()
-
-# Process uploaded files
-if uploaded_files:
-    st.success(f"✅ เลือกไฟล์แล้ว {len(uploaded_files)} ไฟล์")
+        if st.session_state.clear_file_uploader:
+            st.session_state.clear_file_uploader = False
+            st.info("✅ ยกเลิกการเลือกไฟล์แล้ว กรุณาเลือกไฟล์ใหม่")
     
-    # แสดงสรุปไฟล์ทั้งหมด
-    st.markdown("### 📊 สรุปไฟล์ที่เลือก:")
+    with col_cancel:
+        st.markdown("&nbsp;")
+        st.button("❌ ยกเลิกการเลือกไฟล์", type="secondary", use_container_width=True, on_click=FileManager.clear_file_selection)
     
-    file_data = []
-    for uploaded_file in uploaded_files:
-        file_extension = uploaded_file.name.split('.')[-1].lower() if '.' in uploaded_file.name else 'unknown'
-        file_data.append({
-            "📄 ชื่อไฟล์": uploaded_file.name,
-            "📁 ประเภท": file_extension.upper(),
-            "📏 ขนาด (bytes)": uploaded_file.size
-        })
+    # ผลการเก็บไฟล์จากปุ่มเก็บไฟล์ (callback) รอบก่อน
+    for kind, message in st.session_state.pop('import_notices', []):
+        getattr(st, kind)(message)
     
-    df_files = pd.DataFrame(file_data)
-    st.dataframe(df_files, use_container_width=True)
+    # Process uploaded files
+    if uploaded_files:
+        st.success(f"✅ เลือกไฟล์แล้ว {len(uploaded_files)} ไฟล์")
+        
+        # แสดงสรุปไฟล์ทั้งหมด
+        st.markdown("### 📊 สรุปไฟล์ที่เลือก:")
+        st.dataframe(upload_summary(tuple((f.name, f.size) for f in uploaded_files)), use_container_width=True)
+        
+        # ประมวลผลแต่ละไฟล์ (ตัวอย่างเนื้อหา cache ตาม hash ของไฟล์ใน FilePreview)
+        st.markdown("---")
+        st.markdown("### 📁 รายละเอียดไฟล์แต่ละไฟล์:")
+        
+        # ไฟล์จำนวนมากแบ่งหน้า วาดรายละเอียดเฉพาะไฟล์ในหน้าที่เลือก
+        page_count = -(-len(uploaded_files) // UPLOAD_DETAIL_PAGE_SIZE)
+        first = 0
+        if page_count > 1:
+            page = st.number_input(f"หน้า (ทั้งหมด {page_count} หน้า, หน้าละ {UPLOAD_DETAIL_PAGE_SIZE} ไฟล์)",
+                                   min_value=1, max_value=page_count, value=1, key=f"upload_page_{st.session_state.uploader_key}")
+            first = (page - 1) * UPLOAD_DETAIL_PAGE_SIZE
+        
+        for i, uploaded_file in enumerate(uploaded_files[first:first + UPLOAD_DETAIL_PAGE_SIZE], start=first):
+            with st.expander(f"📄 {uploaded_file.name}", expanded=False):
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    st.metric("📏 File Size", f"{uploaded_file.size} bytes")
+                with col2:
+                    file_extension = uploaded_file.name.split('.')[-1].lower() if '.' in uploaded_file.name else 'unknown'
+                    st.metric("📁 File Type", file_extension)
+                with col3:
+                    st.metric("📄 File Name", uploaded_file.name)
     
-    # ประมวลผลแต่ละไฟล์
-    st.markdown("---")
-    st.markdown("### 📁 รายละเอียดไฟล์แต่ละไฟล์:")
+                try:
+                    FileManager.process_uploaded_file(uploaded_file, i, st.session_state.uploader_key)
+                except Exception as e:
+                    st.error(f"❌ เกิดข้อผิดพลาดในการประมวลผลไฟล์: {e}")
+        
+        # ปุ่มเก็บไฟล์ทั้งหมดพร้อมกัน (วาดส่วน Memory และ Pipeline ใหม่ด้วย)
+        st.markdown("---")
+        st.button("💾 เก็บไฟล์ทั้งหมดใน Memory", type="primary", use_container_width=True, key=f"save_all_{st.session_state.uploader_key}",
+                  on_click=FileManager.save_to_memory, args=(uploaded_files,))
+
+render_import_section()
+
+# ล้างไฟล์ใน Memory (callback ของปุ่ม) แล้ววาดใหม่เฉพาะส่วนที่ใช้รายการไฟล์
+def clear_imported_files():
+    st.session_state.imported_files.clear()
+    st.session_state.import_notices = [('success', "✅ ล้างไฟล์ใน Memory แล้ว")]
+    st.rerun(scope=MEMORY_FRAGMENTS)
+
+# แสดงไฟล์ใน Memory
+@timed_fragment('memory')
+def render_memory_section():
+    if st.session_state.imported_files.evicted:
+        st.warning("⚠️ ไฟล์ใน Memory ถูกล้างแล้วเนื่องจากไม่ได้ใช้งานนานหรือพื้นที่ของระบบเต็ม กรุณา import ไฟล์ใหม่")
+    
+    if st.session_state.imported_files:
+        st.markdown("---")
+        st.subheader("💾 ไฟล์ใน Memory")
+        
+        session_bytes, total_bytes = st.session_state.imported_files.usage()
+        st.caption(
+            f"📦 ใช้พื้นที่ {session_bytes / 1024 ** 2:,.1f} / {storage_manager.session_max_bytes / 1024 ** 2:,.0f} MB "
+            f"(ทั้งระบบ {total_bytes / 1024 ** 2:,.1f} / {storage_manager.global_max_bytes / 1024 ** 2:,.0f} MB)"
+        )
+        st.progress(min(session_bytes / storage_manager.session_max_bytes, 1.0))
+        
+        with st.expander(f"📁 ไฟล์ทั้งหมด ({len(st.session_state.imported_files)} ไฟล์)", expanded=False):
+            for filename, handle in st.session_state.imported_files.items():
+                if handle.is_binary:
+                    st.markdown(f"📄 **{filename}** (Binary file - {handle.size} bytes)")
+                elif handle.encoding and handle.encoding != 'utf-8':
+                    st.markdown(f"📄 **{filename}** (Text file - {handle.size} bytes, แปลงจาก {handle.encoding})")
+                else:
+                    st.markdown(f"📄 **{filename}** (Text file - {handle.size} bytes)")
+        
+        st.button("🗑️ ล้างไฟล์ทั้งหมดใน Memory", type="secondary", use_container_width=True, on_click=clear_imported_files)
+
+render_memory_section()
+
+st.markdown("---")
+
+# ======= ส่วนแสดงผลการรัน =======
+# แสดงสถานะระหว่างรอคิว/กำลังรัน (รันซ้ำเฉพาะส่วนนี้ทุกช่วงเวลา ไม่ rerun ทั้งหน้า)
+@st.fragment(run_every=RUN_POLL_INTERVAL)
+def render_run_progress(run_id):
+    job = scheduler.get(run_id)
+    if job is None or job.is_finished:
+        st.rerun()
+    
+    if job.status == 'cancelled':
+        st.warning("🛑 กำลังยกเลิก...")
+        return
+    if st.button("🛑 Cancel", type="secondary", key=f"cancel_{run_id}"):
+        # kill ทั้ง process group และคืนช่องรันให้งานอื่นทันที
+        scheduler.cancel(run_id)
+        st.rerun()
     
-    for i, uploaded_file in enumerate(uploaded_files):
-        with st.expander(f"📄 {uploaded_file.name}", expanded=False):
-            col1, col2, col3 = st.columns(3)
+    if job.status == 'queued':
+        position = scheduler.queue_position(run_id)
+        position_text = f"ลำดับที่ {position + 1}" if position is not None else ""
+        st.info(f"⏳ รอคิว {position_text} (รอมาแล้ว {job.wait_seconds:.1f} วินาที)")
+    else:
+        st.info(f"🏃 กำลังรันสคริปต์... ({job.run_seconds:.1f} วินาที)")
+        # งานที่มีหลายส่วน (batch) บอกความคืบหน้าเป็น (เสร็จแล้ว, ทั้งหมด)
+        progress = job.run_info.get('progress')
+        if progress and progress[1]:
+            st.progress(progress[0] / progress[1], text=f"{progress[0]}/{progress[1]}")
+        st.code(job.output.stdout.text(), language='text')
+
+# รอภาพย่อที่กำลังสร้างใน background แล้ววาดหน้าใหม่เมื่อครบ
+@st.fragment(run_every=RUN_POLL_INTERVAL)
+def render_thumbnail_progress(plot_files):
+    pending = thumbnail_service.pending(plot_files)
+    if not pending:
+        st.rerun()
+    st.info(f"🖼️ กำลังสร้างภาพย่อ... ({len(plot_files) - len(pending)}/{len(plot_files)})")
+
+# แสดงกราฟเป็นภาพย่อ (ภาพเต็มแสดงเมื่อเปิดสวิตช์ของภาพนั้น)
+def render_plot_gallery(run_id, plot_files):
+    columns = st.columns(PLOT_GALLERY_COLUMNS)
+    full_size = []
+    for index, plot_file in enumerate(plot_files):
+        filename = os.path.basename(plot_file)
+        if 'radar_chart_' in filename:
+            caption = f"Radar Chart: {filename}"
+        else:
+            caption = f"Generated Plot: {filename}"
+        
+        with columns[index % PLOT_GALLERY_COLUMNS]:
+            if ThumbnailService.is_raster(plot_file):
+                st.image(thumbnail_service.get(plot_file), caption=caption, use_container_width=True)
+            elif plot_file.endswith('.svg'):
+                st.image(plot_file, caption=caption, use_container_width=True)
+            else:
+                st.markdown(f"📄 {caption}")
             
-            with col1:
-                st.metric("📏 File Size", f"{uploaded_file.size} bytes")
-            with col2:
-                file_extension = uploaded_file.name.split('.')[-1].lower() if '.' in uploaded_file.name else 'unknown'
-                st.metric("📁 File Type", file_extension)
-            with col3:
-                st.metric("📄 File Name", uploaded_file.name)
+            if ThumbnailService.is_raster(plot_file):
+                if st.toggle("🔍 ดูขนาดเต็ม", key=f"full_plot_{run_id}_{index}"):
+                    full_size.append((plot_file, caption))
+            st.download_button(
+                label="📥 ดาวน์โหลด",
+                data=partial(FileManager.read_file_bytes, plot_file),
+                file_name=filename,
+                mime=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                key=f"download_plot_{run_id}_{index}"
+            )
+    
+    for plot_file, caption in full_size:
+        st.image(plot_file, caption=caption, use_container_width=True)
 
-            try:
-                FileManager.process_uploaded_file(uploaded_file, i, st.session_state.uploader_key)
-            except Exception as e:
-                st.error(f"❌ เกิดข้อผิดพลาดในการประมวลผลไฟล์: {e}")
+# แสดงผลลัพธ์ของงานที่รันจบแล้ว
+def render_run_result(job):
+    if job.status == 'failed':
+        st.error(f"❌ เกิดข้อผิดพลาดในการรันสคริปต์: {job.error}")
+        return
+    if job.result is None:
+        # ยกเลิกขณะรอคิว
+        st.warning(STOP_LABELS['cancelled'])
+        return
     
-    # ปุ่มเก็บไฟล์ทั้งหมดพร้อมกัน
-    st.markdown("---")
+    stdout, stderr, returncode, temp_dir = job.result
+    output = job.output
+    run_info = job.run_info
+    run_metrics = run_info.get('metrics')
+    script_name = job.label
+    generated_files = []
     
-    if st.button("💾 เก็บไฟล์ทั้งหมดใน Memory", type="primary", use_container_width=True, key=f"save_all_{st.session_state.uploader_key}"):
-        success_count = 0
-        error_count = 0
+    st.caption(
+        f"⏱️ รอคิว {job.wait_seconds:.2f} วินาที (มีงานรออยู่ก่อน {job.queue_depth} งาน) · "
+        f"เวลารัน {job.run_seconds:.2f} วินาที"
+    )
+    if run_info.get('cache') == 'hit':
+        st.caption("🗃️ ใช้ผลลัพธ์จาก cache (script และไฟล์ input เหมือนครั้งก่อน) ติ๊ก 'บังคับรันใหม่' เพื่อรันจริง")
+    elif run_info.get('mode') == 'pool':
+        st.caption(f"⚡ รันผ่าน Worker Pool (ประหยัดเวลาเริ่มต้นได้ประมาณ {run_info['startup_saved_seconds']:.2f} วินาที)")
+    if run_info.get('render_profile'):
+        st.caption(f"🎨 Render profile: {run_info['render_profile']}")
+    if run_info.get('stopped'):
+        st.warning(STOP_LABELS.get(run_info['stopped'], run_info['stopped']))
+    
+    # log เต็มอยู่ในไฟล์ อ่านเมื่อผู้ใช้กดดาวน์โหลดเท่านั้น
+    for capture, label in ((output.stdout, "stdout"), (output.stderr, "stderr")):
+        if capture.truncated:
+            st.download_button(
+                label=f"📥 ดาวน์โหลด {label} เต็ม ({capture.line_count:,} บรรทัด)",
+                data=partial(FileManager.read_file_bytes, capture.spill_path),
+                file_name=f"{script_name.replace('.py', '')}_{label}.log",
+                mime="text/plain",
+                key=f"download_{label}_log_{job.run_id}"
+            )
+    
+    if returncode == 0:
+        st.success("✅ รันสคริปต์สำเร็จ!")
         
-        for uploaded_file in uploaded_files:
-            try:
-                file_extension = uploaded_file.name.split('.')[-1].lower() if '.' in uploaded_file.name else 'unknown'
-                uploaded_file.seek(0)
-                
-                if file_extension in BINARY_EXTENSIONS:
-                    binary_content = base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
-                    st.session_state.imported_files[uploaded_file.name] = f"__BINARY__{binary_content}"
-                    success_count += 1
+        if stdout.strip():
+            st.subheader("📤 Output:")
+            with st.container():
+                st.code(stdout, language='text')
+        
+        # ดึงไฟล์จาก temp directory
+        if temp_dir:
+            with metrics_registry.ui_phase(script_name, run_metrics, 'discover'):
+                # ไฟล์ที่ script สร้าง/แก้ไขจาก manifest ของ harness (ไม่มี manifest จะ scan แล้วตัดไฟล์ input ออก)
+                outputs = OutputManifest.outputs(temp_dir, st.session_state.imported_files.keys())
+            
+            # ผลลัพธ์ของ pipeline บอกขั้นที่สร้างไฟล์ด้วย
+            output_sites = {
+                os.path.join(temp_dir, item['path']): f"{item['step']} {item.get('site') or ''}".strip() if item.get('step') else item.get('site')
+                for item in outputs
+            }
+            plot_files = [path for path in output_sites if path.rsplit('.', 1)[-1].lower() in PLOT_EXTENSIONS]
+            csv_files = [path for path in output_sites if path.endswith('.csv')]
+            columnar_files = [os.path.join(temp_dir, item['path']) for item in outputs if item['type'] == 'columnar']
+            other_files = [path for path in output_sites if path not in plot_files and path not in csv_files and path not in columnar_files]
+            
+            # แสดง plots
+            if plot_files:
+                st.subheader("📊 Generated Plots:")
+                plot_files = sorted(plot_files)
+                generated_files.extend(plot_files)
+                # แสดงภาพย่อก่อน ภาพเต็มโหลดเมื่อผู้ใช้เปิดดูหรือดาวน์โหลดเท่านั้น
+                if thumbnail_service.pending(plot_files):
+                    render_thumbnail_progress(tuple(plot_files))
                 else:
-                    try:
-                        content = uploaded_file.read().decode('utf-8')
-                        st.session_state.imported_files[uploaded_file.name] = content
-                        success_count += 1
-                    except UnicodeDecodeError:
-                        uploaded_file.seek(0)
-                        binary_content = base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
-                        st.session_state.imported_files[uploaded_file.name] = f"__BINARY__{binary_content}"
-                        success_count += 1
+                    render_plot_gallery(job.run_id, plot_files)
+            
+            # แสดง CSV files
+            if csv_files:
+                st.subheader("📄 Generated CSV Files:")
+                with metrics_registry.ui_phase(script_name, run_metrics, 'preview'):
+                    for csv_file in csv_files:
+                        csv_filename = os.path.relpath(csv_file, temp_dir)
+                        generated_files.append(csv_file)
+                        st.info(f"📊 Created: {csv_filename}")
                         
-            except Exception as e:
-                error_count += 1
-                st.error(f"❌ ไม่สามารถเก็บไฟล์ {uploaded_file.name}: {e}")
+                        try:
+                            df_preview = FilePreview.csv_head(FilePreview.file_key(csv_file), csv_file)
+                            with st.expander(f"👁️ Preview: {csv_filename}", expanded=False):
+                                st.dataframe(df_preview, use_container_width=True)
+                                if st.checkbox("🔢 นับจำนวนแถว", key=f"count_rows_{job.run_id}_{csv_filename}"):
+                                    st.caption(f"จำนวนแถว: {FilePreview.csv_row_count(FilePreview.file_key(csv_file), csv_file):,}")
+                        except:
+                            pass
+            
+            # แสดงไฟล์ Parquet / Feather / Arrow (อ่านเฉพาะ row group / record batch แรกผ่าน memory map)
+            if columnar_files:
+                st.subheader("🧱 Generated Columnar Files:")
+                with metrics_registry.ui_phase(script_name, run_metrics, 'preview'):
+                    for columnar_file in columnar_files:
+                        columnar_filename = os.path.relpath(columnar_file, temp_dir)
+                        extension = columnar_file.rsplit('.', 1)[-1].lower()
+                        generated_files.append(columnar_file)
+                        st.info(f"🧱 Created: {columnar_filename}")
+                        
+                        try:
+                            df_preview, column_count = FilePreview.columnar_head(FilePreview.file_key(columnar_file), columnar_file, extension)
+                            with st.expander(f"👁️ Preview: {columnar_filename} ({column_count} คอลัมน์)", expanded=False):
+                                st.dataframe(df_preview, use_container_width=True)
+                                if st.checkbox("🔢 นับจำนวนแถว", key=f"count_rows_{job.run_id}_{columnar_filename}"):
+                                    row_count = FilePreview.columnar_row_count(FilePreview.file_key(columnar_file), columnar_file, extension)
+                                    st.caption(f"จำนวนแถว: {row_count:,}")
+                        except Exception as e:
+                            st.warning(f"⚠️ ไม่สามารถแสดงตัวอย่าง {columnar_filename}: {e}")
+                        
+                        # ส่งต่อเป็น input ของการรันถัดไปโดยไม่ต้องดาวน์โหลดแล้ว import ใหม่
+                        st.button(
+                            "➡️ ใช้เป็น input ของการรันถัดไป", key=f"use_output_{job.run_id}_{columnar_filename}",
+                            on_click=FileManager.save_output_to_memory, args=(columnar_file, os.path.basename(columnar_file))
+                        )
+                        notice = st.session_state.get('output_notices', {}).pop(columnar_file, None)
+                        if notice:
+                            getattr(st, notice[0])(notice[1])
+            
+            # ไฟล์ผลลัพธ์อื่นๆ (Excel, text ฯลฯ) รวมอยู่ใน ZIP ด้วย
+            generated_files.extend(other_files)
+            
+            # ส่วนดาวน์โหลด ZIP
+            if generated_files:
+                st.markdown("---")
+                st.subheader("📦 Download Generated Files")
+                
+                st.markdown("**ไฟล์ที่จะรวมใน ZIP:**")
+                for file_path in generated_files:
+                    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                    site = f" · สร้างที่ {output_sites[file_path]}" if output_sites.get(file_path) else ""
+                    st.markdown(f"- 📄 `{os.path.relpath(file_path, temp_dir)}` ({file_size} bytes){site}")
+                
+                try:
+                    # สร้าง ZIP เมื่อผู้ใช้กดดาวน์โหลดเท่านั้น (ไม่เก็บ bytes ของ ZIP ไว้ใน session)
+                    zip_data = partial(
+                        metrics_registry.timed_call, script_name, run_metrics, 'zip',
+                        FileManager.create_zip_from_files, generated_files, temp_dir
+                    )
+                    
+                    timestamp = datetime.fromtimestamp(job.finished_at).strftime("%Y%m%d_%H%M%S")
+                    zip_filename = f"{script_name.replace('.py', '')}_output_{timestamp}.zip"
+                    
+                    st.download_button(
+                        label="📦 ดาวน์โหลดไฟล์ทั้งหมด (ZIP)",
+                        data=zip_data,
+                        file_name=zip_filename,
+                        mime="application/zip",
+                        type="primary",
+                        use_container_width=True,
+                        key=f"download_zip_{job.run_id}"
+                    )
+                    
+                    st.success(f"✅ พร้อมดาวน์โหลด! ไฟล์ ZIP จะมีชื่อ: `{zip_filename}`")
+                    
+                except Exception as e:
+                    st.error(f"❌ เกิดข้อผิดพลาดในการสร้าง ZIP file: {e}")
+                
+                # เก็บไฟล์ผลลัพธ์ไว้ใน GridFS (temp directory ถูกลบเมื่อรันใหม่)
+                if st.button("🗄️ เก็บไฟล์ผลลัพธ์ไว้ในฐานข้อมูล", use_container_width=True, key=f"save_artifacts_{job.run_id}"):
+                    try:
+                        saved = gridfs_store.save_artifacts(job.run_id, generated_files, temp_dir, script=script_name)
+                        st.success(f"✅ เก็บไฟล์ในฐานข้อมูลแล้ว {saved} ไฟล์")
+                    except Exception as e:
+                        st.error(f"❌ ไม่สามารถเก็บไฟล์ในฐานข้อมูล: {e}")
+        
+        if not stdout.strip() and not generated_files:
+            st.info("ไม่มี output จากสคริปต์")
+            
+    else:
+        st.error("❌ เกิดข้อผิดพลาดในการรันสคริปต์")
         
-        if success_count > 0:
-            st.success(f"✅ เก็บไฟล์สำเร็จ {success_count} ไฟล์")
-        if error_count > 0:
-            st.error(f"❌ เก็บไฟล์ไม่สำเร็จ {error_count} ไฟล์")
+        if stderr.strip():
+            st.session_state.script_error = stderr
 
-# แสดงไฟล์ใน Memory
-if st.session_state.imported_files:
-    st.markdown("---")
-    st.subheader("💾 ไฟล์ใน Memory")
+# แสดงเวลาแต่ละขั้นตอนและการใช้ทรัพยากรของการรัน
+def render_run_metrics(job):
+    run_metrics = job.run_info.get('metrics')
+    if run_metrics is None or not run_metrics.phases:
+        return
     
-    with st.expander(f"📁 ไฟล์ทั้งหมด ({len(st.session_state.imported_files)} ไฟล์)", expanded=False):
-        for filename, content in st.session_state.imported_files.items():
-            if content.startswith("__BINARY__"):
-                st.markdown(f"📄 **{filename}** (Binary file - {len(content)} characters)")
-            else:
-                st.markdown(f"📄 **{filename}** (Text file - {len(content)} characters)")
+    with st.expander(f"⏱️ เวลาและทรัพยากรที่ใช้ (รวม {run_metrics.total_seconds:.2f} วินาที)", expanded=False):
+        st.dataframe(pd.DataFrame(run_metrics.rows()), use_container_width=True, hide_index=True)
+        resources = run_metrics.resources
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("🧠 Max RSS", f"{resources['max_rss_bytes'] / 1024 ** 2:,.1f} MB" if 'max_rss_bytes' in resources else "-")
+        with col2:
+            st.metric("⚙️ User CPU", f"{resources['user_cpu_seconds']:.2f} s" if 'user_cpu_seconds' in resources else "-")
+        with col3:
+            st.metric("🖥️ System CPU", f"{resources['system_cpu_seconds']:.2f} s" if 'system_cpu_seconds' in resources else "-")
+        with col4:
+            written = resources.get('workspace_bytes_written')
+            st.metric("💾 เขียนลง Workspace", f"{written / 1024 ** 2:,.2f} MB" if written is not None else "-")
+        if job.run_info.get('mode') == 'pool':
+            st.caption("Max RSS ของงานที่รันผ่าน Worker Pool รวม memory ของ library ที่ worker โหลดไว้ก่อน fork")
+
+# แสดงสถานะ เวลา และ output ของแต่ละขั้นใน pipeline
+def render_pipeline_report(job):
+    report = job.run_info.get('pipeline')
+    if not report:
+        return
     
-    if st.button("🗑️ ล้างไฟล์ทั้งหมดใน Memory", type="secondary", use_container_width=True):
-        st.session_state.imported_files = {}
-        st.success("✅ ล้างไฟล์ใน Memory แล้ว")
-        st.rerun()
+    st.markdown("**🔗 ขั้นตอนของ Pipeline:**")
+    rows = []
+    for name, step in report['steps'].items():
+        rows.append({
+            "ขั้น": name,
+            "Script": step['script'],
+            "สถานะ": PIPELINE_STATUS_LABELS.get(step['status'], step['status']),
+            "รอขั้น": ", ".join(step['depends_on']) or "-",
+            "เวลา (วินาที)": f"{step['seconds']:.2f}" if step.get('seconds') is not None else "-",
+            "หมายเหตุ": step.get('error') or "",
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    if report.get('seconds') is not None:
+        st.caption(f"⏱️ รวม {report['seconds']:.2f} วินาที (ขั้นที่ไม่ขึ้นต่อกันรันพร้อมกัน)")
+    
+    for name, step in report['steps'].items():
+        if not step.get('stdout', '').strip() and not step.get('stderr', '').strip():
+            continue
+        with st.expander(f"📤 Output: {name} ({step['script']})", expanded=step['status'] == 'failed'):
+            if step.get('stdout', '').strip():
+                st.code(step['stdout'], language='text')
+            if step.get('stderr', '').strip():
+                st.code(step['stderr'], language='text', wrap_lines=True)
 
-st.markdown("---")
+# แสดงผลของแต่ละ item ใน batch และ ZIP ผลลัพธ์ทั้งหมด (ดาวน์โหลดได้แม้บาง item ล้มเหลว)
+def render_batch_report(job):
+    if job.status == 'failed':
+        st.error(f"❌ เกิดข้อผิดพลาดในการรัน batch: {job.error}")
+        return
+    if job.result is None:
+        st.warning(STOP_LABELS['cancelled'])
+        return
+    
+    stdout, stderr, returncode, temp_dir = job.result
+    report = job.run_info.get('batch') or {'items': {}}
+    items = report['items']
+    statuses = [item['status'] for item in items.values()]
+    success_count = statuses.count('success')
+    
+    if job.run_info.get('stopped'):
+        st.warning(STOP_LABELS.get(job.run_info['stopped'], job.run_info['stopped']))
+    if items and success_count == len(items):
+        st.success(f"✅ รันสำเร็จครบทั้ง {len(items)} ชุด")
+    elif success_count:
+        st.warning(f"⚠️ สำเร็จ {success_count} จาก {len(items)} ชุด")
+    else:
+        st.error("❌ ไม่มีชุดใดรันสำเร็จ")
+    if report.get('seconds') is not None:
+        st.caption(f"⏱️ รวม {report['seconds']:.2f} วินาที (รันพร้อมกันสูงสุด {report['parallel']} ชุด)")
+    
+    rows = []
+    for name, item in items.items():
+        rows.append({
+            "ชุด": name,
+            "สถานะ": PIPELINE_STATUS_LABELS.get(item['status'], item['status']),
+            "เวลา (วินาที)": f"{item['seconds']:.2f}" if item.get('seconds') is not None else "-",
+            "ไฟล์ผลลัพธ์": len(item.get('outputs', [])),
+            "หมายเหตุ": item.get('error') or "",
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    
+    for name, item in items.items():
+        if item['status'] == 'failed' and item.get('stderr', '').strip():
+            with st.expander(f"🚨 Error: {name}", expanded=False):
+                st.code(item['stderr'], language='text', wrap_lines=True)
+    if stderr.strip() and not items:
+        st.code(stderr, language='text', wrap_lines=True)
+    
+    outputs = OutputManifest.outputs(temp_dir)
+    if outputs:
+        archive_files = [os.path.join(temp_dir, entry['path']) for entry in outputs]
+        timestamp = datetime.fromtimestamp(job.finished_at).strftime("%Y%m%d_%H%M%S")
+        zip_filename = f"{job.label.replace('.py', '')}_batch_{timestamp}.zip"
+        st.caption(f"📦 ZIP มีโฟลเดอร์ของแต่ละชุด, logs/ ของทุกชุด และ batch_report.json ({len(archive_files)} ไฟล์)")
+        st.download_button(
+            label="📦 ดาวน์โหลดผลลัพธ์ทั้งหมด (ZIP)",
+            data=partial(
+                metrics_registry.timed_call, job.label, job.run_info.get('metrics'), 'zip',
+                FileManager.create_zip_from_files, archive_files, temp_dir
+            ),
+            file_name=zip_filename,
+            mime="application/zip",
+            type="primary",
+            use_container_width=True,
+            key=f"download_batch_zip_{job.run_id}"
+        )
+
+# แสดงไฟล์ผลลัพธ์ของ script ที่เก็บไว้ใน GridFS (อ่านเนื้อไฟล์เมื่อเปิดตัวอย่างหรือกดดาวน์โหลดเท่านั้น)
+def render_stored_artifacts(script_name):
+    try:
+        artifacts = gridfs_store.list_artifacts(script=script_name, limit=20)
+    except Exception as e:
+        st.error(f"❌ ไม่สามารถดึงรายการไฟล์ที่เก็บไว้: {e}")
+        return
+    if not artifacts:
+        return
+    
+    with st.expander(f"🗄️ ไฟล์ผลลัพธ์ที่เก็บไว้ในฐานข้อมูล ({len(artifacts)} ไฟล์ล่าสุด)", expanded=False):
+        for artifact in artifacts:
+            file_id = str(artifact._id)
+            uploaded = artifact.upload_date.strftime('%Y-%m-%d %H:%M')
+            col_name, col_download = st.columns([4, 1])
+            with col_name:
+                st.markdown(f"📄 `{artifact.filename}` ({artifact.length:,} bytes, {uploaded})")
+                if artifact.filename.endswith('.csv') and st.checkbox("👁️ Preview", key=f"preview_artifact_{file_id}"):
+                    try:
+                        st.dataframe(FilePreview.csv_head(f"gridfs:{file_id}", artifact), use_container_width=True)
+                    except Exception as e:
+                        st.error(f"❌ ไม่สามารถแสดงตัวอย่างไฟล์: {e}")
+            with col_download:
+                st.download_button(
+                    label="📥 ดาวน์โหลด",
+                    data=partial(gridfs_store.read_artifact, artifact._id),
+                    file_name=os.path.basename(artifact.filename),
+                    mime=mimetypes.guess_type(artifact.filename)[0] or "application/octet-stream",
+                    key=f"download_artifact_{file_id}"
+                )
 
 # ======= ส่วนเลือกและรัน Scripts =======
-if scripts: 
-    st.subheader("📂 เลือก Scripts")
-    
-    st.markdown("")
-    st.markdown("📝 **วิธีการ Run Script :**")
-    st.markdown("- เลือก Script ที่ต้องการจะ run จาก dropdown ด้านล่าง")  
-    st.markdown("- 👁️ ดูเนื้อหาไฟล์เพื่อ ReCheck อีกรอบ")
-    st.markdown("- กดปุ่ม 'Run Script' เพื่อรันสคริปต์")
-    st.markdown("- หากเกิดข้อผิดพลาด จะมีรายละเอียดแสดงด้านล่าง")
-    st.markdown("- 📊 กราฟและรูปภาพที่สร้างจะแสดงด้านล่างโดยอัตโนมัติ")
-    st.markdown("")
-    
-    script_options = ["..."] + [script['filename'] for script in scripts]
-
-    col1, col2 = st.columns([3, 1])
-
-    with col1:
-        st.markdown("**เลือก Scripts ที่ต้องการ :**")
-        selected_script = st.selectbox(
-            "เลือกไฟล์",
-            script_options,
-            key=f"script_selector_{st.session_state.refresh_counter}",
-            label_visibility="hidden"
-        )
+# ค้นหา/เลือก/รัน script และผลลัพธ์ rerun เฉพาะส่วนนี้ (งานที่รันจบแล้ววาดทั้งหน้าใหม่ครั้งเดียว)
+@timed_fragment('scripts')
+def render_script_section():
+    if script_count:
+        st.subheader("📂 เลือก Scripts")
+    
+        st.markdown("")
+        st.markdown("📝 **วิธีการ Run Script :**")
+        st.markdown("- เลือก Script ที่ต้องการจะ run จาก dropdown ด้านล่าง")  
+        st.markdown("- 👁️ ดูเนื้อหาไฟล์เพื่อ ReCheck อีกรอบ")
+        st.markdown("- กดปุ่ม 'Run Script' เพื่อรันสคริปต์")
+        st.markdown("- หากเกิดข้อผิดพลาด จะมีรายละเอียดแสดงด้านล่าง")
+        st.markdown("- 📊 กราฟและรูปภาพที่สร้างจะแสดงด้านล่างโดยอัตโนมัติ")
+        st.markdown("")
+    
+        # ค้นหา script (ค้นหาและแบ่งหน้าฝั่งฐานข้อมูล)
+        col_search, col_mode, col_tag, col_sort = st.columns([3, 1, 1, 1])
+        with col_search:
+            script_search = st.text_input("🔎 ค้นหา Script", placeholder="พิมพ์ชื่อไฟล์...", key="script_search")
+        with col_mode:
+            search_mode = st.radio(
+                "วิธีค้นหา", ['prefix', 'text'],
+                format_func=lambda mode: "ขึ้นต้นด้วย" if mode == 'prefix' else "คำในชื่อ/คำอธิบาย/tag",
+                key="script_search_mode"
+            )
+        with col_tag:
+            try:
+                tag_options = script_catalog.tags()
+            except Exception:
+                tag_options = []
+            script_tag = st.selectbox("🏷️ Tag", [None] + tag_options, format_func=lambda tag: "ทั้งหมด" if tag is None else tag, key="script_tag")
+        with col_sort:
+            script_sort = st.selectbox(
+                "เรียงตาม", ['filename', 'uploaded_at'],
+                format_func=lambda sort: "ชื่อไฟล์" if sort == 'filename' else "อัปโหลดล่าสุด",
+                key="script_sort"
+            )
+    
+        try:
+            catalog_state = load_script_page(script_search, search_mode, script_tag, script_sort)
+            match_count = script_catalog.count(script_search, search_mode, script_tag)
+        except Exception as e:
+            st.error(f"Error connecting to database: {e}")
+            catalog_state = {'scripts': {}, 'done': True}
+            match_count = 0
+        script_options = ["..."] + list(catalog_state['scripts'])
+        # script ที่เลือกไว้แล้วยังอยู่ในตัวเลือกแม้จะไม่อยู่ในผลการค้นหาใหม่
+        current_selection = st.session_state.get(f"script_selector_{st.session_state.refresh_counter}")
+        if current_selection and current_selection not in script_options:
+            script_options.append(current_selection)
 
-    with col2:
-        st.markdown("&nbsp;")
-        if st.button("🔄 Refresh", type="secondary", use_container_width=True):
-            st.cache_data.clear()
-            st.session_state.refresh_counter += 1
-            if 'script_error' in st.session_state:
-                st.session_state.script_error = None
-            st.rerun()
-    
-    # แสดงรายละเอียดไฟล์และรัน script
-    if selected_script and selected_script != "...":
-        selected_script_data = next((s for s in scripts if s['filename'] == selected_script), None)
+        col1, col2 = st.columns([3, 1])
+
+        with col1:
+            st.markdown("**เลือก Scripts ที่ต้องการ :**")
+            selected_script = st.selectbox(
+                "เลือกไฟล์",
+                script_options,
+                key=f"script_selector_{st.session_state.refresh_counter}",
+                label_visibility="hidden"
+            )
+            st.caption(f"พบ {match_count:,} จาก {script_count:,} scripts (แสดง {len(catalog_state['scripts']):,} รายการ)")
+
+        with col2:
+            st.markdown("&nbsp;")
+            if st.button("🔄 Refresh", type="secondary", use_container_width=True):
+                st.cache_data.clear()
+                script_cache.refresh()
+                script_catalog.refresh()
+                st.session_state.refresh_counter += 1
+                if 'script_error' in st.session_state:
+                    st.session_state.script_error = None
+                st.rerun()
+            if not catalog_state['done']:
+                if st.button("⬇️ โหลดเพิ่ม", use_container_width=True):
+                    load_script_page(script_search, search_mode, script_tag, script_sort, more=True)
+                    st.rerun()
+    
+        # แสดงรายละเอียดไฟล์และรัน script
+        if selected_script and selected_script != "...":
+            # เอกสารของ script ที่เลือกมาจากหน้าที่โหลดไว้แล้ว (ค้นจาก dict ไม่ต้องไล่ทั้งรายการ)
+            selected_script_data = catalog_state['scripts'].get(selected_script) or script_catalog.get(selected_script)
         
-        if selected_script_data:
-            st.markdown("---")
-            st.subheader(f"📄 {selected_script}")
+            if selected_script_data:
+                st.markdown("---")
+                st.subheader(f"📄 {selected_script}")
             
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("📏 File Size", f"{selected_script_data.get('size', 'Unknown')} bytes")
-            with col2:
-                st.metric("📁 File Type", selected_script_data.get('file_type', 'Unknown'))
-            with col3:
-                upload_date = selected_script_data.get('uploaded_at', 'Unknown')
-                if upload_date != 'Unknown':
-                    st.metric("📅 Uploaded", upload_date.strftime('%Y-%m-%d'))
-                else:
-                    st.metric("📅 Uploaded", "Unknown")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("📏 File Size", f"{selected_script_data.get('size', 'Unknown')} bytes")
+                with col2:
+                    st.metric("📁 File Type", selected_script_data.get('file_type', 'Unknown'))
+                with col3:
+                    upload_date = selected_script_data.get('uploaded_at', 'Unknown')
+                    if upload_date != 'Unknown':
+                        st.metric("📅 Uploaded", upload_date.strftime('%Y-%m-%d'))
+                    else:
+                        st.metric("📅 Uploaded", "Unknown")
         
-        script_doc = collection.find_one({"filename": selected_script})
-        if script_doc and 'content' in script_doc:
-            with st.expander("👁️ ดูเนื้อหาไฟล์", expanded=False):
-                st.code(script_doc['content'], language='python')
+            script_doc = script_cache.get_script(selected_script)
+            if script_doc and 'content' in script_doc:
+                with st.expander("👁️ ดูเนื้อหาไฟล์", expanded=False):
+                    st.code(script_doc['content'], language='python')
                 
-            st.markdown("---")
+                st.markdown("---")
             
-            col1, col2, col3 = st.columns([2, 2, 2])
+                col1, col2, col3 = st.columns([2, 2, 2])
             
-            with col1:
-                if st.button("🚀 Run Script", type="primary", use_container_width=True):
-                    st.markdown("### 📊 Script Output")
-                    
-                    temp_dir = None
-                    generated_files = []
+                with col2:
+                    force_rerun = st.checkbox("🔁 บังคับรันใหม่", help="ไม่ใช้ผลลัพธ์ที่เคยรันไว้ใน cache")
+                    # ค่าเริ่มต้นมาจาก field render_profile ของ script (ถ้ามี)
+                    profile_names = list(RENDER_PROFILES)
+                    default_profile = script_doc.get('render_profile', DEFAULT_RENDER_PROFILE)
+                    render_profile = st.selectbox(
+                        "🎨 รูปแบบกราฟ",
+                        profile_names,
+                        index=profile_names.index(default_profile) if default_profile in profile_names else 0,
+                        format_func=lambda name: f"{name} ({RENDER_PROFILES[name]['format'].upper()}, {RENDER_PROFILES[name]['dpi']} dpi)",
+                        key=f"render_profile_{selected_script}",
+                        help="ใช้กับกราฟที่บันทึกจาก plt.show() เมื่อรันพร้อมไฟล์ที่ import"
+                    )
+            
+                # ข้อจำกัดของการรันมาจาก field run_policy ของ script (ไม่มีใช้ค่าเริ่มต้นจาก config)
+                run_policy = RunPolicy.from_document(script_doc)
+            
+                with col1:
+                    if st.button("🚀 Run Script", type="primary", use_container_width=True):
+                        # ส่งงานเข้าคิวแล้วได้ run_id กลับทันที ไม่ block หน้าเว็บระหว่างรัน
+                        if st.session_state.current_run_id:
+                            scheduler.discard(st.session_state.current_run_id)
                     
-                    with st.spinner("กำลังรันสคริปต์..."):
-                        # รัน script
-                        if st.session_state.imported_files:
-                            stdout, stderr, returncode, temp_dir = ScriptRunner.run_script_with_memory_files(
-                                script_doc['content'], 
-                                selected_script,
-                                st.session_state.imported_files
+                        imported_files = dict(st.session_state.imported_files)
+                        if imported_files:
+                            run_id = scheduler.submit(
+                                st.session_state.user_id, selected_script,
+                                ScriptRunner.run_script_with_memory_files,
+                                script_doc['content'], selected_script, imported_files,
+                                pool=worker_pool, result_cache=result_cache, force_rerun=force_rerun,
+                                render_profile=render_profile, metrics_registry=metrics_registry, policy=run_policy,
+                                history_user=st.session_state.history_id
                             )
                         else:
-                            stdout, stderr, returncode, temp_dir = ScriptRunner.run_script(
-                                script_doc['content'], 
-                                selected_script
+                            run_id = scheduler.submit(
+                                st.session_state.user_id, selected_script,
+                                ScriptRunner.run_script,
+                                script_doc['content'], selected_script,
+                                pool=worker_pool, result_cache=result_cache, force_rerun=force_rerun,
+                                metrics_registry=metrics_registry, policy=run_policy,
+                                history_user=st.session_state.history_id
                             )
-                        
-                        if returncode == 0:
-                            st.success("✅ รันสคริปต์สำเร็จ!")
-                            st.session_state.script_error = None
-                            
-                            if stdout.strip():
-                                st.subheader("📤 Output:")
-                                with st.container():
-                                    st.code(stdout, language='text')
-                            
-                            # ดึงไฟล์จาก temp directory
-                            if temp_dir:
-                                temp_files = FileManager.get_files_from_temp_dir(temp_dir)
-                                
-                                plot_files = [f for f in temp_files if f.endswith('.png') and ('plot_' in os.path.basename(f) or 'radar_chart_' in os.path.basename(f))]
-                                csv_files = [f for f in temp_files if f.endswith('.csv')]
-                                
-                                # แสดง plots
-                                if plot_files:
-                                    st.subheader("📊 Generated Plots:")
-                                    for plot_file in sorted(plot_files):
-                                        generated_files.append(plot_file)
-                                        with st.container():
-                                            filename = os.path.basename(plot_file)
-                                            if 'radar_chart_' in filename:
-                                                caption = f"Radar Chart: {filename}"
-                                            else:
-                                                caption = f"Generated Plot: {filename}"
-                                            st.image(plot_file, caption=caption, use_container_width=True)
-                                
-                                # แสดง CSV files
-                                if csv_files:
-                                    st.subheader("📄 Generated CSV Files:")
-                                    for csv_file in csv_files:
-                                        csv_filename = os.path.basename(csv_file)
-                                        if csv_filename not in st.session_state.imported_files.keys():
-                                            generated_files.append(csv_file)
-                                            st.info(f"📊 Created: {csv_filename}")
-                                            
-                                            try:
-                                                df_preview = pd.read_csv(csv_file)
-                                                with st.expander(f"👁️ Preview: {csv_filename}", expanded=False):
-                                                    st.dataframe(df_preview.head(10), use_container_width=True)
-                                            except:
-                                                pass
-                                
-                                # ส่วนดาวน์โหลด ZIP
-                                if generated_files:
-                                    st.markdown("---")
-                                    st.subheader("📦 Download Generated Files")
-                                    
-                                    st.markdown("**ไฟล์ที่จะรวมใน ZIP:**")
-                                    for file_path in generated_files:
-                                        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
-                                        st.markdown(f"- 📄 `{os.path.basename(file_path)}` ({file_size} bytes)")
-                                    
-                                    try:
-                                        zip_data = FileManager.create_zip_from_files(generated_files)
-                                        
-                                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                        script_name = selected_script.replace('.py', '')
-                                        zip_filename = f"{script_name}_output_{timestamp}.zip"
-                                        
-                                        st.download_button(
-                                            label="📦 ดาวน์โหลดไฟล์ทั้งหมด (ZIP)",
-                                            data=zip_data,
-                                            file_name=zip_filename,
-                                            mime="application/zip",
-                                            type="primary",
-                                            use_container_width=True
-                                        )
-                                        
-                                        st.success(f"✅ พร้อมดาวน์โหลด! ไฟล์ ZIP จะมีชื่อ: `{zip_filename}`")
-                                        
-                                    except Exception as e:
-                                        st.error(f"❌ เกิดข้อผิดพลาดในการสร้าง ZIP file: {e}")
-                                
-                                # ทำความสะอาด temp directory
-                                FileManager.cleanup_temp_dir(temp_dir)
-                            
-                            if not stdout.strip() and not generated_files:
-                                st.info("ไม่มี output จากสคริปต์")
-                                
+                        st.session_state.current_run_id = run_id
+                        st.session_state.script_error = None
+                    st.caption(f"🛡️ ข้อจำกัด: {run_policy.describe()}")
+            
+                with col3:
+                    queue_stats = scheduler.stats()
+                    st.caption(f"🧮 คิว: กำลังรัน {queue_stats['running']}/{queue_stats['slots']} งาน, รอคิว {queue_stats['queued']} งาน")
+                    cache_stats = result_cache.stats()
+                    st.caption(
+                        f"🗃️ Result cache: hit {cache_stats['hits']} / miss {cache_stats['misses']} "
+                        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} รายการ"
+                    )
+            
+                current_job = scheduler.get(st.session_state.current_run_id) if st.session_state.current_run_id else None
+                if current_job:
+                    st.markdown(f"### 📊 Script Output ({current_job.label})")
+                    if current_job.is_finished:
+                        render_run_result(current_job)
+                        render_run_metrics(current_job)
+                    else:
+                        render_run_progress(current_job.run_id)
+            
+                render_stored_artifacts(selected_script)
+            
+                # ======= Batch: รัน script นี้กับหลายชุด input =======
+                with st.expander("📚 Batch: รัน Script นี้กับหลายชุดข้อมูล", expanded=bool(st.session_state.current_batch_run_id)):
+                    st.markdown("- แต่ละโฟลเดอร์ย่อยคือข้อมูลหนึ่งชุด เช่น `session_01/raw.csv`, `session_02/raw.csv`")
+                    st.markdown("- ไฟล์ที่อยู่นอกโฟลเดอร์ย่อยและไฟล์ใน Memory เป็นไฟล์ร่วมของทุกชุด (เช่น `smell_Name.xlsx`) วางครั้งเดียวแบบอ่านอย่างเดียว")
+                    batch_source = st.radio(
+                        "แหล่งข้อมูล", ['zip', 'directory'],
+                        format_func=lambda source: "ไฟล์ ZIP" if source == 'zip' else "เลือกโฟลเดอร์",
+                        horizontal=True, key=f"batch_source_{selected_script}"
+                    )
+                    if batch_source == 'zip':
+                        batch_upload = st.file_uploader("ZIP ของชุดข้อมูล", type=['zip'], key=f"batch_zip_{selected_script}")
+                    else:
+                        batch_upload = st.file_uploader(
+                            "โฟลเดอร์ของชุดข้อมูล", accept_multiple_files="directory", key=f"batch_dir_{selected_script}"
+                        )
+                
+                    if st.button("📚 Run Batch", type="primary", use_container_width=True, disabled=not batch_upload):
+                        try:
+                            if batch_source == 'zip':
+                                batch = BatchInputs.from_zip(batch_upload)
+                            else:
+                                batch = BatchInputs.from_files(batch_upload)
+                        except Exception as e:
+                            batch = None
+                            st.error(f"❌ ไม่สามารถอ่านชุดข้อมูล: {e}")
+                    
+                        if batch is not None and not batch.items:
+                            st.warning("⚠️ ไม่พบโฟลเดอร์ย่อยของชุดข้อมูล")
+                        elif batch is not None:
+                            if st.session_state.current_batch_run_id:
+                                scheduler.discard(st.session_state.current_batch_run_id)
+                            st.session_state.current_batch_run_id = scheduler.submit(
+                                st.session_state.user_id, selected_script,
+                                BatchRunner.run,
+                                script_doc['content'], selected_script, batch, dict(st.session_state.imported_files),
+                                pool=worker_pool, metrics_registry=metrics_registry,
+                                render_profile=render_profile, policy=run_policy,
+                                history_user=st.session_state.history_id
+                            )
+                            st.info(f"📚 ส่ง {len(batch)} ชุดเข้าคิวแล้ว")
+                
+                    batch_job = scheduler.get(st.session_state.current_batch_run_id) if st.session_state.current_batch_run_id else None
+                    if batch_job:
+                        st.markdown(f"**📊 Batch Output ({batch_job.label})**")
+                        if batch_job.is_finished:
+                            render_batch_report(batch_job)
                         else:
-                            st.error("❌ เกิดข้อผิดพลาดในการรันสคริปต์")
-                            
-                            if stderr.strip():
-                                st.session_state.script_error = stderr
-                            
-                            # ทำความสะอาด temp directory แม้เกิด error
-                            if temp_dir:
-                                FileManager.cleanup_temp_dir(temp_dir)
-
-            # แสดง Error ด้านล่าง
-            if st.session_state.script_error:
-                st.markdown("---")
-                st.subheader("🚨 Error Details:")
-                with st.container():
-                    st.code(st.session_state.script_error, language='text', wrap_lines=True)
+                            render_run_progress(batch_job.run_id)
+
+                # แสดง Error ด้านล่าง
+                if st.session_state.script_error:
+                    st.markdown("---")
+                    st.subheader("🚨 Error Details:")
+                    with st.container():
+                        st.code(st.session_state.script_error, language='text', wrap_lines=True)
+
+    else:
+        st.info("📭 ไม่พบไฟล์ในฐานข้อมูล")
+        st.markdown("กรุณาอัพโหลดไฟล์ Python ก่อนใช้งาน")
 
-else:
-    st.info("📭 ไม่พบไฟล์ในฐานข้อมูล")
-    st.markdown("กรุณาอัพโหลดไฟล์ Python ก่อนใช้งาน")
+render_script_section()
+
+# ======= ส่วน Pipeline (หลาย script ต่อกัน) =======
+# ไฟล์ที่ยังขาดของ pipeline ขึ้นกับไฟล์ใน Memory จึงวาดใหม่พร้อมส่วน Memory (MEMORY_FRAGMENTS)
+@timed_fragment('pipeline')
+def render_pipeline_section():
+    pipeline_names = pipeline_store.list() if script_count else []
+    if pipeline_names:
+        st.markdown("---")
+        st.subheader("🔗 Pipeline")
+        st.markdown("- รันหลาย script ต่อกันใน workspace เดียว: ไฟล์ที่ขั้นหนึ่งสร้างถูกใช้ต่อในขั้นถัดไปทันที ไม่ต้องดาวน์โหลดแล้ว import ใหม่")
+        st.markdown("- ขั้นที่ไม่ขึ้นต่อกันรันพร้อมกัน ผลลัพธ์ทุกขั้นรวมอยู่ใน ZIP เดียวพร้อมรายงานเวลา (`pipeline_report.json`)")
+    
+        selected_pipeline = st.selectbox("เลือก Pipeline", ["..."] + pipeline_names, key="pipeline_selector")
+        if selected_pipeline != "...":
+            try:
+                pipeline = pipeline_store.get(selected_pipeline)
+            except ValueError as e:
+                pipeline = None
+                st.error(f"❌ Pipeline ไม่ถูกต้อง: {e}")
+        
+            if pipeline is not None:
+                if pipeline.description:
+                    st.caption(pipeline.description)
+                for index, level in enumerate(pipeline.levels()):
+                    steps_text = " · ".join(f"`{name}` ({pipeline.step(name)['script']})" for name in level)
+                    parallel = " (รันพร้อมกัน)" if len(level) > 1 else ""
+                    st.markdown(f"{index + 1}. {steps_text}{parallel}")
+            
+                missing_inputs = [name for name in pipeline.external_inputs() if name not in st.session_state.imported_files]
+                if missing_inputs:
+                    st.warning(f"⚠️ ยังไม่ได้ import ไฟล์: {', '.join(missing_inputs)}")
             
+                if st.button("🚀 Run Pipeline", type="primary", use_container_width=True, disabled=bool(missing_inputs)):
+                    scripts = {name: script_cache.get_script(name) for name in pipeline.scripts}
+                    missing_scripts = [name for name, doc in scripts.items() if not doc or 'content' not in doc]
+                    if missing_scripts:
+                        st.error(f"❌ ไม่พบ script ในฐานข้อมูล: {', '.join(missing_scripts)}")
+                    else:
+                        if st.session_state.current_pipeline_run_id:
+                            scheduler.discard(st.session_state.current_pipeline_run_id)
+                        st.session_state.current_pipeline_run_id = scheduler.submit(
+                            st.session_state.user_id, pipeline.name,
+                            PipelineRunner.run,
+                            pipeline, scripts, dict(st.session_state.imported_files),
+                            pool=worker_pool, metrics_registry=metrics_registry,
+                            history_user=st.session_state.history_id
+                        )
+    
+        pipeline_job = scheduler.get(st.session_state.current_pipeline_run_id) if st.session_state.current_pipeline_run_id else None
+        if pipeline_job:
+            st.markdown(f"### 📊 Pipeline Output ({pipeline_job.label})")
+            if pipeline_job.is_finished:
+                render_pipeline_report(pipeline_job)
+                render_run_result(pipeline_job)
+                render_run_metrics(pipeline_job)
+            else:
+                render_run_progress(pipeline_job.run_id)
+
+render_pipeline_section()
+
+# ======= ส่วนประวัติการรัน =======
+# สถานะของการรันในประวัติ
+HISTORY_STATUS_LABELS = {
+    'finished': "✅ สำเร็จ",
+    'failed': "❌ ล้มเหลว",
+    'cancelled': "🛑 ยกเลิก",
+}
+
+def history_status(run):
+    if run['status'] == 'finished' and run['returncode'] not in (0, None):
+        return f"⚠️ return code {run['returncode']}"
+    return HISTORY_STATUS_LABELS.get(run['status'], run['status'])
+
+# หน้าของประวัติ: เก็บ cursor ของทุกหน้าที่ผ่านมา (ย้อนกลับได้โดยไม่ต้องไล่จากหน้าแรกใหม่)
+def reset_history_pages():
+    st.session_state.history_cursors = [None]
+
+def history_next_page(cursor):
+    st.session_state.history_cursors.append(cursor)
+
+def history_prev_page():
+    if len(st.session_state.history_cursors) > 1:
+        st.session_state.history_cursors.pop()
+
+# ไฟล์ของการรันอาจถูกลบตาม retention หลังวาดหน้าแล้ว (เหมือน 410 ของ headless) ให้ปุ่มดาวน์โหลดแจ้งว่าไม่มีไฟล์แล้ว
+def read_history_zip(run_id):
+    archive = run_history.artifacts_zip(run_id)
+    if archive is None:
+        raise FileNotFoundError(f"ไฟล์ผลลัพธ์ของการรัน {run_id} ไม่มีแล้ว (ถูกลบตามระยะเวลาเก็บ)")
+    with archive:
+        return archive.read()
+
+# รายละเอียดของการรันหนึ่งครั้งในประวัติ: input, เวลา, ไฟล์ผลลัพธ์และ log ที่ดาวน์โหลดได้ทันที
+def render_history_run(run):
+    run_id = run['run_id']
+    finished = datetime.fromtimestamp(run['finished_at']).strftime('%Y-%m-%d %H:%M:%S')
+    st.caption(
+        f"🆔 `{run_id}` · script hash `{(run['script_hash'] or '-')[:12]}` · จบเมื่อ {finished} · "
+        f"รอคิว {run['wait_seconds'] or 0:.2f} วินาที · เวลารัน {run['run_seconds'] or 0:.2f} วินาที"
+    )
+    if run['cache'] == 'hit':
+        st.caption("🗃️ ผลลัพธ์จาก cache")
+    if run['error']:
+        st.error(f"❌ {run['error']}")
+    if run['stopped']:
+        st.warning(STOP_LABELS.get(run['stopped'], run['stopped']))
+    
+    if run['inputs']:
+        with st.expander(f"📥 ไฟล์ input ({len(run['inputs'])} ไฟล์)", expanded=False):
+            st.dataframe(pd.DataFrame([
+                {"ไฟล์": item['name'], "ขนาด (bytes)": item['size'], "sha256": item['digest'][:16]}
+                for item in run['inputs']
+            ]), use_container_width=True, hide_index=True)
+    
+    if run['artifacts_state'] == 'evicted':
+        st.info("🧹 ไฟล์ผลลัพธ์ของการรันนี้ถูกลบเพื่อคืนพื้นที่แล้ว (ข้อมูลการรันยังอยู่) รันใหม่เพื่อสร้างอีกครั้ง")
+        return
+    if run['artifacts_state'] == 'too_large':
+        st.info("📦 ไฟล์ผลลัพธ์ของการรันนี้ใหญ่เกินพื้นที่ของประวัติจึงไม่ได้เก็บไว้")
+        return
+    if run['artifacts_state'] != 'stored':
+        return
+    
+    artifacts = run['artifacts']
+    if artifacts:
+        timestamp = datetime.fromtimestamp(run['finished_at']).strftime("%Y%m%d_%H%M%S")
+        st.download_button(
+            label=f"📦 ดาวน์โหลดไฟล์ผลลัพธ์ทั้งหมด (ZIP, {len(artifacts)} ไฟล์)",
+            data=partial(read_history_zip, run_id),
+            file_name=f"{run['script'].replace('.py', '')}_output_{timestamp}.zip",
+            mime="application/zip",
+            type="primary",
+            use_container_width=True,
+            key=f"history_zip_{run_id}"
+        )
+        # แสดงปุ่มดาวน์โหลดรายไฟล์ไม่เกินหนึ่งหน้า (batch ที่มีไฟล์มากใช้ ZIP)
+        with st.expander(f"📁 ไฟล์ผลลัพธ์ ({len(artifacts)} ไฟล์)", expanded=False):
+            for artifact in artifacts[:RUN_HISTORY_PAGE_SIZE]:
+                path = run_history.artifact_path(run_id, artifact['path'])
+                if path is None:
+                    continue
+                col_name, col_download = st.columns([4, 1])
+                with col_name:
+                    site = f" · สร้างที่ {artifact['site']}" if artifact.get('site') else ""
+                    st.markdown(f"📄 `{artifact['path']}` ({artifact['size'] or 0:,} bytes){site}")
+                with col_download:
+                    st.download_button(
+                        label="📥 ดาวน์โหลด",
+                        data=partial(FileManager.read_file_bytes, path),
+                        file_name=os.path.basename(artifact['path']),
+                        mime=mimetypes.guess_type(artifact['path'])[0] or "application/octet-stream",
+                        key=f"history_file_{run_id}_{artifact['path']}"
+                    )
+            if len(artifacts) > RUN_HISTORY_PAGE_SIZE:
+                st.caption(f"... และอีก {len(artifacts) - RUN_HISTORY_PAGE_SIZE} ไฟล์ (อยู่ใน ZIP)")
+    
+    col_stdout, col_stderr = st.columns(2)
+    for column, stream in ((col_stdout, 'stdout'), (col_stderr, 'stderr')):
+        path = run_history.log_path(run_id, stream)
+        if path is None or not os.path.getsize(path):
+            continue
+        with column:
+            st.download_button(
+                label=f"📥 {stream}.log ({os.path.getsize(path):,} bytes)",
+                data=partial(FileManager.read_file_bytes, path),
+                file_name=f"{run['script'].replace('.py', '')}_{stream}.log",
+                mime="text/plain",
+                use_container_width=True,
+                key=f"history_{stream}_{run_id}"
+            )
+
+# ประวัติการรัน (แบ่งหน้าฝั่งฐานข้อมูล) กรองตาม script และผู้ใช้ ดาวน์โหลดผลลัพธ์เดิมได้โดยไม่ต้องรันใหม่
+@timed_fragment('history')
+def render_history_section():
+    if 'history_cursors' not in st.session_state:
+        reset_history_pages()
+    
+    st.markdown("---")
+    st.subheader("🕘 ประวัติการรัน")
+    st.markdown("- ไฟล์ผลลัพธ์และ log ของการรันที่ผ่านมาดาวน์โหลดซ้ำได้ทันที ไม่ต้องรันใหม่ (ยังอยู่แม้ reload หน้า)")
+    
+    col_script, col_mine = st.columns([3, 1])
+    with col_mine:
+        only_mine = st.toggle("เฉพาะของฉัน", value=True, key="history_only_mine", on_change=reset_history_pages)
+    user_filter = st.session_state.history_id if only_mine else None
+    with col_script:
+        script_filter = st.selectbox(
+            "Script / Pipeline", [None] + run_history.scripts(user_filter),
+            format_func=lambda name: name or "ทั้งหมด", key="history_script", on_change=reset_history_pages
+        )
+    
+    runs, next_cursor = run_history.page(script_filter, user_filter, after=st.session_state.history_cursors[-1])
+    if not runs:
+        st.caption("ยังไม่มีประวัติการรัน")
+        return
+    
+    st.dataframe(pd.DataFrame([{
+        "เวลา": datetime.fromtimestamp(run['finished_at']).strftime('%Y-%m-%d %H:%M:%S'),
+        "Script": run['script'],
+        "ประเภท": run['kind'],
+        "สถานะ": history_status(run),
+        "เวลารัน (วินาที)": f"{run['run_seconds'] or 0:.2f}",
+        "ไฟล์ผลลัพธ์": len(run['artifacts']) if run['artifacts_state'] == 'stored' else "-",
+    } for run in runs]), use_container_width=True, hide_index=True)
+    
+    page_number = len(st.session_state.history_cursors)
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("⬅️ ใหม่กว่า", key="history_prev", disabled=page_number == 1,
+                  on_click=history_prev_page, use_container_width=True)
+    with col_page:
+        st.caption(f"หน้า {page_number}")
+    with col_next:
+        st.button("เก่ากว่า ➡️", key="history_next", disabled=next_cursor is None,
+                  on_click=history_next_page, args=(next_cursor,), use_container_width=True)
+    
+    runs_by_id = {run['run_id']: run for run in runs}
+    selected_run_id = st.selectbox(
+        "ดูรายละเอียด / ดาวน์โหลดผลลัพธ์", list(runs_by_id),
+        format_func=lambda run_id: (
+            f"{datetime.fromtimestamp(runs_by_id[run_id]['finished_at']).strftime('%Y-%m-%d %H:%M:%S')} · "
+            f"{runs_by_id[run_id]['script']} · {history_status(runs_by_id[run_id])}"
+        ),
+        key="history_selected_run"
+    )
+    render_history_run(runs_by_id[selected_run_id])
+
+render_history_section()
+
 st.markdown("---")
 st.markdown("**ขอบคุณที่แวะเข้ามาใช้ Service ครับผม (Phu MUI Robotics) ❤️**")
\ No newline at end of file
@@ -1,77 +1,278 @@
-import pymongo as pm
-import os
-from datetime import datetime
-
-# Connect to MongoDB
-mongo_url = os.getenv("MONGO_URL")
-db_name = os.getenv("MONGO_DB_NAME")
-collection_name = os.getenv("MONGO_COLLECTION_NAME")
-download_path = os.getenv("DOWNLOAD_PATH")
-
-if not mongo_url or not db_name or not collection_name:
-    raise ValueError("One or more required environment variables (MONGO_URL, MONGO_DB_NAME, MONGO_COLLECTION_NAME) are not set.")
-
-client = pm.MongoClient(mongo_url)
-db = client[db_name]
-collection = db[collection_name]
-
-#เก็บไฟล์ไหนให้ปรับตรงนี้
-files_to_store = [
-    "dendrogram_plot.py",
-    "pcaPlotNormal.py", 
-    "processDataset.py"
-]
-
-#Path เก็บไฟล์
-download_path = "D:/MUI-Robotics/PythonScript-สำหรับทำMiniApp"
-
-# ตรวจสอบว่า directory
-if not os.path.exists(download_path):
-    print(f"Directory not found: {download_path}")
-    exit()
-
-print(f"Looking for files in: {download_path}")
-
-#-----------------------------------------------------------------------------------------
-for file_name in files_to_store:
-    filepath = os.path.join(download_path, file_name)
-    print(f"Checking file: {filepath}")
-    
-        
-    if os.path.exists(filepath):
-        # เช็คว่าไฟล์มีอยู่ในฐานข้อมูลแล้วหรือไม่
-        existing_file = collection.find_one({"filename": file_name})
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        document = {
-            "filename": file_name,
-            "content": content,
-            "file_type": "python",
-            "uploaded_at": datetime.now(),
-            "size": os.path.getsize(filepath)
-        }
-        
-        if existing_file:
-            # อัพเดทไฟล์ที่มีอยู่
-            result = collection.update_one(
-                {"filename": file_name}, 
-                {"$set": document}
-            )
-            print(f"🔄 Updated {file_name} (Modified {result.modified_count} document)")
-        else:
-            # เพิ่มไฟล์ใหม่
-            result = collection.insert_one(document)
-            print(f"✅ Stored {file_name} with ID: {result.inserted_id}")
-    else:
-        print(f"❌ File {file_name} not found at {filepath}")
-
-# แสดงไฟล์ที่มีอยู่ใน directory
-print("\nFiles in directory:")
-try:
-    for file in os.listdir(download_path):
-        if file.endswith('.py'):
-            print(f"  - {file}")
-except Exception as e:
-    print(f"Error listing directory: {e}")
\ No newline at end of file
+"""ซิงค์ไฟล์ script จากโฟลเดอร์ในเครื่องขึ้น MongoDB
+
+สแกนโฟลเดอร์ (รวมโฟลเดอร์ย่อย) คำนวณ SHA-256 ของแต่ละไฟล์ เทียบกับ field content_hash ในฐานข้อมูล
+แล้วส่งเฉพาะไฟล์ที่เปลี่ยนใน bulk_write ครั้งเดียว (upsert ตาม filename)
+ไฟล์ที่ใหญ่เกิน GRIDFS_THRESHOLD_KB จะถูกอัปโหลดเข้า GridFS ทีละ chunk และเอกสารเก็บแค่ content_file_id
+
+วิธีใช้:
+    python mongodb.py [path] [--pattern "*.py"] [--dry-run] [--prune] [--watch] [--interval 2]
+    (ถ้าไม่ระบุ path จะใช้ค่าจาก DOWNLOAD_PATH)
+"""
+import pymongo as pm
+import os
+import sys
+import time
+import codecs
+import fnmatch
+import hashlib
+import argparse
+from datetime import datetime
+from Components.gridfs_store import GridFSStore, iter_chunks
+
+# Connect to MongoDB
+mongo_url = os.getenv("MONGO_URL")
+db_name = os.getenv("MONGO_DB_NAME")
+collection_name = os.getenv("MONGO_COLLECTION_NAME")
+download_path = os.getenv("DOWNLOAD_PATH")
+
+
+#เชื่อมต่อ collection และสร้าง unique index ของ filename (ถ้ายังไม่มี)
+def get_collection():
+    if not mongo_url or not db_name or not collection_name:
+        raise ValueError("One or more required environment variables (MONGO_URL, MONGO_DB_NAME, MONGO_COLLECTION_NAME) are not set.")
+
+    client = pm.MongoClient(mongo_url)
+    collection = client[db_name][collection_name]
+    try:
+        collection.create_index("filename", unique=True)
+    except pm.errors.PyMongoError as e:
+        # มีเอกสาร filename ซ้ำอยู่แล้ว ต้องลบตัวซ้ำก่อนจึงจะสร้าง index ได้
+        print(f"⚠️ Cannot create unique index on filename: {e}")
+    return collection
+
+
+#ตรวจว่าไฟล์เป็น utf-8 โดยอ่านทีละ chunk (ใช้กับไฟล์ใหญ่ที่ไม่ได้อ่านเข้า memory ทั้งก้อน)
+def check_utf8(file_path):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        for chunk in iter_chunks(f):
+            decoder.decode(chunk)
+    decoder.decode(b'', final=True)
+
+
+#สแกนไฟล์ในโฟลเดอร์ คืน {filename: path} (filename = path เทียบกับโฟลเดอร์หลัก คั่นด้วย /)
+def scan_files(root, pattern):
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d != '__pycache__')
+        for file_name in sorted(filenames):
+            if fnmatch.fnmatch(file_name, pattern):
+                file_path = os.path.join(dirpath, file_name)
+                files[os.path.relpath(file_path, root).replace(os.sep, '/')] = file_path
+    return files
+
+
+class FileHasher:
+    """hash ไฟล์โดยจำผลเดิมไว้ตาม (ขนาด, เวลาแก้ไข) โหมด watch จึงไม่ต้องอ่านไฟล์ที่ไม่เปลี่ยนซ้ำ"""
+
+    def __init__(self):
+        self._cache = {}
+
+    def signature(self, file_path):
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def hash(self, file_path):
+        signature = self.signature(file_path)
+        cached = self._cache.get(file_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter_chunks(f):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self._cache[file_path] = (signature, digest)
+        return digest
+
+
+#เทียบไฟล์ในเครื่องกับฐานข้อมูล แล้วส่งเฉพาะส่วนที่เปลี่ยนใน bulk_write ครั้งเดียว
+def sync(collection, root, pattern, hasher, dry_run=False, prune=False, content_store=None):
+    started = time.perf_counter()
+    content_store = content_store or GridFSStore(collection.database)
+    local_files = scan_files(root, pattern)
+    stored = {}
+    stored_file_ids = {}
+    for doc in collection.find({}, {"filename": 1, "content_hash": 1, "content_file_id": 1}):
+        if 'filename' in doc:
+            stored[doc['filename']] = doc.get('content_hash')
+            if doc.get('content_file_id'):
+                stored_file_ids[doc['filename']] = doc['content_file_id']
+
+    # เอกสารเก่าที่ยังไม่มี content_hash: ดึง content มา hash ครั้งเดียวเพื่อไม่ต้องเขียนทับทั้งหมด
+    legacy = [filename for filename in local_files if filename in stored and not stored[filename]]
+    if legacy:
+        for doc in collection.find({"filename": {"$in": legacy}}, {"filename": 1, "content": 1}):
+            if isinstance(doc.get('content'), str):
+                stored[doc['filename']] = ('legacy', hashlib.sha256(doc['content'].encode('utf-8')).hexdigest())
+
+    operations = []
+    # ไฟล์ GridFS ที่เพิ่งอัปโหลด / ที่ถูกแทนที่ ตามลำดับของ operation ที่เกี่ยวข้อง
+    uploaded_ids = {}
+    replaced_ids = {}
+    summary = {'added': [], 'updated': [], 'unchanged': 0, 'pruned': [], 'gridfs': [], 'errors': []}
+    now = datetime.now()
+    for filename, file_path in local_files.items():
+        try:
+            content_hash = hasher.hash(file_path)
+        except OSError as e:
+            summary['errors'].append(f"{filename}: {e}")
+            continue
+
+        stored_hash = stored.get(filename)
+        if isinstance(stored_hash, tuple):
+            if stored_hash[1] == content_hash:
+                # เนื้อหาเหมือนเดิม แค่เติม content_hash ให้เอกสารเก่า
+                operations.append(pm.UpdateOne({"filename": filename}, {"$set": {"content_hash": content_hash}}))
+                summary['unchanged'] += 1
+                continue
+        elif stored_hash == content_hash:
+            summary['unchanged'] += 1
+            continue
+
+        size = os.path.getsize(file_path)
+        document = {
+            "filename": filename,
+            "content_hash": content_hash,
+            "file_type": "python" if filename.endswith('.py') else filename.rsplit('.', 1)[-1],
+            "uploaded_at": now,
+            "size": size
+        }
+        try:
+            if content_store.is_large(size):
+                # ไฟล์ใหญ่: อัปโหลดเข้า GridFS ทีละ chunk เอกสารเก็บแค่ id (content เดิมที่ inline อยู่ถูกลบออก)
+                check_utf8(file_path)
+                if not dry_run:
+                    with open(file_path, 'rb') as f:
+                        document["content_file_id"] = content_store.put_script(filename, f, content_hash)
+                update = {"$set": document, "$unset": {"content": ""}}
+                summary['gridfs'].append(filename)
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    document["content"] = f.read()
+                update = {"$set": document, "$unset": {"content_file_id": ""}}
+        except (OSError, UnicodeDecodeError) as e:
+            summary['errors'].append(f"{filename}: {e}")
+            continue
+
+        # โฟลเดอร์ย่อยของไฟล์ใช้เป็น tag (เพิ่มเข้าไป ไม่ลบ tag ที่ตั้งไว้เองในฐานข้อมูล)
+        folders = filename.split('/')[:-1]
+        if folders:
+            update["$addToSet"] = {"tags": {"$each": folders}}
+        index = len(operations)
+        operations.append(pm.UpdateOne({"filename": filename}, update, upsert=True))
+        summary['updated' if filename in stored else 'added'].append(filename)
+        if document.get("content_file_id"):
+            uploaded_ids[index] = document["content_file_id"]
+        if filename in stored_file_ids:
+            replaced_ids[index] = [stored_file_ids[filename]]
+
+    if prune:
+        # ลบเฉพาะเอกสารที่ชื่อตรงกับ pattern (เหมือน scan_files) ไม่งั้น --pattern "*.R" จะลบ script .py ทั้งหมด
+        removed = sorted(
+            filename for filename in set(stored) - set(local_files)
+            if fnmatch.fnmatch(filename.rsplit('/', 1)[-1], pattern)
+        )
+        if removed:
+            replaced_ids[len(operations)] = [stored_file_ids[filename] for filename in removed if filename in stored_file_ids]
+            operations.append(pm.DeleteMany({"filename": {"$in": removed}}))
+            summary['pruned'] = removed
+
+    if operations and not dry_run:
+        # error อื่นที่ไม่ใช่ BulkWriteError (เช่น การเชื่อมต่อหลุด) ไม่รู้ว่า operation ไหนถูกเขียนแล้ว จึงไม่ลบไฟล์ใน GridFS
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except pm.errors.BulkWriteError as e:
+            # ordered=False: operation อื่นถูกเขียนไปแล้ว ลบเฉพาะไฟล์ที่อัปโหลดให้ operation ที่ล้มเหลว
+            # และลบเวอร์ชันเก่าของ operation ที่สำเร็จ (เอกสารชี้ไปที่เวอร์ชันใหม่แล้ว)
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            for index, file_id in uploaded_ids.items():
+                if index in failed:
+                    content_store.delete_script(file_id)
+            for index, file_ids in replaced_ids.items():
+                if index not in failed:
+                    for file_id in file_ids:
+                        content_store.delete_script(file_id)
+            raise
+        # ลบ content เวอร์ชันเก่าใน GridFS หลังเอกสารชี้ไปที่เวอร์ชันใหม่แล้วเท่านั้น
+        for file_ids in replaced_ids.values():
+            for file_id in file_ids:
+                content_store.delete_script(file_id)
+
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def print_summary(summary, dry_run):
+    prefix = "[dry-run] " if dry_run else ""
+    for filename in summary['added']:
+        print(f"{prefix}✅ Stored {filename}")
+    for filename in summary['updated']:
+        print(f"{prefix}🔄 Updated {filename}")
+    for filename in summary['pruned']:
+        print(f"{prefix}🗑️ Removed {filename}")
+    for filename in summary['gridfs']:
+        print(f"{prefix}📦 {filename} stored in GridFS")
+    for error in summary['errors']:
+        print(f"❌ {error}")
+    print(
+        f"{prefix}{len(summary['added'])} added, {len(summary['updated'])} updated, "
+        f"{summary['unchanged']} unchanged, {len(summary['pruned'])} removed "
+        f"({summary['seconds']:.2f} s)"
+    )
+
+
+#โหมด watch: ตรวจขนาด/เวลาแก้ไขของไฟล์เป็นระยะ ซิงค์ใหม่เมื่อมีไฟล์เปลี่ยน เพิ่ม หรือหายไป
+def watch(collection, root, pattern, hasher, interval, dry_run=False, prune=False, content_store=None):
+    def snapshot():
+        state = {}
+        for filename, file_path in scan_files(root, pattern).items():
+            try:
+                state[filename] = hasher.signature(file_path)
+            except OSError:
+                pass
+        return state
+
+    print(f"👀 Watching {root} (every {interval} s, Ctrl+C to stop)")
+    previous = snapshot()
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot()
+            if current != previous:
+                print(f"\n[{datetime.now():%H:%M:%S}] Change detected")
+                print_summary(sync(collection, root, pattern, hasher, dry_run, prune, content_store), dry_run)
+                previous = current
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', default=download_path, help="โฟลเดอร์ของ script (ค่าเริ่มต้น: DOWNLOAD_PATH)")
+    parser.add_argument('--pattern', default='*.py', help="รูปแบบชื่อไฟล์ที่ซิงค์ (ค่าเริ่มต้น: *.py)")
+    parser.add_argument('--dry-run', action='store_true', help="แสดงสิ่งที่จะเปลี่ยนโดยไม่เขียนฐานข้อมูล")
+    parser.add_argument('--prune', action='store_true', help="ลบเอกสารที่ไม่มีไฟล์ในโฟลเดอร์แล้ว")
+    parser.add_argument('--watch', action='store_true', help="ซิงค์ใหม่อัตโนมัติเมื่อไฟล์เปลี่ยน")
+    parser.add_argument('--interval', type=float, default=2.0, help="ช่วงเวลาตรวจไฟล์ในโหมด watch (วินาที)")
+    args = parser.parse_args(argv)
+
+    # ตรวจสอบว่า directory
+    if not args.path or not os.path.isdir(args.path):
+        print(f"Directory not found: {args.path}")
+        return 1
+
+    print(f"Looking for files in: {args.path}")
+    collection = get_collection()
+    content_store = GridFSStore(collection.database)
+    hasher = FileHasher()
+    summary = sync(collection, args.path, args.pattern, hasher, args.dry_run, args.prune, content_store)
+    print_summary(summary, args.dry_run)
+
+    if args.watch:
+        watch(collection, args.path, args.pattern, hasher, args.interval, args.dry_run, args.prune, content_store)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,25 @@
+import pytest
+
+
+#ฐานข้อมูล MongoDB จำลอง (mongomock) ใหม่ทุก test พร้อม GridFS
+@pytest.fixture
+def mongo_db(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    import gridfs
+    import mongomock.gridfs
+    mongomock.gridfs.enable_gridfs_integration()
+    # pymongo รุ่นใหม่อ่าน timeout / argument ที่ mongomock ยังไม่รู้จัก (patch เฉพาะใน test นี้)
+    bucket_init = gridfs.GridFSBucket.__init__
+
+    def init(self, *args, **kwargs):
+        bucket_init(self, *args, **kwargs)
+        self._timeout = None
+
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def patched(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(gridfs.GridFSBucket, '__init__', init)
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, 'add_update', patched)
+    return mongomock.MongoClient()['script_runner_test']
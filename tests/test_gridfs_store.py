@@ -0,0 +1,49 @@
+import io
+from Components.config import GRIDFS_ARTIFACT_BUCKET
+from Components.gridfs_store import GridFSStore, CHUNK_SIZE
+
+
+def test_load_content_decodes_characters_split_across_chunks(mongo_db):
+    store = GridFSStore(mongo_db, chunk_kb=1)
+    # อักษรไทย (3 bytes ใน utf-8) คร่อมรอยต่อของ chunk ที่ load_content อ่าน
+    content = 'a' * (CHUNK_SIZE - 1) + 'ภาษาไทย\n'
+    file_id = store.put_script('big.py', io.BytesIO(content.encode('utf-8')), 'hash')
+    doc = store.load_content({'filename': 'big.py', 'content_file_id': file_id})
+    assert doc['content'] == content
+
+
+def test_load_content_keeps_inline_documents(mongo_db):
+    store = GridFSStore(mongo_db)
+    doc = {'filename': 'small.py', 'content': "print('hi')"}
+    assert store.load_content(doc) is doc
+    assert doc['content'] == "print('hi')"
+
+
+def test_save_artifacts_skips_files_already_stored(mongo_db, tmp_path):
+    store = GridFSStore(mongo_db)
+    (tmp_path / 'out.csv').write_text('a\n1\n')
+    (tmp_path / 'plot.png').write_bytes(b'\x89PNG')
+    paths = [str(tmp_path / 'out.csv'), str(tmp_path / 'plot.png'), str(tmp_path / 'missing.txt')]
+
+    assert store.save_artifacts('run-1', paths, str(tmp_path), script='a.py') == 2
+    assert store.save_artifacts('run-1', paths, str(tmp_path), script='a.py') == 0
+    assert store.save_artifacts('run-2', paths[:1], str(tmp_path), script='a.py') == 1
+
+    artifacts = store.list_artifacts(run_id='run-1')
+    assert sorted(a.filename for a in artifacts) == ['out.csv', 'plot.png']
+    csv = next(a for a in artifacts if a.filename == 'out.csv')
+    assert store.read_artifact(csv._id) == b'a\n1\n'
+    assert len(store.list_artifacts(script='a.py')) == 3
+
+
+def test_delete_artifacts_removes_only_that_run(mongo_db, tmp_path):
+    store = GridFSStore(mongo_db)
+    (tmp_path / 'out.csv').write_text('x')
+    store.save_artifacts('run-1', [str(tmp_path / 'out.csv')], str(tmp_path))
+    store.save_artifacts('run-2', [str(tmp_path / 'out.csv')], str(tmp_path))
+
+    store.delete_artifacts('run-1')
+    assert store.list_artifacts(run_id='run-1') == []
+    assert len(store.list_artifacts(run_id='run-2')) == 1
+    assert mongo_db[f"{GRIDFS_ARTIFACT_BUCKET}.files"].count_documents({}) == 1
+    assert mongo_db[f"{GRIDFS_ARTIFACT_BUCKET}.chunks"].count_documents({}) == 1
@@ -0,0 +1,65 @@
+import json
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+import headless
+from Components.blob_store import BlobStore
+from Components.run_history import RunHistory
+from Components.run_service import RunService
+
+
+@pytest.fixture
+def api(mongo_db, tmp_path):
+    collection = mongo_db['scripts']
+    collection.insert_one({'filename': 'hello.py', 'content': "print('hello')\n", 'file_type': 'python',
+                           'uploaded_at': datetime.datetime.now(), 'size': 15})
+    service = RunService(collection, blob_store=BlobStore(str(tmp_path / 'blobs')),
+                         history=RunHistory(str(tmp_path / 'history.sqlite3'), str(tmp_path / 'runs')))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), headless.make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield service, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _request(url, data=None, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers or {})) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _upload(base, filename):
+    body = (f'--XyZ\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n\r\n'
+            'a,b\r\n--XyZ--\r\n').encode()
+    return _request(f"{base}/runs?script=hello.py", body, {'Content-Type': 'multipart/form-data; boundary=XyZ'})
+
+
+@pytest.mark.parametrize('filename', ['', '.', '..', 'dir/..', 'dir/'])
+def test_invalid_part_names_are_rejected(api, filename):
+    service, base = api
+    status, body = _upload(base, filename)
+    assert status == 400, body
+    assert service.scheduler.stats()['queued'] == 0
+
+
+def test_bad_numbers_in_query_are_rejected(api):
+    service, base = api
+    status, body = _upload(base, 'data.csv')
+    assert status == 202, body
+    run_id = json.loads(body)['run_id']
+    assert _request(f"{base}/runs/{run_id}/wait?timeout=30")[0] == 200
+
+    for path in (f"/runs/{run_id}/wait?timeout=x", f"/runs/{run_id}/wait?timeout=nan",
+                 f"/runs/{run_id}/logs/stdout?offset=x", f"/runs/{run_id}/logs/stdout?offset=-1",
+                 "/history?after=x", "/history?after=1.5", "/history?limit=x"):
+        status, body = _request(base + path)
+        assert status == 400, (path, body)
+        assert 'error' in json.loads(body)
+
+    status, body = _request(f"{base}/history?limit=1")
+    assert status == 200 and len(json.loads(body)['runs']) == 1
@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import pytest
+from Components.blob_store import BlobStore
+from Components.manifest import OutputManifest
+from Components.script_runner import ScriptRunner
+
+SCRIPT = f"""
+import sqlite3, subprocess
+open('tracked.txt', 'w').write('python')
+connection = sqlite3.connect('results.sqlite')
+connection.execute('create table t (x)')
+connection.commit()
+connection.close()
+subprocess.run([{sys.executable!r}, '-c', "open('child.txt', 'w').write('child')"], check=True)
+open('data.csv', 'a').close()
+"""
+
+
+def _run(tmp_path, script):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    files = {'data.csv': store.put_bytes(b'x\n1\n', 'data.csv')}
+    stdout, stderr, returncode, temp_dir = ScriptRunner.run_script_with_memory_files(script, 'test.py', files)
+    assert returncode == 0, stderr
+    return temp_dir
+
+
+def test_outputs_include_files_the_harness_cannot_see(tmp_path):
+    temp_dir = _run(tmp_path, SCRIPT)
+    try:
+        outputs = {entry['path']: entry for entry in OutputManifest.outputs(temp_dir)}
+        assert set(outputs) == {'tracked.txt', 'results.sqlite', 'child.txt', 'data.csv'}
+        assert outputs['tracked.txt']['site'] == 'line 3'
+        assert outputs['child.txt']['site'] is None
+        assert outputs['child.txt']['created'] is True
+        assert outputs['child.txt']['size'] == 5
+        # input ที่ถูกเปิดเพื่อเขียนยังเป็นไฟล์เดิม (ไม่ใช่ไฟล์ใหม่)
+        assert outputs['data.csv']['created'] is False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_unchanged_inputs_are_not_outputs(tmp_path):
+    temp_dir = _run(tmp_path, "print(open('data.csv').read())\n")
+    try:
+        assert OutputManifest.outputs(temp_dir) == []
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_pyarrow_writers_produce_previewable_outputs(tmp_path):
+    pytest.importorskip('pyarrow')
+    from Components.preview import FilePreview
+    script = (
+        "import pyarrow as pa, pyarrow.parquet as pq, pyarrow.feather as feather\n"
+        "table = pa.table({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})\n"
+        "pq.write_table(table, 'out.parquet')\n"
+        "feather.write_feather(table, 'out.feather')\n"
+        "with pa.ipc.new_file('out.arrow', table.schema) as writer:\n"
+        "    writer.write_table(table)\n"
+    )
+    temp_dir = _run(tmp_path, script)
+    try:
+        outputs = {entry['path']: entry for entry in OutputManifest.outputs(temp_dir)}
+        assert set(outputs) == {'out.parquet', 'out.feather', 'out.arrow'}
+        assert outputs['out.parquet']['site'] == 'line 3'
+        assert outputs['out.parquet']['producer'] == 'pyarrow'
+        assert outputs['out.arrow']['site'] == 'line 5'
+        for name, entry in outputs.items():
+            assert entry['type'] == 'columnar'
+            path = os.path.join(temp_dir, name)
+            extension = name.rsplit('.', 1)[-1]
+            df, column_count = FilePreview.columnar_head(FilePreview.file_key(path), path, extension)
+            assert column_count == 2
+            assert df['a'].tolist() == [1, 2, 3]
+            assert FilePreview.columnar_row_count(FilePreview.file_key(path), path, extension) == 3
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
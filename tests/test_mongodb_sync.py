@@ -0,0 +1,139 @@
+import pytest
+import pymongo as pm
+import mongodb
+from Components.config import GRIDFS_SCRIPT_BUCKET
+from Components.gridfs_store import GridFSStore
+
+LARGE = "# " + "ข้อมูล" * 400 + "\nprint('large')\n"
+
+
+@pytest.fixture
+def scripts(mongo_db):
+    collection = mongo_db['scripts']
+    # content ที่ใหญ่กว่า 1 KB ย้ายไปเก็บใน GridFS
+    return collection, GridFSStore(mongo_db, threshold_kb=1, chunk_kb=1)
+
+
+def _sync(collection, store, root, **kwargs):
+    summary = mongodb.sync(collection, str(root), '*.py', mongodb.FileHasher(), content_store=store, **kwargs)
+    assert summary['errors'] == []
+    return summary
+
+
+def _grid_files(collection):
+    return list(collection.database[f"{GRIDFS_SCRIPT_BUCKET}.files"].find())
+
+
+def test_large_scripts_move_to_gridfs(scripts, tmp_path):
+    collection, store = scripts
+    (tmp_path / 'small.py').write_text("print('small')\n")
+    (tmp_path / 'large.py').write_text(LARGE, encoding='utf-8')
+
+    summary = _sync(collection, store, tmp_path)
+    assert sorted(summary['added']) == ['large.py', 'small.py']
+    assert summary['gridfs'] == ['large.py']
+
+    small = collection.find_one({'filename': 'small.py'})
+    assert small['content'] == "print('small')\n" and 'content_file_id' not in small
+    large = collection.find_one({'filename': 'large.py'})
+    assert 'content' not in large
+    assert store.load_content(large)['content'] == LARGE
+
+    assert _sync(collection, store, tmp_path)['unchanged'] == 2
+
+
+def test_resync_replaces_the_old_gridfs_file(scripts, tmp_path):
+    collection, store = scripts
+    (tmp_path / 'large.py').write_text(LARGE, encoding='utf-8')
+    _sync(collection, store, tmp_path)
+    old_id = collection.find_one({'filename': 'large.py'})['content_file_id']
+
+    (tmp_path / 'large.py').write_text(LARGE + "print('v2')\n", encoding='utf-8')
+    assert _sync(collection, store, tmp_path)['updated'] == ['large.py']
+    doc = collection.find_one({'filename': 'large.py'})
+    assert doc['content_file_id'] != old_id
+    assert [f['_id'] for f in _grid_files(collection)] == [doc['content_file_id']]
+
+    # เล็กลงจนไม่ต้องใช้ GridFS: กลับไปเก็บ content ในเอกสารและลบไฟล์ใน GridFS
+    (tmp_path / 'large.py').write_text("print('small again')\n")
+    _sync(collection, store, tmp_path)
+    doc = collection.find_one({'filename': 'large.py'})
+    assert doc['content'] == "print('small again')\n" and 'content_file_id' not in doc
+    assert _grid_files(collection) == []
+
+
+def test_failed_bulk_write_removes_uploaded_gridfs_files(scripts, tmp_path, monkeypatch):
+    collection, store = scripts
+    (tmp_path / 'large.py').write_text(LARGE, encoding='utf-8')
+
+    def fail(self, operations, **kwargs):
+        raise pm.errors.BulkWriteError({'writeErrors': [{'index': i, 'errmsg': 'failed'} for i in range(len(operations))]})
+
+    monkeypatch.setattr(type(collection), 'bulk_write', fail)
+    with pytest.raises(pm.errors.PyMongoError):
+        mongodb.sync(collection, str(tmp_path), '*.py', mongodb.FileHasher(), content_store=store)
+    monkeypatch.undo()
+
+    assert collection.count_documents({}) == 0
+    assert _grid_files(collection) == []
+
+
+def test_partial_bulk_write_keeps_gridfs_files_of_applied_updates(scripts, tmp_path, monkeypatch):
+    collection, store = scripts
+    (tmp_path / 'a.py').write_text(LARGE, encoding='utf-8')
+    (tmp_path / 'b.py').write_text(LARGE + "print('b')\n", encoding='utf-8')
+    _sync(collection, store, tmp_path)
+    old_ids = {doc['filename']: doc['content_file_id'] for doc in collection.find()}
+
+    (tmp_path / 'a.py').write_text(LARGE + "print('a2')\n", encoding='utf-8')
+    (tmp_path / 'b.py').write_text(LARGE + "print('b2')\n", encoding='utf-8')
+    bulk_write = type(collection).bulk_write
+
+    # operation แรก (a.py) ถูกเขียน operation ที่สอง (b.py) ล้มเหลว
+    def partial(self, operations, **kwargs):
+        bulk_write(self, operations[:1], **kwargs)
+        raise pm.errors.BulkWriteError({'writeErrors': [{'index': 1, 'errmsg': 'failed'}]})
+
+    monkeypatch.setattr(type(collection), 'bulk_write', partial)
+    with pytest.raises(pm.errors.BulkWriteError):
+        mongodb.sync(collection, str(tmp_path), '*.py', mongodb.FileHasher(), content_store=store)
+    monkeypatch.undo()
+
+    a = collection.find_one({'filename': 'a.py'})
+    b = collection.find_one({'filename': 'b.py'})
+    assert a['content_file_id'] != old_ids['a.py']
+    assert store.load_content(a)['content'] == LARGE + "print('a2')\n"
+    assert b['content_file_id'] == old_ids['b.py']
+    assert store.load_content(b)['content'] == LARGE + "print('b')\n"
+    assert sorted(f['_id'] for f in _grid_files(collection)) == sorted([a['content_file_id'], b['content_file_id']])
+
+
+def test_prune_removes_documents_and_their_gridfs_content(scripts, tmp_path):
+    collection, store = scripts
+    (tmp_path / 'keep.py').write_text("print('keep')\n")
+    (tmp_path / 'large.py').write_text(LARGE, encoding='utf-8')
+    _sync(collection, store, tmp_path)
+    (tmp_path / 'large.py').unlink()
+
+    assert _sync(collection, store, tmp_path)['pruned'] == []
+    assert collection.count_documents({'filename': 'large.py'}) == 1
+
+    assert _sync(collection, store, tmp_path, prune=True)['pruned'] == ['large.py']
+    assert sorted(doc['filename'] for doc in collection.find()) == ['keep.py']
+    assert _grid_files(collection) == []
+
+
+def test_prune_only_touches_files_matching_the_pattern(scripts, tmp_path):
+    collection, store = scripts
+    (tmp_path / 'keep.py').write_text("print('keep')\n")
+    (tmp_path / 'large.py').write_text(LARGE, encoding='utf-8')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'model.R').write_text("x <- 1\n")
+    _sync(collection, store, tmp_path)
+    mongodb.sync(collection, str(tmp_path), '*.R', mongodb.FileHasher(), content_store=store)
+    (tmp_path / 'sub' / 'model.R').unlink()
+
+    summary = mongodb.sync(collection, str(tmp_path), '*.R', mongodb.FileHasher(), prune=True, content_store=store)
+    assert summary['pruned'] == ['sub/model.R']
+    assert sorted(doc['filename'] for doc in collection.find()) == ['keep.py', 'large.py']
+    assert len(_grid_files(collection)) == 1
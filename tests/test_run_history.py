@@ -0,0 +1,20 @@
+from Components.run_history import RunHistory
+from Components.scheduler import RunScheduler
+
+
+def _noop(output, run_info):
+    return "", "", 0, None
+
+
+def test_history_owner_is_separate_from_the_session(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.sqlite3'), str(tmp_path / 'runs'))
+    scheduler = RunScheduler(history=history)
+    web = scheduler.submit('session-1', 'web.py', _noop, history_user='browser-1')
+    api = scheduler.submit('bot', 'api.py', _noop)
+    for run_id in (web, api):
+        assert scheduler.get(run_id).done.wait(5)
+
+    assert scheduler.get(web).user_id == 'session-1'
+    assert [run['run_id'] for run in history.page(user_id='browser-1')[0]] == [web]
+    assert history.page(user_id='session-1')[0] == []
+    assert [run['run_id'] for run in history.page(user_id='bot')[0]] == [api]
@@ -0,0 +1,102 @@
+import io
+import threading
+from Components.batch import BatchInputs, BatchRunner
+from Components.blob_store import BlobStore
+from Components.output_stream import RunOutput
+from Components.pipeline import Pipeline, PipelineRunner
+from Components.scheduler import RunScheduler
+
+
+def _hold(event, output, run_info):
+    event.wait(5)
+
+
+def _borrow(wanted, output, run_info):
+    return run_info['borrow_slots'](wanted)
+
+
+def test_borrowed_slots_count_against_limits():
+    scheduler = RunScheduler(max_concurrent=3, max_per_user=2)
+    release = threading.Event()
+    holder = scheduler.submit('u1', 'hold', _hold, release)
+
+    assert scheduler.borrow_slots(holder, 5) == 1
+    assert scheduler.stats()['borrowed'] == 1
+    # u1 ใช้ครบ 2 ช่องแล้ว งานของ u2 ได้ช่องที่เหลือ แต่ u1 ต้องรอ
+    queued = scheduler.submit('u1', 'next', _hold, release)
+    other = scheduler.submit('u2', 'other', _borrow, 5)
+    assert scheduler.get(other).done.wait(5)
+    assert scheduler.get(other).result == 0
+    assert scheduler.get(queued).status == 'queued'
+
+    release.set()
+    assert scheduler.get(queued).done.wait(5)
+    assert scheduler.stats()['borrowed'] == 0
+
+
+def test_batch_parallelism_is_capped_by_free_slots(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    uploads = []
+    for index in range(4):
+        upload = io.BytesIO(f"x\n{index}\n".encode())
+        upload.name = f"item{index}/data.csv"
+        uploads.append(upload)
+    batch = BatchInputs.from_files(uploads, blob_store=store)
+
+    scheduler = RunScheduler(max_concurrent=4, max_per_user=2)
+    run_id = scheduler.submit('u1', 'batch.py', BatchRunner.run, "print(open('data.csv').read())\n", 'batch.py',
+                              batch, max_parallel=8)
+    job = scheduler.get(run_id)
+    assert job.done.wait(60)
+    assert job.result[2] == 0, job.result[1]
+    assert job.run_info['batch']['parallel'] == 2
+
+
+def test_pipeline_steps_are_capped_by_free_slots():
+    pipeline = Pipeline.from_document({'name': 'p', 'steps': [
+        {'name': 'a', 'script': 'a.py', 'outputs': ['a.txt']},
+        {'name': 'b', 'script': 'b.py', 'outputs': ['b.txt']},
+        {'name': 'c', 'script': 'c.py', 'outputs': ['c.txt']},
+    ]})
+    scripts = {name: {'content': f"open('{name[0]}.txt', 'w').write('ok')\n"} for name in ('a.py', 'b.py', 'c.py')}
+
+    scheduler = RunScheduler(max_concurrent=4, max_per_user=2)
+    run_id = scheduler.submit('u1', 'p', PipelineRunner.run, pipeline, scripts, {}, max_parallel=3)
+    job = scheduler.get(run_id)
+    assert job.done.wait(60)
+    assert job.result[2] == 0, job.result[1]
+    assert job.run_info['pipeline']['parallel'] == 2
+
+
+def test_linear_pipeline_does_not_borrow_slots():
+    pipeline = Pipeline.from_document({'name': 'p', 'steps': [
+        {'name': 'a', 'script': 'a.py', 'outputs': ['a.txt']},
+        {'name': 'b', 'script': 'b.py', 'inputs': ['a.txt'], 'outputs': ['b.txt']},
+        {'name': 'c', 'script': 'c.py', 'inputs': ['b.txt'], 'outputs': ['c.txt']},
+    ]})
+    scripts = {name: {'content': f"open('{name[0]}.txt', 'w').write('ok')\n"} for name in ('a.py', 'b.py', 'c.py')}
+    borrowed = []
+
+    scheduler = RunScheduler(max_concurrent=4, max_per_user=4)
+    borrow_slots = scheduler.borrow_slots
+    scheduler.borrow_slots = lambda run_id, wanted: borrowed.append(wanted) or borrow_slots(run_id, wanted)
+    run_id = scheduler.submit('u1', 'p', PipelineRunner.run, pipeline, scripts, {}, max_parallel=3)
+    job = scheduler.get(run_id)
+    assert job.done.wait(60)
+    assert job.result[2] == 0, job.result[1]
+    assert job.run_info['pipeline']['parallel'] == 1
+    assert borrowed == [0]
+
+
+def _outputs(count, output, run_info):
+    return [RunOutput() for _ in range(count)]
+
+
+def test_old_logs_are_cleaned_once_per_submitted_job(monkeypatch):
+    calls = []
+    monkeypatch.setattr(RunOutput, 'cleanup_old_logs', staticmethod(lambda *args, **kwargs: calls.append(args)))
+    scheduler = RunScheduler(max_concurrent=1, max_per_user=1)
+    # งานเดียวที่สร้าง RunOutput หลายตัว (แบบ batch / pipeline) สแกน LOG_DIR ครั้งเดียว
+    run_id = scheduler.submit('u1', 'outputs', _outputs, 5)
+    assert scheduler.get(run_id).done.wait(5)
+    assert len(calls) == 1
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import pytest
+from Components.blob_store import BlobStore
+from Components.script_runner import ScriptRunner
+
+
+def _sqlite_blob(store, tmp_path):
+    path = tmp_path / 'source.db'
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE t (v INTEGER)")
+        db.execute("INSERT INTO t VALUES (1)")
+    db.close()
+    with open(path, 'rb') as f:
+        return store.put_stream(f, 'input.db')
+
+
+def test_native_writes_to_staged_input_leave_blob_intact(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    handle = _sqlite_blob(store, tmp_path)
+    with open(handle.path, 'rb') as f:
+        original = f.read()
+
+    workspace = tmp_path / 'run'
+    staged = ScriptRunner._stage_input_files({'input.db': handle}, str(workspace))
+    assert os.stat(staged['input.db']).st_ino != os.stat(handle.path).st_ino
+
+    # sqlite3 เขียนผ่าน C library ไม่ผ่าน open ที่ harness ห่อไว้
+    db = sqlite3.connect(staged['input.db'])
+    db.execute("INSERT INTO t VALUES (2)")
+    db.commit()
+    db.close()
+    os.truncate(staged['input.db'], 0)
+
+    assert store.get(handle.digest) is not None
+    with open(handle.path, 'rb') as f:
+        assert f.read() == original
+
+
+def test_staged_input_is_writable(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    handle = store.put_bytes(b'a,b\n1,2\n', 'data.csv')
+    staged = ScriptRunner._stage_input_files({'data.csv': handle}, str(tmp_path / 'run'))
+    assert os.stat(staged['data.csv']).st_mode & 0o200
+
+
+def test_corrupted_blob_is_not_staged(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    handle = store.put_bytes(b'a,b\n1,2\n', 'data.csv')
+    os.chmod(handle.path, 0o644)
+    with open(handle.path, 'ab') as f:
+        f.write(b'3,4\n')
+
+    with pytest.raises(ValueError):
+        ScriptRunner._stage_input_files({'data.csv': handle}, str(tmp_path / 'run'))
+    assert not os.path.exists(tmp_path / 'run' / 'data.csv')
@@ -0,0 +1,82 @@
+import io
+import os
+import time
+import threading
+from Components.batch import BatchInputs
+from Components.blob_store import BlobStore, BlobLease
+from Components.scheduler import RunScheduler
+from Components.script_runner import ScriptRunner
+from Components.storage_manager import StorageManager
+
+GC_INTERVAL = 0.05
+
+
+def _store_old_blob(store, data, filename):
+    handle = store.put_bytes(data, filename)
+    # ให้ blob ดูเหมือนถูกเก็บไว้นานกว่ารอบเก็บกวาดแล้ว
+    old = time.time() - 10 * GC_INTERVAL
+    os.utime(store._meta_path(handle.digest), (old, old))
+    return handle
+
+
+def _block(event, output, run_info):
+    event.wait(5)
+
+
+def _stage(files, target, output, run_info):
+    return ScriptRunner._stage_input_files(files, target)
+
+
+def test_queued_job_keeps_its_input_blob(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    manager = StorageManager(store, gc_interval=GC_INTERVAL)
+    handle = _store_old_blob(store, b'a,b\n1,2\n', 'data.csv')
+
+    scheduler = RunScheduler(max_concurrent=1, max_per_user=1)
+    release = threading.Event()
+    scheduler.submit('u1', 'blocker', _block, release)
+    run_id = scheduler.submit('u1', 'stage', _stage, {'data.csv': handle}, str(tmp_path))
+    assert scheduler.get(run_id).status == 'queued'
+
+    manager.collect_garbage()
+    assert store.get(handle.digest) is not None
+
+    release.set()
+    job = scheduler.get(run_id)
+    assert job.done.wait(5)
+    assert job.error is None
+    with open(job.result['data.csv'], 'rb') as f:
+        assert f.read() == b'a,b\n1,2\n'
+
+    # งานจบแล้ว lease ถูกปล่อย blob ที่ไม่มีใครใช้ถูกลบในรอบถัดไป
+    manager.collect_garbage()
+    assert store.get(handle.digest) is None
+
+
+def test_batch_inputs_hold_blobs_until_dropped(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    manager = StorageManager(store, gc_interval=GC_INTERVAL)
+    upload = io.BytesIO(b'x\n1\n')
+    upload.name = 's1/raw.csv'
+
+    batch = BatchInputs.from_files([upload], blob_store=store)
+    digest = batch.items['s1']['raw.csv'].digest
+    old = time.time() - 10 * GC_INTERVAL
+    os.utime(store._meta_path(digest), (old, old))
+
+    manager.collect_garbage()
+    assert store.get(digest) is not None
+
+    del batch
+    manager.collect_garbage()
+    assert store.get(digest) is None
+
+
+def test_stale_lease_is_ignored(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    handle = _store_old_blob(store, b'stale', 'stale.txt')
+    lease = BlobLease([handle])
+    assert handle.digest in store.leased_digests()
+    assert handle.digest not in store.leased_digests(max_age=-1)
+    lease.release()
+    assert store.leased_digests() == set()
@@ -0,0 +1,56 @@
+import time
+import shutil
+import pytest
+from Components.run_policy import CancelToken
+from Components.worker_pool import WorkerPool
+from Components.script_runner import ScriptRunner
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # ไม่ต้อง preload library หนักสำหรับ test
+    monkeypatch.setattr('Components.worker_pool.WORKER_PRELOAD_MODULES', [])
+    pool = WorkerPool(size=1)
+    deadline = time.monotonic() + 30
+    while pool.idle_count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    yield pool
+    pool.shutdown()
+
+
+def test_worker_lost_mid_run_does_not_rerun_cold(pool, tmp_path):
+    marker = tmp_path / 'runs.txt'
+    # process ของ script เป็นลูกของ worker: kill worker ระหว่างรัน
+    script = (
+        "import os, signal\n"
+        f"open({str(marker)!r}, 'a').write('run\\n')\n"
+        "os.kill(os.getppid(), signal.SIGKILL)\n"
+    )
+    run_info = {}
+    stdout, stderr, returncode, temp_dir = ScriptRunner.run_script(script, 'lost.py', pool=pool, run_info=run_info)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    assert returncode != 0
+    assert 'Worker process exited unexpectedly' in stderr
+    assert marker.read_text() == 'run\n'
+    assert pool.stats['lost'] == 1
+    assert pool.stats['cold_fallbacks'] == 0
+
+
+def test_run_cancelled_while_waiting_for_worker_is_not_started_cold(tmp_path):
+    marker = tmp_path / 'runs.txt'
+    token = CancelToken()
+
+    class BusyPool:
+        # ยกเลิกระหว่างรอ worker แล้วไม่มี worker ว่าง
+        def run(self, *args, **kwargs):
+            token.cancel()
+            return None
+
+    run_info = {'cancel_token': token}
+    script = f"open({str(marker)!r}, 'a').write('run\\n')\n"
+    _, _, returncode, temp_dir = ScriptRunner.run_script(script, 'cancel.py', pool=BusyPool(), run_info=run_info)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    assert returncode != 0
+    assert not marker.exists()